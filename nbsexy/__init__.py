@@ -1 +1,4 @@
+__version__ = "0.0.6a"
 
+from nbsexy._checks_fun import CheckResult  # noqa: E402
+from nbsexy.api import check  # noqa: E402
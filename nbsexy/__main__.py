@@ -1,59 +1,118 @@
 import math
+import os
 import shutil
 import sys
 import time
 from argparse import Namespace
 from collections import Counter
+from contextlib import redirect_stdout
+from itertools import chain
 from operator import attrgetter
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
 
 from colorama import Back, Fore, Style, init
 
 from nbsexy.args import ParserGetter
-from nbsexy.checks import CheckFactory, CheckResult, CheckRunner, available_checks
+from nbsexy._checks_fun import OUT_OF_BUDGET
+from nbsexy.cache import ExecutionCache, StaticResultCache
+from nbsexy.checks import (
+    CheckFactory,
+    CheckResult,
+    CheckRunner,
+    FailureLimit,
+    available_checks,
+)
+from nbsexy.daemon import forward_to_daemon, serve
 from nbsexy.path_helper import (
+    collect_files_at_git_rev,
+    collect_files_changed_since,
     collect_files_contain_given_suffix_from_paths,
-    exclude_path_by_glob_patterns,
+    iter_paths_from_file,
 )
+from nbsexy.reporters import Reporter, create_reporter
+from nbsexy.watcher import Watcher
+
+if TYPE_CHECKING:
+    from nbsexy.kernel_pool import KernelPool
 
 
 class Launcher:
     "entry point of nbsexy"
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        argv: Optional[List[str]] = None,
+        kernel_pool: Optional["KernelPool"] = None,
+        result_cache: Optional[StaticResultCache] = None,
+    ) -> None:
+        """
+        Args:
+            argv: command line arguments, default `sys.argv[1:]`.
+            kernel_pool, result_cache: long-lived objects owned by caller (like the daemon),
+                used instead of creating new ones for this run.
+        """
         self.start_time = time.time()
         self.terminal_size = shutil.get_terminal_size((80, 24))
         self.n_columns = self.terminal_size.columns if self.terminal_size.columns > 20 else 80
 
 
-        self.args_ = ParserGetter.get_args()
+        self.args_ = ParserGetter.get_args(argv)
+        self._shared_kernel_pool = kernel_pool
+        self._shared_result_cache = result_cache
         self.verbose = self.args_.verbose
+        # additional statistics printed above footer, like kernel pool hits.
+        self.run_stats: List[str] = []
+        # gets every result as soon as it is produced, with `--format`.
+        self.reporter: Optional[Reporter] = None
+        # options each file is checked with, if config overrides them for some paths.
+        self._args_by_file: Dict[str, Namespace] = dict()
 
     def run(self) -> int:
         args_ = self.args_
-        files = _get_ipynb_filenames(args_)
-        selected_check_names = [
-            check_name
-            for check_name in available_checks
-            if attrgetter(check_name)(args_)
-        ]
+        if args_.format is None:
+            return self._run()
+        to_stdout = args_.output == "-"
+        stream = sys.stdout if to_stdout else open(args_.output, "wt", encoding="utf-8")
+        check_descriptions = {
+            check_name: _get_check_description(check_name, args_)
+            for check_name in self._get_selected_check_names()
+        }
+        self.reporter = create_reporter(args_.format, stream, check_descriptions)
+        try:
+            if not to_stdout:
+                return self._run()
+            # stdout only has the report, so it can be piped.
+            with redirect_stdout(sys.stderr):
+                return self._run()
+        finally:
+            self.reporter.close()
+            if not to_stdout:
+                stream.close()
+
+    def _run(self) -> int:
+        args_ = self.args_
+        try:
+            files = _get_ipynb_filenames(args_)
+        except ValueError as e:
+            # like errors of argparse, e.g. a root which is not in a git work tree.
+            print(f"nbsexy: error: {e}", file=sys.stderr)
+            return 2
+        selected_check_names = self._get_selected_check_names()
 
         self._print_header_and_info(n_check=len(selected_check_names), n_nb=len(files))
         check_result_dict: Dict[str, Dict[str, CheckResult]] = dict()
-        runner = CheckRunner(args_)
 
-        if len(files) == 0:
+        if len(files) == 0 and not args_.watch:
             print("FOUND 0 NOTEBOOKS! EXIT.")
             self._print_footer(0, 0, 0)
             return 0
 
-        for check_name in selected_check_names:
-            check = CheckFactory.get_check(check_name, args_)
-            results = runner.run(files, check)
-            check_result_dict[check_name] = results
+        check_result_dict = self._run_checks(files, selected_check_names)
 
         # print results:
-        self._print_results_for_all_check(runner, check_result_dict)
+        self._print_results_for_all_check(check_result_dict)
+        if args_.slowest_cells > 0 and "execute" in check_result_dict:
+            self._print_slowest_cells(check_result_dict["execute"], args_.slowest_cells)
 
         # print errors:
         counter = self._count_running_stats(check_result_dict)
@@ -67,22 +126,260 @@ class Launcher:
             counter["n_failed"],
             counter["n_error"],
         )
-        self._print_footer(n_pass, n_failed, n_error)
+        self._print_footer(n_pass, n_failed, n_error, counter["n_out_of_budget"])
 
+        if args_.watch:
+            return self._watch(check_result_dict, selected_check_names)
         if n_failed > 0 or n_error > 0:
             return 1
         else:
             return 0
 
+    def _get_selected_check_names(self) -> List[str]:
+        args_ = self.args_
+        # checks may be also selected for some paths by overrides of config.
+        all_args = [args_] + [
+            Namespace(**options) for _, options in getattr(args_.config, "overrides", [])
+        ]
+        return [
+            check_name
+            for check_name in available_checks
+            if any(getattr(a, check_name, False) for a in all_args)
+        ]
+
+    def _run_checks(
+        self, files: List[str], selected_check_names: List[str]
+    ) -> Dict[str, Dict[str, CheckResult]]:
+        """run selected checks on files. If config has per-path overrides, files are
+        run group by group, each group with its own options."""
+        args_ = self.args_
+        groups = [(args_, files)]
+        if args_.config is not None:
+            groups = args_.config.group_files(args_, files)
+        if len(groups) > 1:
+            for group_args, group_files in groups:
+                self._args_by_file.update(dict.fromkeys(group_files, group_args))
+        kernel_pool = self._create_kernel_pool(selected_check_names)
+        execution_cache = self._create_execution_cache(selected_check_names)
+        result_cache = self._create_static_result_cache(selected_check_names)
+        resources = {"kernel_pool": kernel_pool, "execution_cache": execution_cache}
+        failure_limit = None
+        if args_.max_failures > 0:
+            failure_limit = FailureLimit(args_.max_failures)
+            resources["cancellation"] = failure_limit.cancellation
+        check_result_dict: Dict[str, Dict[str, CheckResult]] = {
+            check_name: dict() for check_name in selected_check_names
+        }
+        try:
+            for group_args, group_files in groups:
+                if failure_limit is not None and failure_limit.is_reached:
+                    break
+                checks = [
+                    CheckFactory.get_check(check_name, group_args)
+                    for check_name in selected_check_names
+                    if attrgetter(check_name)(group_args)
+                ]
+                runner = CheckRunner(
+                    group_args,
+                    resources=resources,
+                    result_cache=result_cache,
+                    on_result=self.reporter.add if self.reporter is not None else None,
+                    failure_limit=failure_limit,
+                )
+                try:
+                    for check_name, results in runner.run_all(group_files, checks).items():
+                        check_result_dict[check_name].update(results)
+                finally:
+                    runner.close()
+        finally:
+            if kernel_pool is not None:
+                if kernel_pool is not self._shared_kernel_pool:
+                    kernel_pool.close()
+                self.run_stats.append(kernel_pool.get_summary())
+            if execution_cache is not None:
+                execution_cache.close()
+                self.run_stats.append(execution_cache.get_summary())
+            if result_cache is not None:
+                result_cache.close()
+                self.run_stats.append(result_cache.get_summary())
+        if failure_limit is not None and failure_limit.is_reached:
+            n_checked = len(set(chain.from_iterable(check_result_dict.values())))
+            self.run_stats.append(
+                f"stopped after {failure_limit.n_failures} failed or errored checks"
+                f" (--max_failures {failure_limit.max_failures}),"
+                f" {len(files) - n_checked} notebooks not checked"
+            )
+        if len(groups) == 1:
+            return check_result_dict
+        # back to the order of files.
+        return {
+            check_name: {f: results[f] for f in files if f in results}
+            for check_name, results in check_result_dict.items()
+        }
+
+    def _watch(
+        self,
+        check_result_dict: Dict[str, Dict[str, CheckResult]],
+        selected_check_names: List[str],
+    ) -> int:
+        """Re-run checks on changed notebooks until interrupted (Ctrl-C).
+
+        Returns:
+            int: exit code for results of all notebooks when interrupted.
+        """
+        watcher = Watcher(self.args_.root_dirs, ".ipynb", self.args_.exclude_patterns)
+        print(f"Watching for changes by {watcher.method}, press Ctrl-C to stop.")
+        try:
+            while True:
+                changed = watcher.wait_for_changes()
+                if not changed:
+                    continue
+                self.start_time = time.time()
+                self.run_stats = []
+                existing = sorted(f for f in changed if os.path.isfile(f))
+                new_result_dict = self._run_checks(existing, selected_check_names)
+                self._print_delta(check_result_dict, new_result_dict, changed)
+                for check_name, results in check_result_dict.items():
+                    for filename in changed:
+                        results.pop(filename, None)
+                    results.update(new_result_dict[check_name])
+                counter = self._count_running_stats(check_result_dict)
+                self._print_footer(
+                    counter["n_pass"],
+                    counter["n_failed"],
+                    counter["n_error"],
+                    counter["n_out_of_budget"],
+                )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+        counter = self._count_running_stats(check_result_dict)
+        return 1 if counter["n_failed"] > 0 or counter["n_error"] > 0 else 0
+
+    def _print_delta(
+        self,
+        old_result_dict: Dict[str, Dict[str, CheckResult]],
+        new_result_dict: Dict[str, Dict[str, CheckResult]],
+        changed: Set[str],
+    ) -> None:
+        """print what changed since last run, like:
+        [has_md] a.ipynb: False -> True
+        """
+        print("")
+        print(self._add_separator_to_line(f" {len(changed)} notebooks changed "))
+        for filename in sorted(changed):
+            if not any(filename in results for results in new_result_dict.values()):
+                print(f"  * {filename}: removed")
+                continue
+            for check_name, results in new_result_dict.items():
+                if filename not in results:
+                    # the check is turned off for this path by config.
+                    continue
+                old = old_result_dict[check_name].get(filename)
+                new = results[filename]
+                old_status = "new" if old is None else str(old.status)
+                line = f"  * [{check_name}] {filename}: {old_status} -> {new.status}"
+                if new.status is not True and new.info:
+                    line += "\n" + new.info
+                print(line)
+
+    def _create_kernel_pool(
+        self, selected_check_names: List[str]
+    ) -> Optional["KernelPool"]:
+        if "execute" not in selected_check_names:
+            return None
+        if self._shared_kernel_pool is not None:
+            self._shared_kernel_pool.reset_stats()
+            return self._shared_kernel_pool
+        if self.args_.kernel_pool <= 0:
+            return None
+        # jupyter_client is slow to import, only import it when executing.
+        from nbsexy.kernel_pool import KernelPool
+
+        return KernelPool(self.args_.kernel_pool)
+
+    def _create_execution_cache(
+        self, selected_check_names: List[str]
+    ) -> Optional[ExecutionCache]:
+        if (
+            "execute" not in selected_check_names
+            or not self.args_.cache_executions
+            or self.args_.no_cache
+        ):
+            return None
+        return ExecutionCache(
+            self.args_.cache_dir,
+            max_size=self.args_.cache_max_size * 1024 * 1024,
+            refresh=self.args_.refresh_cache,
+            input_files=self.args_.cache_inputs,
+        )
+
+    def _create_static_result_cache(
+        self, selected_check_names: List[str]
+    ) -> Optional[StaticResultCache]:
+        # cached results are keyed by files on disk, which `--git_rev` does not read.
+        if self.args_.no_cache or self.args_.git_rev is not None:
+            return None
+        if not any(
+            CheckFactory.get_check(check_name, self.args_).use_summary
+            for check_name in selected_check_names
+        ):
+            # only static checks are cached by it.
+            return None
+        if self._shared_result_cache is not None:
+            self._shared_result_cache.reset_stats()
+            self._shared_result_cache.refresh = self.args_.refresh_cache
+            return self._shared_result_cache
+        return StaticResultCache(self.args_.cache_dir, refresh=self.args_.refresh_cache)
+
     def _print_results_for_all_check(
-        self, runner: CheckRunner, check_result_dict: Dict[str, Dict[str, CheckResult]]
+        self, check_result_dict: Dict[str, Dict[str, CheckResult]]
     ) -> None:
         print("")
         print(self._add_separator_to_line(" summary "))
         print("")
         for check_name, results in check_result_dict.items():
-            check = CheckFactory.get_check(check_name, self.args_)
-            runner.print_check_results(check, results, self.verbose)
+            for args_, group_results in self._group_results_by_options(check_name, results):
+                check = CheckFactory.get_check(check_name, args_)
+                CheckRunner(args_).print_check_results(check, group_results, self.verbose)
+
+    def _group_results_by_options(
+        self, check_name: str, results: Dict[str, CheckResult]
+    ) -> List[Tuple[Namespace, Dict[str, CheckResult]]]:
+        """split results of a check by the options (like thresholds) their files are
+        checked with, so each group is printed with its own header."""
+        kwargs_list = CheckFactory.get_check(check_name, self.args_).kwargs_list
+        groups: Dict[str, Tuple[Namespace, Dict[str, CheckResult]]] = dict()
+        for filename, result in results.items():
+            args_ = self._args_by_file.get(filename, self.args_)
+            key = repr([getattr(args_, kwarg) for kwarg in kwargs_list])
+            groups.setdefault(key, (args_, dict()))[1][filename] = result
+        return list(groups.values())
+
+    def _print_slowest_cells(self, results: Dict[str, CheckResult], n_cells: int) -> None:
+        """print the slowest cells of each executed notebook, like:
+          * a.ipynb: 35.20s in total, kernel peak 812.3MB, 40.10s CPU
+              12.30s  cell 3: model.fit(x, y)
+        """
+        print(self._add_separator_to_line(" slowest cells "))
+        print("")
+        for filename, result in results.items():
+            if not result.cell_seconds:
+                continue
+            total_seconds = sum(seconds for _, seconds, _ in result.cell_seconds)
+            usage = result.kernel_usage
+            kernel = ""
+            if usage is not None:
+                kernel = (
+                    f", kernel peak {usage['peak_rss_mb']:.1f}MB,"
+                    f" {usage['cpu_seconds']:.2f}s CPU"
+                )
+            print(f"  * {filename}: {total_seconds:.2f}s in total{kernel}")
+            slowest = sorted(result.cell_seconds, key=lambda c: c[1], reverse=True)
+            for index, seconds, first_line in slowest[:n_cells]:
+                print(f"      {seconds:7.2f}s  cell {index}: {first_line}")
+        print("")
 
     def _print_errors(
         self, check_result_dict: Dict[str, Dict[str, CheckResult]]
@@ -136,7 +433,7 @@ class Launcher:
             check_result_dict (Dict[str, Dict[str, CheckResult]]): key 1 is check_name and key2 is filename.
                                                                    i.e. Dict[check_name, Dict[filename, CheckResult]]
         Returns:
-            Dict[str, int]: example {'n_pass': 10, 'n_failed': 3, 'n_error':3}
+            Dict[str, int]: example {'n_pass': 10, 'n_failed': 3, 'n_error':3, 'n_out_of_budget': 1}
         """
         counter = Counter(
             [
@@ -150,27 +447,40 @@ class Launcher:
             "n_pass": counter.get(True, 0),
             "n_failed": counter.get(False, 0),
             "n_error": counter.get("Error", 0),
+            "n_out_of_budget": counter.get(OUT_OF_BUDGET, 0),
         }
 
-    def _print_footer(self, n_pass: int, n_failed: int, n_error: int) -> None:
+    def _print_footer(
+        self, n_pass: int, n_failed: int, n_error: int, n_out_of_budget: int = 0
+    ) -> None:
         time_spent = time.time() - self.start_time
-        msg = self._get_footer_message(n_pass, n_failed, n_error, time_spent)
+        msg = self._get_footer_message(n_pass, n_failed, n_error, time_spent, n_out_of_budget)
         print("")
+        for stats in self.run_stats:
+            print(stats)
         print(msg)
 
     def _get_footer_message(
-        self, n_pass: int, n_failed: int, n_error: int, time_spent: float
+        self,
+        n_pass: int,
+        n_failed: int,
+        n_error: int,
+        time_spent: float,
+        n_out_of_budget: int = 0,
     ) -> str:
         """
         looks like this:
-        ==== 5 passed, 2 failed, 7 error, in 34.12s ====
+        ==== 5 passed, 2 failed, 7 error, 1 out of budget, in 34.12s ====
         """
         passed = f" {n_pass} passed, " if n_pass > 0 else ""
         failed = f"{n_failed} failed, " if n_failed > 0 else ""
         errored = f"{n_error} error, " if n_error > 0 else ""
+        out_of_budget = f"{n_out_of_budget} out of budget, " if n_out_of_budget > 0 else ""
         spent = f"in {time_spent:.2f}s "
 
-        title_len = len(passed) + len(failed) + len(errored) + len(spent)
+        title_len = (
+            len(passed) + len(failed) + len(errored) + len(out_of_budget) + len(spent)
+        )
         title = (
             Fore.GREEN
             + passed
@@ -178,6 +488,8 @@ class Launcher:
             + failed
             + Fore.RED
             + errored
+            + Fore.CYAN
+            + out_of_budget
             + Fore.YELLOW
             + spent
         )
@@ -185,15 +497,54 @@ class Launcher:
         return new_title
 
 
+def _get_check_description(check_name: str, args_: Namespace) -> str:
+    check = CheckFactory.get_check(check_name, args_)
+    kwargs = {kwarg: getattr(args_, kwarg) for kwarg in check.kwargs_list}
+    return check.header_msg.format(**kwargs).strip().rstrip(":")
+
+
 def _get_ipynb_filenames(args_: Namespace) -> List[str]:
-    files = collect_files_contain_given_suffix_from_paths(args_.root_dirs, ".ipynb")
-    if len(args_.exclude_patterns) > 0:
-        files = exclude_path_by_glob_patterns(files, args_.exclude_patterns)
-    return list(files)
+    "sorted, so output is the same every run (and whether it is run by daemon or not)."
+    paths: Iterable[str] = args_.root_dirs
+    if args_.files_from is not None:
+        # paths are read lazily while collecting, never put on a command line. Only
+        # collected notebooks are kept (with `--git_rev`, also the paths to match).
+        paths = chain(paths, iter_paths_from_file(args_.files_from))
+    if args_.git_rev is not None:
+        return collect_files_at_git_rev(
+            paths,
+            args_.git_rev,
+            ".ipynb",
+            exclude_patterns=args_.exclude_patterns,
+        )
+    if args_.changed_since is not None:
+        files = collect_files_changed_since(
+            paths,
+            args_.changed_since,
+            ".ipynb",
+            exclude_patterns=args_.exclude_patterns,
+        )
+        return sorted(files)
+    files = collect_files_contain_given_suffix_from_paths(
+        paths,
+        ".ipynb",
+        exclude_patterns=args_.exclude_patterns,
+        use_git=args_.discovery == "git",
+        include_untracked=args_.include_untracked,
+    )
+    return sorted(files)
 
 
 def main():
-    return Launcher().run()
+    argv = sys.argv[1:]
+    options = ParserGetter.get_launch_options(argv)
+    if options.daemon:
+        return serve(options, Launcher)
+    if not options.no_daemon:
+        returncode = forward_to_daemon(options, argv)
+        if returncode is not None:
+            return returncode
+    return Launcher(argv).run()
 
 
 if __name__ == "__main__":
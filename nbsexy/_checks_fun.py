@@ -1,27 +1,137 @@
 import json
-import os
-import tempfile
+import logging
+import threading
 from itertools import chain
 from json.decoder import JSONDecodeError
 from operator import le, lt
-from typing import Any, Dict, List, Tuple, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
-import papermill
-import papermill as pm
-from nbformat.notebooknode import NotebookNode
-from papermill import PapermillExecutionError
-from papermill.inspection import _open_notebook
+# papermill and nbformat take hundreds of ms to import, they are imported only when
+# a notebook is executed, so static checks start fast.
+if TYPE_CHECKING:
+    from nbformat.notebooknode import NotebookNode
+
+    from jupyter_client.manager import KernelManager
+
+    from nbsexy.cache import ExecutionCache
+    from nbsexy.kernel_pool import KernelPool
+
+
+logger = logging.getLogger(__name__)
+
+# (cell index, seconds, first line of source) of an executed code cell.
+CELL_SECONDS = Tuple[int, float, str]
+# peak_rss_mb, cpu_seconds and wall_seconds of the kernel executing a notebook.
+KERNEL_USAGE = Dict[str, float]
+# status of a notebook executed with `--budget`, which ran out of time without error.
+OUT_OF_BUDGET = "OutOfBudget"
 
 
 class CheckResult:
     """Define check result."""
 
-    def __init__(self, status: Union[str, bool], info: str = "") -> None:
+    def __init__(
+        self,
+        status: Union[str, bool],
+        info: str = "",
+        cell_seconds: Optional[List[CELL_SECONDS]] = None,
+        kernel_usage: Optional[KERNEL_USAGE] = None,
+    ) -> None:
         """
-        status: Literal[True, False, "Error"]
+        status: Literal[True, False, "Error", "OutOfBudget"]
+        cell_seconds: wall time of each code cell, only for executed notebooks.
+        kernel_usage: resources used by the kernel, only for executed notebooks.
         """
         self.status = status
         self.info = info
+        self.cell_seconds = cell_seconds
+        self.kernel_usage = kernel_usage
+
+    def to_dict(self) -> Dict[str, Any]:
+        dict_: Dict[str, Any] = {"status": self.status, "info": self.info}
+        if self.cell_seconds is not None:
+            dict_["cell_seconds"] = self.cell_seconds
+        if self.kernel_usage is not None:
+            dict_["kernel_usage"] = self.kernel_usage
+        return dict_
+
+    @classmethod
+    def from_dict(cls, dict_: Dict[str, Any]) -> "CheckResult":
+        cell_seconds = dict_.get("cell_seconds")
+        if cell_seconds is not None:
+            cell_seconds = [tuple(c) for c in cell_seconds]
+        return cls(
+            status=dict_["status"],
+            info=dict_["info"],
+            cell_seconds=cell_seconds,
+            kernel_usage=dict_.get("kernel_usage"),
+        )
+
+
+class ExecutionCancelled(Exception):
+    "executing a notebook is cancelled, it has no result and is not cached."
+
+
+class BudgetExhausted(Exception):
+    "executing a notebook ran out of its time budget before any cell raised error."
+
+    def __init__(self, n_passed: int, n_cells: int) -> None:
+        super().__init__(f"{n_passed} of {n_cells} code cells passed")
+        self.n_passed = n_passed
+        self.n_cells = n_cells
+
+
+class KernelLimitExceeded(Exception):
+    "the kernel is killed since it used more memory or CPU time than allowed."
+
+
+class Cancellation:
+    """Cancel notebooks being executed, from another thread.
+
+    Kernels are registered while they execute notebooks. `cancel` interrupts all of
+    them, and notebooks that have not run a cell yet are cancelled before running one.
+    """
+
+    def __init__(self) -> None:
+        self.is_cancelled = False
+        self._lock = threading.Lock()
+        self._kernel_managers: List["KernelManager"] = []
+
+    def register(self, km: "KernelManager") -> None:
+        with self._lock:
+            self._kernel_managers.append(km)
+
+    def unregister(self, km: "KernelManager") -> None:
+        with self._lock:
+            if km in self._kernel_managers:
+                self._kernel_managers.remove(km)
+
+    def check(self) -> None:
+        """
+        Raises:
+            ExecutionCancelled: if cancelled.
+        """
+        if self.is_cancelled:
+            raise ExecutionCancelled()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.is_cancelled = True
+            kernel_managers = list(self._kernel_managers)
+        if not kernel_managers:
+            return
+        # only needed to interrupt kernels, so static-only runs never import it.
+        import asyncio
+
+        for km in kernel_managers:
+            try:
+                # sends SIGINT (or an interrupt request), not bound to km's event loop.
+                result = km.interrupt_kernel()
+                if asyncio.iscoroutine(result):
+                    asyncio.run(result)
+            except Exception:
+                # kernel is already gone.
+                pass
 
 
 def load_json(file: str) -> Dict:
@@ -50,21 +160,62 @@ def is_ascending(vals: List[Any], strict=True) -> bool:
     return True
 
 
+class NotebookSummary:
+    """Cell metrics of a notebook, collected by one pass over its cells.
+
+    Static checks are threshold comparisons over this summary, so every notebook
+    is traversed only once no matter how many checks are selected.
+    """
+
+    __slots__ = (
+        "n_code_cells",
+        "n_markdown_cells",
+        "code_line_counts",
+        "code_byte_sizes",
+        "execution_counts",
+    )
+
+    def __init__(self) -> None:
+        self.n_code_cells = 0
+        self.n_markdown_cells = 0
+        # following lists are aligned with code cells:
+        self.code_line_counts: List[int] = []
+        self.code_byte_sizes: List[int] = []
+        self.execution_counts: List[Optional[int]] = []
+
+    @classmethod
+    def from_nb_json(cls, nb_json: Dict[str, Any]) -> "NotebookSummary":
+        summary = cls()
+        for cell in nb_json["cells"]:
+            cell_type = cell["cell_type"]
+            if cell_type == "code":
+                source = cell["source"]
+                if isinstance(source, str):
+                    source = source.splitlines(True)
+                summary.n_code_cells += 1
+                summary.code_line_counts.append(len(source))
+                summary.code_byte_sizes.append(
+                    sum(len(line.encode("utf-8")) for line in source)
+                )
+                summary.execution_counts.append(cell.get("execution_count"))
+            elif cell_type == "markdown":
+                summary.n_markdown_cells += 1
+        return summary
+
+    @property
+    def total_code_lines(self) -> int:
+        return sum(self.code_line_counts)
+
+
 def get_cells_count(ipynb_filename: str) -> int:
     nb = load_json(ipynb_filename)
-    count = len([1 for cell in nb["cells"] if cell["cell_type"] == "code"])
-    return count
+    return NotebookSummary.from_nb_json(nb).n_code_cells
 
 
 def check_execution_count_is_ascending(
-    nb_json: Dict[str, Any], **kwargs: Any
+    nb_summary: NotebookSummary, **kwargs: Any
 ) -> CheckResult:
-    execution_counts = (
-        cell["execution_count"]
-        for cell in nb_json["cells"]
-        if cell["cell_type"] == "code"
-    )
-    execution_counts = [i for i in execution_counts if i is not None]
+    execution_counts = [i for i in nb_summary.execution_counts if i is not None]
     if len(execution_counts) == 0:
         status = True
     else:
@@ -73,36 +224,32 @@ def check_execution_count_is_ascending(
 
 
 def check_cell_count_not_exceed_max_count(
-    nb_json: Dict[str, Any], max_cell_count: int, **kwargs: Any
+    nb_summary: NotebookSummary, max_cell_count: int, **kwargs: Any
 ) -> CheckResult:
-    count = len([1 for cell in nb_json["cells"] if cell["cell_type"] == "code"])
+    count = nb_summary.n_code_cells
     status = count < max_cell_count
     info = f"cell count: {count}"
     return CheckResult(status=status, info=info)
 
 
 def check_nb_contains_markdown_cell(
-    nb_json: Dict[str, Any], **kwargs: Any
+    nb_summary: NotebookSummary, **kwargs: Any
 ) -> CheckResult:
-    status = len([1 for c in nb_json["cells"] if c["cell_type"] == "markdown"]) > 0
+    status = nb_summary.n_markdown_cells > 0
     return CheckResult(status=status)
 
 
 def check_all_code_cell_not_exceed_max_count(
-    nb_json: Dict[str, Any], max_line_in_cell: int, **kwargs: Any
+    nb_summary: NotebookSummary, max_line_in_cell: int, **kwargs: Any
 ):
-    counts = [len(c["source"]) for c in nb_json["cells"] if c["cell_type"] == "code"]
-    execution_counts = [
-        c["execution_count"] for c in nb_json["cells"] if c["cell_type"] == "code"
-    ]
-
+    counts = nb_summary.code_line_counts
     status = all(count <= max_line_in_cell for count in counts)
     if status:
         return CheckResult(status=status)
     else:
         exceed_chunks = [
             chunk
-            for chunk, count in zip(execution_counts, counts)
+            for chunk, count in zip(nb_summary.execution_counts, counts)
             if count > max_line_in_cell
         ]
         formated = ",".join([str(i) for i in exceed_chunks])
@@ -111,10 +258,9 @@ def check_all_code_cell_not_exceed_max_count(
 
 
 def check_total_line_from_code_cell_not_exceed_max_count(
-    nb_json: Dict[str, Any], max_total_line_in_nb: int, **kwargs: Any
+    nb_summary: NotebookSummary, max_total_line_in_nb: int, **kwargs: Any
 ):
-    counts = [len(c["source"]) for c in nb_json["cells"] if c["cell_type"] == "code"]
-    total_counts = sum(counts)
+    total_counts = nb_summary.total_code_lines
     status = total_counts <= max_total_line_in_nb
     info = f"total counts: {total_counts}"
     return CheckResult(status=status, info=info)
@@ -123,56 +269,204 @@ def check_total_line_from_code_cell_not_exceed_max_count(
 def check_nb_can_be_run_without_error_raised(
     nb_json: Dict[str, Any], filename: str, **kwargs: Any
 ):
-    parent = _find_file_parent(filename)
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        tmp_nb_path = os.path.join(tmpdirname, "job_execute_nb.ipynb")
-        try:
-            # !!!! try to specify kernel_name wont work since
-            # L104 at pm.execute_notebook will load kernelname mannuly
-            # from notebook.
-            pm.execute_notebook(filename, tmp_nb_path, parameters=dict(), cwd=parent)
-        except PapermillExecutionError as ppe:
-            # PapermillExecutionError means check failed not unexpected error.
-            return CheckResult(
-                status=False,
-                info=f"{type(ppe)}: {str(ppe)}",
-            )
-    return CheckResult(status=True)
+    return _execute_and_get_result(nb_json, filename, parameters=dict(), **kwargs)
 
 
 def check_nb_can_be_run_parameterizd_without_error_raised(
-    nb_json: Dict[str, Any], filename: str, **kwargs: Any
+    nb_json: Dict[str, Any], filename: str, quiet: bool = False, **kwargs: Any
 ) -> bool:
+    from nbsexy.executor import to_notebook_node
+
+    # converted once, the node is also what gets executed.
+    nb = to_notebook_node(nb_json)
     # TODO: fix kernel name issue
-    parent = _find_file_parent(filename)
-    params = get_nb_params(filename)
+    params = get_nb_params(nb)
+    report = logger.info if quiet else print
     if params:
-        print(f"Found parameter: {params}")
+        report(f"Found parameter: {params}")
     else:
-        print(f"{filename}: No parameter found, execute directly.")
+        report(f"{filename}: No parameter found, execute directly.")
+
+    return _execute_and_get_result(nb, filename, parameters=params, quiet=quiet, **kwargs)
+
+
+def _execute_and_get_result(
+    nb_json: Dict[str, Any],
+    filename: str,
+    parameters: Dict[str, Any],
+    kernel_pool: Optional["KernelPool"] = None,
+    execution_cache: Optional["ExecutionCache"] = None,
+    cancellation: Optional[Cancellation] = None,
+    save_executed: Optional[str] = None,
+    output_tail: Optional[int] = None,
+    max_cell_seconds: Optional[float] = None,
+    max_notebook_seconds: Optional[float] = None,
+    budget: Optional[float] = None,
+    kernel_max_memory: Optional[float] = None,
+    kernel_max_cpu_seconds: Optional[float] = None,
+    quiet: bool = False,
+    **kwargs: Any,
+) -> CheckResult:
+    """execute notebook (or get result from `execution_cache`).
 
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        tmp_nb_path = os.path.join(tmpdirname, "job_execute_nb.ipynb")
-        try:
-            pm.execute_notebook(filename, tmp_nb_path, parameters=params, cwd=parent)
-        except PapermillExecutionError as ppe:
-            # PapermillExecutionError means check failed not unexpected error.
-            return CheckResult(
-                status=False,
-                info=f"{type(ppe)}: {str(ppe)}",
-            )
+    Only pass/fail results are cached, unexpected errors are raised as usual.
+    If `save_executed` (a dir) is given, the executed notebook is saved in it. Otherwise
+    outputs are dropped while executing, except errors and the latest `output_tail`
+    outputs of each cell, which are shown in the failure report.
 
-    return CheckResult(status=True)
+    A passed notebook fails if a cell took longer than `max_cell_seconds`, or all cells
+    took longer than `max_notebook_seconds`. The result in cache is the one without
+    these budgets, so changing them does not invalidate the cache.
 
+    With `budget` (seconds), cells are executed until the budget is spent, then the
+    kernel is interrupted and stopped. Running out of budget without error is
+    `OUT_OF_BUDGET`, which is never cached, while a cached full result is used as is.
 
-def _find_file_parent(filename: str) -> str:
-    parent, _ = os.path.split(filename)
-    if len(parent) < 1:
-        raise ValueError(f"can not find parent for file: {filename}")
-    return parent
+    Resources used by the kernel are measured (on Linux) and kept in the result. The
+    kernel is killed once it uses more than `kernel_max_memory` (MB) of memory or
+    `kernel_max_cpu_seconds` of CPU time, the notebook fails and it is not cached.
+    Cached results fail too if their recorded usage is over these limits.
 
+    If `quiet`, papermill's progress bar is not shown.
 
-def _get_nb_params_indice(nb: NotebookNode) -> List[int]:
+    Raises:
+        ExecutionCancelled: if `cancellation` is cancelled before or while executing.
+    """
+    from papermill import PapermillExecutionError
+
+    from nbsexy.executor import DEFAULT_OUTPUT_TAIL, execute_notebook, get_saved_path
+    from nbsexy.kernel_monitor import KernelMonitor
+
+    def apply_limits(result: CheckResult) -> CheckResult:
+        result = _apply_time_budget(result, max_cell_seconds, max_notebook_seconds)
+        return _apply_kernel_limits(result, kernel_max_memory, kernel_max_cpu_seconds)
+
+    kernel_name = _get_kernel_name(nb_json)
+    if execution_cache is not None:
+        cache_key = execution_cache.get_key(nb_json, filename, parameters, kernel_name)
+        cached_result = execution_cache.get(cache_key)
+        if cached_result is not None:
+            return apply_limits(cached_result)
+
+    kernel_monitor = None
+    if KernelMonitor.is_supported():
+        kernel_monitor = KernelMonitor(kernel_max_memory, kernel_max_cpu_seconds)
+    is_cacheable = True
+    try:
+        cell_seconds = execute_notebook(
+            nb_json,
+            filename,
+            parameters=parameters,
+            kernel_name=kernel_name,
+            kernel_pool=kernel_pool,
+            cancellation=cancellation,
+            save_path=None if save_executed is None else get_saved_path(save_executed, filename),
+            output_tail=DEFAULT_OUTPUT_TAIL if output_tail is None else output_tail,
+            budget=budget,
+            kernel_monitor=kernel_monitor,
+            progress_bar=not quiet,
+        )
+        result = CheckResult(status=True, cell_seconds=cell_seconds)
+    except BudgetExhausted as e:
+        result = CheckResult(status=OUT_OF_BUDGET, info=f"ran out of --budget {budget}s: {e}")
+        is_cacheable = False
+    except KernelLimitExceeded as e:
+        result = CheckResult(status=False, info=str(e))
+        is_cacheable = False
+    except PapermillExecutionError as ppe:
+        if cancellation is not None and cancellation.is_cancelled:
+            # the error may be the interruption, do not report (or cache) it as failed.
+            raise ExecutionCancelled() from ppe
+        # PapermillExecutionError means check failed not unexpected error.
+        info = f"{type(ppe)}: {str(ppe)}"
+        output_tail = getattr(ppe, "output_tail", "")
+        if output_tail:
+            info += f"\nlast outputs of the cell:\n{output_tail}"
+        result = CheckResult(status=False, info=info)
+
+    if kernel_monitor is not None:
+        result.kernel_usage = kernel_monitor.usage
+    if execution_cache is not None and is_cacheable:
+        execution_cache.set(cache_key, result)
+    return apply_limits(result)
+
+
+def _apply_time_budget(
+    result: CheckResult,
+    max_cell_seconds: Optional[float],
+    max_notebook_seconds: Optional[float],
+) -> CheckResult:
+    if result.status is not True or result.cell_seconds is None:
+        return result
+    over_budget = []
+    if max_cell_seconds is not None:
+        over_budget.extend(
+            f"cell {index} took {seconds:.2f}s (> {max_cell_seconds}s): {first_line}"
+            for index, seconds, first_line in result.cell_seconds
+            if seconds > max_cell_seconds
+        )
+    total_seconds = sum(seconds for _, seconds, _ in result.cell_seconds)
+    if max_notebook_seconds is not None and total_seconds > max_notebook_seconds:
+        over_budget.append(
+            f"all cells took {total_seconds:.2f}s (> {max_notebook_seconds}s)"
+        )
+    if not over_budget:
+        return result
+    return CheckResult(
+        status=False,
+        info="\n".join(over_budget),
+        cell_seconds=result.cell_seconds,
+        kernel_usage=result.kernel_usage,
+    )
+
+
+def _apply_kernel_limits(
+    result: CheckResult,
+    kernel_max_memory: Optional[float],
+    kernel_max_cpu_seconds: Optional[float],
+) -> CheckResult:
+    if result.status is not True or result.kernel_usage is None:
+        return result
+    reasons = get_kernel_limit_reasons(
+        result.kernel_usage, kernel_max_memory, kernel_max_cpu_seconds
+    )
+    if not reasons:
+        return result
+    return CheckResult(
+        status=False,
+        info="\n".join(reasons),
+        cell_seconds=result.cell_seconds,
+        kernel_usage=result.kernel_usage,
+    )
+
+
+def get_kernel_limit_reasons(
+    kernel_usage: KERNEL_USAGE,
+    kernel_max_memory: Optional[float],
+    kernel_max_cpu_seconds: Optional[float],
+) -> List[str]:
+    "why the kernel is over `--kernel_max_memory` or `--kernel_max_cpu_seconds`."
+    reasons = []
+    peak_rss_mb = kernel_usage["peak_rss_mb"]
+    if kernel_max_memory is not None and peak_rss_mb > kernel_max_memory:
+        reasons.append(
+            f"kernel used {peak_rss_mb:.1f}MB of memory"
+            f" (> --kernel_max_memory {kernel_max_memory}MB)"
+        )
+    cpu_seconds = kernel_usage["cpu_seconds"]
+    if kernel_max_cpu_seconds is not None and cpu_seconds > kernel_max_cpu_seconds:
+        reasons.append(
+            f"kernel used {cpu_seconds:.2f}s of CPU time"
+            f" (> --kernel_max_cpu_seconds {kernel_max_cpu_seconds}s)"
+        )
+    return reasons
+
+
+def _get_kernel_name(nb_json: Dict[str, Any]) -> Optional[str]:
+    return nb_json.get("metadata", {}).get("kernelspec", {}).get("name")
+
+
+def _get_nb_params_indice(nb: "NotebookNode") -> List[int]:
     '''find 0 or one or many cells with tag "nbsexy-parameters"'''
     nb_parmas_indice = [
         idx
@@ -188,11 +482,18 @@ def _get_nb_params_indice(nb: NotebookNode) -> List[int]:
     return nb_parmas_indice
 
 
-def get_nb_params(filename) -> Dict[str, Any]:
+def get_nb_params(nb: Union[str, "NotebookNode"]) -> Dict[str, Any]:
     """
     Get the nbsexy-parameter key:value pair dict
+
+    Args:
+        nb: notebook filename, or notebook from `nbsexy.executor.to_notebook_node`.
     """
-    nb: NotebookNode = _open_notebook(filename, None)
+    import papermill.translators
+    from papermill.inspection import _open_notebook
+
+    if isinstance(nb, str):
+        nb = _open_notebook(nb, None)
     kernel_name = nb.metadata.kernelspec.name
     language = nb.metadata.kernelspec.language
     translator = papermill.translators.papermill_translators.find_translator(
@@ -0,0 +1,109 @@
+"""Python API, to run checks inside a process without the CLI.
+
+Example:
+    >>> import nbsexy
+    >>> results = nbsexy.check(["a.ipynb", "notebooks/"], checks=["has_md", "cell_count"],
+    ...                        thresholds={"max_cell_count": 30})
+    >>> results["a.ipynb"]["has_md"].status
+    True
+"""
+import os
+from typing import Any, Dict, Iterable, Mapping, Optional, Union
+
+from nbsexy.args import ParserGetter
+from nbsexy.checks import NB_JSON, CheckFactory, CheckResult, CheckRunner, available_checks
+from nbsexy.loader import load_json_without_outputs, loads_without_outputs
+from nbsexy.path_helper import collect_files_contain_given_suffix_from_paths
+
+# a path to notebook (or dir of notebooks), raw content, or parsed content.
+NotebookInput = Union[str, "os.PathLike[str]", bytes, NB_JSON]
+STATIC_CHECKS = ("cell_count", "is_ascending", "has_md", "line_in_cell", "total_line_in_nb")
+THRESHOLDS = ("max_cell_count", "max_line_in_cell", "max_total_line_in_nb")
+
+
+def check(
+    notebooks: Union[
+        NotebookInput, Iterable[NotebookInput], Mapping[str, Union[bytes, NB_JSON]]
+    ],
+    checks: Iterable[str] = STATIC_CHECKS,
+    thresholds: Optional[Dict[str, int]] = None,
+) -> Dict[str, Dict[str, CheckResult]]:
+    """Run checks on notebooks and return results, nothing is printed.
+
+    Safe to be called from several threads at the same time.
+
+    Args:
+        notebooks: a notebook or a list of notebooks. A notebook is given by its path
+            (dirs are searched for notebooks like the CLI does), its raw content in bytes,
+            or its parsed content (a dict). Contents can also be given by a dict of
+            {name: content}.
+        checks: names of checks, like the CLI flags without `--`. Default all static checks.
+            `execute` only works on notebooks given by path, messages about parameters
+            found go to `logging` and papermill's progress bar is not shown.
+        thresholds: like {"max_cell_count": 30}, the same as CLI options, default values
+            are the same as CLI's.
+    Returns:
+        Dict[str, Dict[str, CheckResult]]: i.e. Dict[name, Dict[check_name, CheckResult]],
+            name is the path of notebook, the key of contents given by a dict, or
+            `<notebook i>` for other contents (`i` is its index in `notebooks`).
+    Raises:
+        ValueError: if any check or threshold is unknown.
+    """
+    checks = list(checks)
+    thresholds = thresholds if thresholds is not None else dict()
+    unknown = [c for c in checks if c not in available_checks]
+    unknown += [t for t in thresholds if t not in THRESHOLDS]
+    if unknown:
+        raise ValueError(f"unknown checks or thresholds: {unknown}")
+
+    args = ParserGetter.get_default_args()
+    for name in checks:
+        setattr(args, name, True)
+    for name, value in thresholds.items():
+        setattr(args, name, value)
+
+    contents = _collect_notebooks(notebooks)
+    runner = CheckRunner(
+        args, resources={"quiet": True}, loader=lambda name: _load_notebook(name, contents)
+    )
+    try:
+        result_dict = runner.run_all(
+            list(contents), [CheckFactory.get_check(name, args) for name in checks]
+        )
+    finally:
+        runner.close()
+    return {
+        name: {check_name: result_dict[check_name][name] for check_name in checks}
+        for name in contents
+    }
+
+
+def _collect_notebooks(notebooks: Any) -> Dict[str, Union[None, bytes, NB_JSON]]:
+    "name -> content, content is None for notebooks given by path."
+    if isinstance(notebooks, Mapping) and "cells" not in notebooks:
+        return dict(notebooks)
+    if isinstance(notebooks, (str, os.PathLike, bytes, Mapping)):
+        notebooks = [notebooks]
+
+    contents: Dict[str, Union[None, bytes, NB_JSON]] = dict()
+    for i, notebook in enumerate(notebooks):
+        if isinstance(notebook, (str, os.PathLike)):
+            path = os.fspath(notebook)
+            if os.path.isdir(path):
+                contents.update(
+                    dict.fromkeys(sorted(collect_files_contain_given_suffix_from_paths([path])))
+                )
+            else:
+                contents[path] = None
+        else:
+            contents[f"<notebook {i}>"] = notebook
+    return contents
+
+
+def _load_notebook(name: str, contents: Dict[str, Union[None, bytes, NB_JSON]]) -> NB_JSON:
+    content = contents[name]
+    if content is None:
+        return load_json_without_outputs(name)
+    if isinstance(content, bytes):
+        return loads_without_outputs(content)
+    return content
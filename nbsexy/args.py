@@ -1,9 +1,13 @@
 import argparse
+import subprocess
 from operator import attrgetter
 from textwrap import dedent
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
+from nbsexy.cache import DEFAULT_CACHE_DIR
 from nbsexy.checks import available_checks
+from nbsexy.config import Config
+from nbsexy.reporters import FORMATS
 
 USAGE = dedent(
     f"""\
@@ -21,6 +25,7 @@ USAGE = dedent(
         nbsexy . --cell_count --is_ascending
         nbsexy a.ipynb b.ipynb --has_md
         nbsexy a.ipynb b.ipynb --line_in_cell --max_line_in_cell 100
+        git ls-files -z '*.ipynb' | nbsexy --files_from - --has_md
     """
 )
 
@@ -30,11 +35,49 @@ class ParserGetter:
         raise NotImplementedError("not for create instance")
 
     @staticmethod
-    def get_args() -> argparse.Namespace:
-        parser, namespace, _ = ParserGetter._create_argparser()
+    def get_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+        """
+        Args:
+            argv: command line arguments, default `sys.argv[1:]`.
+        """
+        parser, namespace, _ = ParserGetter._create_argparser(argv, use_config=True)
+        ParserGetter._assert_root_dirs_or_files_from_is_given(parser, namespace)
         ParserGetter._assert_at_least_one_check_is_called(parser, namespace)
+        ParserGetter._assert_changed_since_is_a_commit(parser, namespace)
+        ParserGetter._assert_git_rev_is_not_used_with_work_tree_options(parser, namespace)
+        ParserGetter._assert_git_rev_is_a_commit(parser, namespace)
+        if namespace.watch and not namespace.root_dirs:
+            parser.error("--watch needs root_dirs to watch")
+        ParserGetter._resolve_max_failures(parser, namespace)
         return namespace
 
+    @staticmethod
+    def get_default_args() -> argparse.Namespace:
+        "Default values of all arguments, no check is selected."
+        _, namespace, _ = ParserGetter._create_argparser([])
+        return namespace
+
+    @staticmethod
+    def get_launch_options(argv: Optional[List[str]] = None) -> argparse.Namespace:
+        """Parse only options that decide how nbsexy is launched (in process or by daemon),
+        other arguments are left to `get_args`, so this never fails on them."""
+        parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+        parser.add_argument("--daemon", action="store_true", default=False)
+        parser.add_argument("--no_daemon", action="store_true", default=False)
+        parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR)
+        parser.add_argument("--files_from", default=None)
+        parser.add_argument("--kernel_pool", default=0, type=int)
+        parser.add_argument("--watch", action="store_true", default=False)
+        namespace, _ = parser.parse_known_args(argv)
+        return namespace
+
+    @staticmethod
+    def _assert_root_dirs_or_files_from_is_given(
+        parser: argparse.ArgumentParser, namespace: argparse.Namespace
+    ) -> None:
+        if not namespace.root_dirs and namespace.files_from is None:
+            parser.error("the following arguments are required: root_dirs")
+
     @staticmethod
     def _assert_at_least_one_check_is_called(
         parser: argparse.ArgumentParser, namespace: argparse.Namespace
@@ -43,16 +86,67 @@ class ParserGetter:
             parser.error("Please select at least one check!")
 
     @staticmethod
-    def _create_argparser() -> Tuple[
-        argparse.ArgumentParser, argparse.Namespace, List[str]
-    ]:
+    def _assert_git_rev_is_not_used_with_work_tree_options(
+        parser: argparse.ArgumentParser, namespace: argparse.Namespace
+    ) -> None:
+        if namespace.git_rev is None:
+            return
+        # notebooks in git objects are not on disk, so they can not be executed.
+        for option in ("execute", "changed_since", "watch"):
+            if attrgetter(option)(namespace):
+                parser.error(f"--{option} is not allowed with --git_rev")
+
+    @staticmethod
+    def _assert_git_rev_is_a_commit(
+        parser: argparse.ArgumentParser, namespace: argparse.Namespace
+    ) -> None:
+        rev = namespace.git_rev
+        if rev is None:
+            return
+        if not _is_commit(rev):
+            parser.error(f"--git_rev: {rev} is not a commit of git repository.")
+
+    @staticmethod
+    def _resolve_max_failures(
+        parser: argparse.ArgumentParser, namespace: argparse.Namespace
+    ) -> None:
+        "`--fail_fast` is `--max_failures 1`, unless a limit is given."
+        if namespace.max_failures < 0:
+            parser.error("--max_failures should not be negative")
+        if namespace.fail_fast and namespace.max_failures == 0:
+            namespace.max_failures = 1
+
+    @staticmethod
+    def _assert_changed_since_is_a_commit(
+        parser: argparse.ArgumentParser, namespace: argparse.Namespace
+    ) -> None:
+        ref = namespace.changed_since
+        if ref is None:
+            return
+        if not _is_commit(ref):
+            parser.error(f"--changed_since: {ref} is not a commit of git repository.")
+
+    @staticmethod
+    def _create_argparser(
+        argv: Optional[List[str]] = None, use_config: bool = False
+    ) -> Tuple[argparse.ArgumentParser, argparse.Namespace, List[str]]:
+        """
+        Args:
+            use_config: read defaults from project config found from current dir.
+        """
         parser = argparse.ArgumentParser(
             description="Check tool on a Jupyter notebook.",
             usage=USAGE,
             allow_abbrev=True,
         )
         parser.add_argument(
-            "root_dirs", nargs="+", help="Notebooks or directories to run command on."
+            "root_dirs", nargs="*", help="Notebooks or directories to run command on."
+        )
+        parser.add_argument(
+            "--files_from",
+            metavar="FILE",
+            help="Read notebooks or directories to run command on from FILE (`-` for stdin), separated by NUL or newline. Used with or instead of `root_dirs`.",
+            default=None,
         )
         parser.add_argument(
             "--cell_count",
@@ -118,12 +212,233 @@ class ParserGetter:
             default=20,
             type=int,
         )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            help="the number of processes to run static checks, 0 means the number of CPUs, default 1. Runs with few notebooks stay in single process.",
+            default=1,
+            type=int,
+        )
+        parser.add_argument(
+            "--execute_jobs",
+            help="the number of notebooks to execute concurrently when `execute`, default 1.",
+            default=1,
+            type=int,
+        )
+        parser.add_argument(
+            "--kernel_pool",
+            help="the number of kernels kept warm for each kernelspec when `execute`, default 0 (no pool). A kernel only serves one notebook and is replaced by a fresh one afterward.",
+            default=0,
+            type=int,
+        )
+        parser.add_argument(
+            "--save_executed",
+            metavar="DIR",
+            help="Save executed notebooks (with outputs) to DIR for debugging, at the same paths as the notebooks relative to current dir. By default executed notebooks are kept in memory only. Notebooks whose results come from the execution cache are not executed, use `--refresh_cache` to save them too.",
+            default=None,
+        )
+        parser.add_argument(
+            "--output_tail",
+            metavar="N",
+            help="When `execute`, outputs of cells are dropped as they arrive so memory stays flat, except errors and the latest N outputs of each cell, which are shown when the notebook fails. default 10. Ignored with `--save_executed`, which keeps all outputs.",
+            default=10,
+            type=int,
+        )
+        parser.add_argument(
+            "--max_cell_seconds",
+            metavar="SECONDS",
+            help="When `execute`, fail a notebook if any of its cells took longer than SECONDS.",
+            default=None,
+            type=float,
+        )
+        parser.add_argument(
+            "--max_notebook_seconds",
+            metavar="SECONDS",
+            help="When `execute`, fail a notebook if its cells took longer than SECONDS in total.",
+            default=None,
+            type=float,
+        )
+        parser.add_argument(
+            "--budget",
+            metavar="SECONDS",
+            help=(
+                "When `execute`, only smoke test: execute cells until SECONDS are spent,"
+                " then stop the kernel and report how many cells passed."
+            ),
+            default=None,
+            type=float,
+        )
+        parser.add_argument(
+            "--kernel_max_memory",
+            metavar="MB",
+            help=(
+                "When `execute`, kill the kernel and fail the notebook once the kernel"
+                " (with its child processes) uses more than MB of memory."
+            ),
+            default=None,
+            type=float,
+        )
+        parser.add_argument(
+            "--kernel_max_cpu_seconds",
+            metavar="SECONDS",
+            help=(
+                "When `execute`, kill the kernel and fail the notebook once the kernel"
+                " (with its child processes) uses more than SECONDS of CPU time,"
+                " counted from the first cell."
+            ),
+            default=None,
+            type=float,
+        )
+        parser.add_argument(
+            "--slowest_cells",
+            metavar="N",
+            help="When `execute`, print the N slowest cells of each notebook, default 0.",
+            default=0,
+            type=int,
+        )
+        parser.add_argument(
+            "--cache_dir",
+            help=f"the directory to store caches, default `{DEFAULT_CACHE_DIR}`.",
+            default=DEFAULT_CACHE_DIR,
+        )
+        parser.add_argument(
+            "--no_cache",
+            action="store_true",
+            default=False,
+            help="Do not read or write caches.",
+        )
+        parser.add_argument(
+            "--refresh_cache",
+            action="store_true",
+            default=False,
+            help="Ignore cached results, run everything again and store the new results.",
+        )
+        parser.add_argument(
+            "--cache_executions",
+            action="store_true",
+            default=False,
+            help="When `execute`, reuse results of notebooks executed before with the same code, parameters, kernel and `--cache_inputs`. Off by default, since anything else a notebook reads (files not listed, network, environment) is not tracked.",
+        )
+        parser.add_argument(
+            "--cache_max_size",
+            help="the maximum size (MB) of cached execution results, least recently used results are evicted first, default 100.",
+            default=100,
+            type=int,
+        )
+        parser.add_argument(
+            "--cache_inputs",
+            nargs="+",
+            help="With `--cache_executions`, files that notebooks read (data, lockfiles...). Cached execution results are invalid once any of them changes.",
+            default=list(),
+        )
         parser.add_argument(
             "--exclude_patterns",
             nargs="+",
             help="Exclude notebook with certain filename patterns, note that some pattern is already filtered, like nb in .git/ and .ipynb_checkpoints/",
             default=list(),
         )
+        parser.add_argument(
+            "--discovery",
+            choices=["filesystem", "git"],
+            help="How to find notebooks in directories. `git` lists files from the git index (honouring .gitignore) for directories inside a git work tree, and walks other directories. default `filesystem`.",
+            default="filesystem",
+        )
+        parser.add_argument(
+            "--include_untracked",
+            action="store_true",
+            default=False,
+            help="With `--discovery git`, also find untracked notebooks that are not ignored.",
+        )
+        parser.add_argument(
+            "--changed_since",
+            metavar="REF",
+            help="Only check notebooks added, modified or renamed since git REF (e.g. origin/main), and untracked notebooks that are not ignored.",
+            default=None,
+        )
+        parser.add_argument(
+            "--git_rev",
+            metavar="REV",
+            help="Check notebooks in git tree of REV (e.g. HEAD) instead of files on disk, works without a checkout (e.g. in a bare clone). `root_dirs` are paths in the repository.",
+            default=None,
+        )
+        parser.add_argument(
+            "--daemon",
+            action="store_true",
+            default=False,
+            help="Start a long-lived nbsexy process for current dir. Following nbsexy commands run in current dir are forwarded to it, and it keeps imports, caches and (with `--kernel_pool`) kernels warm.",
+        )
+        parser.add_argument(
+            "--no_daemon",
+            action="store_true",
+            default=False,
+            help="Run in this process even if a daemon is running.",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            default=False,
+            help="After checking, keep watching `root_dirs` and re-check notebooks once they change, until Ctrl-C.",
+        )
+        parser.add_argument(
+            "--fail_fast",
+            action="store_true",
+            default=False,
+            help="Stop at the first failed (or errored) check, same as `--max_failures 1`.",
+        )
+        parser.add_argument(
+            "--max_failures",
+            metavar="N",
+            help="Stop once N checks failed or errored: notebooks left are not checked and notebooks being executed are interrupted. Results so far are still reported. default 0 (never stop).",
+            default=0,
+            type=int,
+        )
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Also write results as JSON Lines, JUnit XML or SARIF to `--output`. Results are written as soon as each notebook is checked.",
+            default=None,
+        )
+        parser.add_argument(
+            "--output",
+            metavar="FILE",
+            help="Where `--format` report is written, default `-` (stdout, and the usual report goes to stderr).",
+            default="-",
+        )
+
+        config = None
+        if use_config:
+            try:
+                config = Config.find()
+                if config is not None:
+                    known_options = {action.dest for action in parser._actions}
+                    parser.set_defaults(**config.get_defaults(known_options))
+            except ValueError as e:
+                parser.error(f"invalid config: {e}")
 
-        namespace, other_args = parser.parse_known_args()
+        namespace, other_args = parser.parse_known_args(argv)
+        # per-path overrides of config, see `Config.group_files`.
+        namespace.config = config
+        namespace.explicit_options = ParserGetter._get_explicit_options(parser, argv)
         return parser, namespace, other_args
+
+    @staticmethod
+    def _get_explicit_options(
+        parser: argparse.ArgumentParser, argv: Optional[List[str]]
+    ) -> Set[str]:
+        "options given on the command line, argparse only fills defaults of options not seen."
+        not_given = object()
+        namespace = argparse.Namespace(
+            **{action.dest: not_given for action in parser._actions if action.dest != "help"}
+        )
+        parser.parse_known_args(argv, namespace=namespace)
+        return {dest for dest, value in vars(namespace).items() if value is not not_given}
+
+
+def _is_commit(ref: str) -> bool:
+    "whether `ref` is a commit of the git repository of current dir."
+    proc = subprocess.run(
+        ["git", "rev-parse", "--verify", "--quiet", ref + "^{commit}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return proc.returncode == 0
@@ -0,0 +1,288 @@
+"""On-disk caches, stored under `--cache_dir` (default `.nbsexy_cache/`)."""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from nbsexy import __version__
+from nbsexy._checks_fun import CheckResult
+
+DEFAULT_CACHE_DIR = ".nbsexy_cache"
+# (mtime_ns, size, sha256, time read) of a file, taken from the bytes read for checks.
+FILE_STAMP = Tuple[int, int, str, float]
+
+
+class ExecutionCache:
+    """Results of executed notebooks, keyed by everything that decides the result.
+
+    The key is a hash of code cell sources, the parameters used to execute, the
+    kernelspec, the notebook's path (relative files are read from its directory),
+    and the content of user-declared input files (like data files or lockfiles).
+    A hit means the notebook does not need to be executed at all. Anything else a
+    notebook reads (files not declared, network, environment) is not in the key, so
+    the cache is only used if asked (`--cache_executions`).
+
+    Entries are evicted in least-recently-used order when the cache grows over `max_size`.
+
+    Args:
+        cache_dir (str): root dir of caches, results are stored in `cache_dir/execute/`.
+        max_size (int): maximum total bytes of stored results.
+        refresh (bool): if True, never read from cache but still store new results.
+        input_files (List[str]): files that notebooks may read, a change of any of
+            them invalidates all cached results.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_size: int = 100 * 1024 * 1024,
+        refresh: bool = False,
+        input_files: Iterable[str] = (),
+    ) -> None:
+        self.dir = os.path.join(cache_dir, "execute")
+        self.max_size = max_size
+        self.refresh = refresh
+        self.n_hits = 0
+        self.n_misses = 0
+        self._lock = threading.Lock()
+        self._input_files_digest = _hash_files(sorted(input_files))
+        _make_cache_dir(cache_dir)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def get_key(
+        self,
+        nb_json: Dict[str, Any],
+        filename: str,
+        parameters: Dict[str, Any],
+        kernel_name: Optional[str],
+    ) -> str:
+        hasher = hashlib.sha256()
+        for cell in nb_json["cells"]:
+            if cell["cell_type"] == "code":
+                source = cell["source"]
+                hasher.update(("".join(source) if isinstance(source, list) else source).encode())
+                hasher.update(b"\0")
+        content = {
+            "filename": os.path.abspath(filename),
+            "parameters": parameters,
+            "kernel_name": kernel_name,
+            "input_files": self._input_files_digest,
+        }
+        hasher.update(json.dumps(content, sort_keys=True, default=repr).encode())
+        return hasher.hexdigest()
+
+    def get(self, key: str) -> Optional[CheckResult]:
+        path = self._get_path(key)
+        result = None
+        if not self.refresh:
+            try:
+                with open(path, "rt") as f:
+                    result = CheckResult.from_dict(json.load(f))
+                # mtime is the last used time for LRU eviction.
+                os.utime(path)
+            except (OSError, ValueError, KeyError):
+                result = None
+        with self._lock:
+            if result is None:
+                self.n_misses += 1
+            else:
+                self.n_hits += 1
+        return result
+
+    def set(self, key: str, result: CheckResult) -> None:
+        _atomic_write(self._get_path(key), json.dumps(result.to_dict()))
+
+    def close(self) -> None:
+        "Evict least recently used results until the total size is under `max_size`."
+        entries = []
+        for entry in os.scandir(self.dir):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+
+    def get_summary(self) -> str:
+        return f"execution cache: {self.n_hits} hits, {self.n_misses} misses"
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.dir, key + ".json")
+
+
+def _make_cache_dir(cache_dir: str) -> None:
+    "create cache dir which ignores itself in git."
+    os.makedirs(cache_dir, exist_ok=True)
+    gitignore = os.path.join(cache_dir, ".gitignore")
+    if not os.path.exists(gitignore):
+        _atomic_write(gitignore, "# created by nbsexy\n*\n")
+
+
+def _hash_files(filenames: List[str]) -> str:
+    hasher = hashlib.sha256()
+    for filename in filenames:
+        hasher.update(filename.encode() + b"\0")
+        try:
+            with open(filename, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    hasher.update(chunk)
+        except OSError:
+            hasher.update(b"<missing>")
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+def read_and_stamp(filename: str) -> Tuple[bytes, FILE_STAMP]:
+    """Read a file, and stamp it with what was read.
+
+    The stamp describes the bytes returned, even if the file is modified afterwards,
+    so results computed from these bytes are never stored with a newer content.
+    """
+    read_at = time.time()
+    with open(filename, "rb") as f:
+        stat = os.fstat(f.fileno())
+        raw = f.read()
+    # same as `_hash_files([filename])` of an unchanged file.
+    hasher = hashlib.sha256(filename.encode() + b"\0")
+    hasher.update(raw)
+    hasher.update(b"\0")
+    return raw, (stat.st_mtime_ns, stat.st_size, hasher.hexdigest(), read_at)
+
+
+def _atomic_write(path: str, text: str) -> None:
+    "write to a temp file then rename, so readers never see a partial file."
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wt") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class StaticResultCache:
+    """Results of static checks, so unchanged notebooks are never opened again.
+
+    Results are stored per file with its mtime and size. If both are unchanged, cached
+    results are used without opening the file; otherwise the content hash decides.
+    Each check is keyed by its name and kwargs (thresholds), and the whole cache is
+    dropped when nbsexy version changes.
+
+    The file is only rewritten if anything changed. Entries of files that are not
+    checked in a run and no longer exist (deleted or renamed) are dropped then; files
+    not checked but still there are kept, since a run may check only some of them.
+
+    Args:
+        cache_dir (str): root dir of caches, results are stored in `cache_dir/static.json`.
+        refresh (bool): if True, never read from cache but still store new results.
+    """
+
+    # mtime of a file modified right before it was checked is not trusted, since
+    # another modification in the same timestamp granularity keeps the same mtime.
+    RACY_SECONDS = 2
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, refresh: bool = False) -> None:
+        self.path = os.path.join(cache_dir, "static.json")
+        self.refresh = refresh
+        self.n_hits = 0
+        self.n_misses = 0
+        _make_cache_dir(cache_dir)
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        self._is_changed = False
+        # files asked or stored since the cache is loaded (or stats are reset).
+        self._seen: Set[str] = set()
+
+    def get(self, filename: str, check_keys: List[str]) -> Optional[Dict[str, CheckResult]]:
+        """Get cached results of all checks, or None if any of them is not cached.
+
+        Returns:
+            Dict[str, CheckResult]: key is check key.
+        """
+        self._seen.add(filename)
+        results = None if self.refresh else self._get(filename, check_keys)
+        if results is None:
+            self.n_misses += 1
+        else:
+            self.n_hits += 1
+        return results
+
+    def set(self, filename: str, results: Dict[str, CheckResult], stamp: FILE_STAMP) -> None:
+        """store results of a file, `results` key is check key.
+
+        `stamp` is taken by `read_and_stamp` when the file is read for these results,
+        the file is never read again here.
+        """
+        self._seen.add(filename)
+        mtime_ns, size, digest, read_at = stamp
+        entry = self._entries.get(filename)
+        if entry is None or entry["sha256"] != digest:
+            entry = {"sha256": digest, "results": dict()}
+            self._entries[filename] = entry
+        entry.update(mtime_ns=mtime_ns, size=size, checked_at=read_at)
+        entry["results"].update(
+            {check_key: result.to_dict() for check_key, result in results.items()}
+        )
+        self._is_changed = True
+
+    def close(self) -> None:
+        "Drop entries of files gone, and write the cache if anything changed."
+        for filename in [f for f in self._entries if f not in self._seen]:
+            if not os.path.exists(filename):
+                del self._entries[filename]
+                self._is_changed = True
+        if not self._is_changed:
+            return
+        content = {"version": __version__, "entries": self._entries}
+        _atomic_write(self.path, json.dumps(content))
+        self._is_changed = False
+
+    def reset_stats(self) -> None:
+        "Reset statistics, for a cache that serves several runs."
+        self.n_hits = 0
+        self.n_misses = 0
+        self._seen = set()
+
+    def get_summary(self) -> str:
+        n_total = self.n_hits + self.n_misses
+        ratio = self.n_hits / n_total if n_total > 0 else 0
+        return f"static check cache: {self.n_hits}/{n_total} files hit ({ratio:.1%})"
+
+    def _get(self, filename: str, check_keys: List[str]) -> Optional[Dict[str, CheckResult]]:
+        entry = self._entries.get(filename)
+        if entry is None or any(key not in entry["results"] for key in check_keys):
+            return None
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        is_racy = stat.st_mtime_ns / 1e9 >= entry["checked_at"] - self.RACY_SECONDS
+        if stat.st_mtime_ns != entry["mtime_ns"] or stat.st_size != entry["size"] or is_racy:
+            # content may be changed, check by hash.
+            if _hash_files([filename]) != entry["sha256"]:
+                return None
+            if stat.st_mtime_ns != entry["mtime_ns"] or stat.st_size != entry["size"]:
+                entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                self._is_changed = True
+        return {key: CheckResult.from_dict(entry["results"][key]) for key in check_keys}
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "rt") as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            return dict()
+        if not isinstance(content, dict) or content.get("version") != __version__:
+            return dict()
+        return content["entries"]
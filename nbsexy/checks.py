@@ -1,12 +1,21 @@
+import json
+import math
+import os
+import threading
 from argparse import Namespace
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from operator import attrgetter
 from textwrap import dedent
-from typing import Any, Callable, Dict, List, Set, TypeVar, Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, TypeVar, Union
 
 from colorama import Back, Fore, Style
 
 from nbsexy._checks_fun import (
+    OUT_OF_BUDGET,
+    Cancellation,
     CheckResult,
+    ExecutionCancelled,
+    NotebookSummary,
     check_all_code_cell_not_exceed_max_count,
     check_cell_count_not_exceed_max_count,
     check_execution_count_is_ascending,
@@ -14,22 +23,40 @@ from nbsexy._checks_fun import (
     check_nb_can_be_run_without_error_raised,
     check_nb_contains_markdown_cell,
     check_total_line_from_code_cell_not_exceed_max_count,
-    load_json,
 )
+from nbsexy.cache import FILE_STAMP, StaticResultCache, read_and_stamp
+from nbsexy.git_reader import GitBlobReader
+from nbsexy.loader import load_json_without_outputs, loads_without_outputs
 
 NB_JSON = Dict[str, Any]  # parsed ipynb content in json format.
 # KWARGS: additional keyword arguments for check function.
 KWARGS = TypeVar("KWARGS", bound=Dict[str, Any])
-
-
-available_checks = {
+# with `--jobs`, a process is worth to start only if it checks at least this number of files.
+MIN_FILES_PER_JOB = 50
+# files are sent to process pool in chunks, each job gets about CHUNKS_PER_JOB chunks.
+CHUNKS_PER_JOB = 4
+MAX_CHUNK_SIZE = 256
+# options of execution checks.
+EXECUTE_KWARGS = [
+    "save_executed",
+    "output_tail",
+    "max_cell_seconds",
+    "max_notebook_seconds",
+    "budget",
+    "kernel_max_memory",
+    "kernel_max_cpu_seconds",
+]
+
+
+# a tuple rather than a set, so checks are always run and reported in this order.
+available_checks = (
     "cell_count",
     "is_ascending",
     "has_md",
     "line_in_cell",
     "total_line_in_nb",
     "execute",
-}
+)
 
 
 class Check:
@@ -42,6 +69,7 @@ class Check:
         kwargs_list: List[str],
         header_msg: str,
         failed_msg: str,
+        use_summary: bool = False,
     ) -> None:
         """
         Args:
@@ -51,12 +79,16 @@ class Check:
             header_msg (str): the header message. this message will be printed every time CheckRunner called run.
                 Also, kwargs will be sent to message by `format` method, which allow you to get value from argparse.
             failed_msg (str): message printed when at least one file failed to finish check (error raised).
+            use_summary (bool): if True, `fun` receives a `NotebookSummary` instead of the parsed notebook
+                (note that parsed notebook does not contain `outputs` and `attachments`).
+                The summary is computed once per notebook and shared by all checks.
         """
         self.name = name
         self.fun = fun
         self.kwargs_list = kwargs_list
         self.header_msg = header_msg
         self.failed_msg = failed_msg
+        self.use_summary = use_summary
 
 
 class CheckFactory:
@@ -83,43 +115,346 @@ class CheckFactory:
             raise ValueError(f"check not found: {name}")
 
 
+class FailureLimit:
+    """Stop a run once `max_failures` results failed or errored, for `--max_failures`.
+
+    Shared by all runners of a run. Once reached, runners stop starting new files,
+    and notebooks being executed are interrupted by `cancellation` (put it in runner's
+    `resources` so execution checks get it).
+    """
+
+    def __init__(self, max_failures: int) -> None:
+        self.max_failures = max_failures
+        self.n_failures = 0
+        self.cancellation = Cancellation()
+        self._lock = threading.Lock()
+
+    @property
+    def is_reached(self) -> bool:
+        return self.cancellation.is_cancelled
+
+    def add(self, results: Dict[str, CheckResult]) -> None:
+        n_failures = len([r for r in results.values() if r.status in (False, "Error")])
+        if n_failures == 0:
+            return
+        with self._lock:
+            self.n_failures += n_failures
+            is_reached = self.n_failures >= self.max_failures
+        if is_reached:
+            self.cancellation.cancel()
+
+
 class CheckRunner:
     "Define general procedure about how to run a check."
 
-    def __init__(self, args: Namespace):
+    def __init__(
+        self,
+        args: Namespace,
+        resources: Optional[Dict[str, Any]] = None,
+        result_cache: Optional[StaticResultCache] = None,
+        loader: Optional[Callable[[str], NB_JSON]] = None,
+        on_result: Optional[Callable[[str, Dict[str, CheckResult]], None]] = None,
+        failure_limit: Optional[FailureLimit] = None,
+    ):
+        """
+        Args:
+            args (Namespace): parsed arguments, which provide kwargs listed in `Check.kwargs_list`.
+            resources (Dict[str, Any], optional): objects shared by the whole run (like `kernel_pool`),
+                passed to every check function as keyword arguments.
+            result_cache (StaticResultCache, optional): if given, results of static checks
+                are read from and stored to it.
+            loader (Callable[[str], NB_JSON], optional): load notebook by its name, instead of
+                reading the file. Notebooks loaded by it are checked in current process only.
+            on_result (Callable[[str, Dict[str, CheckResult]], None], optional): called with
+                filename and results of all checks (key is check name) as soon as all checks
+                on a file finish.
+            failure_limit (FailureLimit, optional): if given, files left are not checked
+                once it is reached.
+        """
         self._args = args
+        self._resources = resources if resources is not None else dict()
+        self._result_cache = result_cache
+        self._loader = loader
+        self._on_result = on_result
+        self._failure_limit = failure_limit
+        # with `--git_rev`, notebooks are read from git objects instead of files.
+        self._git_rev: Optional[str] = getattr(args, "git_rev", None)
+        self._blob_reader: Optional[GitBlobReader] = None
+        self._blob_reader_lock = threading.Lock()
+        # stamps of files read, so results are cached along with the content they
+        # are computed from. Only taken if results are cached.
+        self._stamp_files = result_cache is not None
+        self._file_stamps: Dict[str, FILE_STAMP] = dict()
 
     def run(
         self, ipynb_filenames: Union[List[str], Set[str]], check: Check
     ) -> Dict[str, CheckResult]:
         """Run one check on several notebooks"""
+        return self.run_all(ipynb_filenames, [check])[check.name]
 
-        kwargs = self._create_kwargs_for_check(check)
-        results: Dict[str, CheckResult] = dict()
+    def run_all(
+        self, ipynb_filenames: Union[List[str], Set[str]], checks: List[Check]
+    ) -> Dict[str, Dict[str, CheckResult]]:
+        """Run several checks on several notebooks.
+
+        Files are iterated in the outer loop, so every notebook is loaded only once
+        and the parsed content is released as soon as all checks for it finish.
+        Static checks (checks that `use_summary`) of a file found in `result_cache`
+        are not run at all. If `--jobs` is set and there are enough files left, static
+        checks are fanned out to a process pool, and the results are merged in the
+        same order as `ipynb_filenames`.
+
+        Once `failure_limit` is reached, files left are skipped and executions running
+        are interrupted, results of these files are missing.
+
+        Returns:
+            Dict[str, Dict[str, CheckResult]]: i.e. Dict[check_name, Dict[filename, CheckResult]]
+        """
+        ipynb_filenames = list(ipynb_filenames)
+        static_checks = [check for check in checks if check.use_summary]
+        other_checks = [check for check in checks if not check.use_summary]
+        file_results: Dict[str, Dict[str, CheckResult]] = {
+            filename: dict() for filename in ipynb_filenames
+        }
+
+        def store(filename: str, results_: Dict[str, CheckResult]) -> None:
+            file_results[filename].update(results_)
+            if self._on_result is not None and len(file_results[filename]) == len(checks):
+                self._on_result(filename, file_results[filename])
+
+        for filename, cached_results in self._get_cached_results(
+            ipynb_filenames, static_checks
+        ).items():
+            self._add_to_failure_limit(cached_results)
+            store(filename, cached_results)
+        uncached_filenames = [f for f in ipynb_filenames if not file_results[f]]
+        fresh_results: Dict[str, Dict[str, CheckResult]] = dict()
+
+        n_jobs = self._get_n_jobs(len(uncached_filenames))
+        if static_checks and n_jobs > 1:
+            for filename, results_ in self._run_in_process_pool(
+                uncached_filenames, static_checks, n_jobs
+            ):
+                fresh_results[filename] = results_
+                store(filename, results_)
+            uncached_filenames = []
+
+        uncached = set(uncached_filenames)
+        files_checks = [
+            (filename, other_checks + static_checks if filename in uncached else other_checks)
+            for filename in ipynb_filenames
+        ]
+        files_checks = [(filename, checks_) for filename, checks_ in files_checks if checks_]
+        if files_checks:
+            kwargs_dict = {
+                check.name: self._create_kwargs_for_check(check) for check in checks
+            }
+            for filename, results_ in self._run_in_current_process(files_checks, kwargs_dict):
+                if filename in uncached:
+                    fresh_results[filename] = results_
+                store(filename, results_)
+
+        self._set_cached_results(fresh_results, static_checks)
+
+        results: Dict[str, Dict[str, CheckResult]] = {check.name: dict() for check in checks}
         for filename in ipynb_filenames:
-            # add name to kwargs:
-            kwargs["filename"] = filename
-            result = self._run_one_file(filename, check, kwargs)
-            results[filename] = result
+            for check in checks:
+                if check.name in file_results[filename]:
+                    results[check.name][filename] = file_results[filename][check.name]
         return results
 
+    def close(self) -> None:
+        "Release resources opened by runner itself."
+        if self._blob_reader is not None:
+            self._blob_reader.close()
+            self._blob_reader = None
+
+    def _get_cached_results(
+        self, ipynb_filenames: List[str], static_checks: List[Check]
+    ) -> Dict[str, Dict[str, CheckResult]]:
+        "results of static checks found in cache, i.e. Dict[filename, Dict[check_name, CheckResult]]"
+        if self._result_cache is None or not static_checks:
+            return dict()
+        check_keys = [self._get_check_key(check) for check in static_checks]
+        cached_results = dict()
+        for filename in ipynb_filenames:
+            results = self._result_cache.get(filename, check_keys)
+            if results is not None:
+                cached_results[filename] = {
+                    check.name: results[key] for check, key in zip(static_checks, check_keys)
+                }
+        return cached_results
+
+    def _set_cached_results(
+        self, fresh_results: Dict[str, Dict[str, CheckResult]], static_checks: List[Check]
+    ) -> None:
+        # stamps of files read only for other checks (static results from cache) are dropped too.
+        file_stamps, self._file_stamps = self._file_stamps, dict()
+        if self._result_cache is None or not static_checks:
+            return
+        check_keys = [self._get_check_key(check) for check in static_checks]
+        for filename, results in fresh_results.items():
+            # errors (e.g. file is being written) are not cached.
+            to_cache = {
+                key: results[check.name]
+                for check, key in zip(static_checks, check_keys)
+                if results[check.name].status != "Error"
+            }
+            stamp = file_stamps.get(filename)
+            if to_cache and stamp is not None:
+                self._result_cache.set(filename, to_cache, stamp)
+
+    def _get_check_key(self, check: Check) -> str:
+        "a result is reusable only if check name and its kwargs (thresholds) are the same."
+        kwargs = self._create_kwargs_for_check(check)
+        return f"{check.name}:" + json.dumps(kwargs, sort_keys=True, default=repr)
+
+    def _run_in_current_process(
+        self,
+        files_checks: List[Tuple[str, List[Check]]],
+        kwargs_dict: Dict[str, KWARGS],
+    ) -> Iterator[Tuple[str, Dict[str, CheckResult]]]:
+        """run checks file by file, and yield (filename, results) in order of files.
+
+        Execution checks spend most of time waiting for kernels, so with `--execute_jobs`
+        files are run by a thread pool and several notebooks are executed concurrently.
+        Files whose execution is cancelled (see `FailureLimit`) are not yielded.
+        """
+        n_execute_jobs = getattr(self._args, "execute_jobs", 1)
+        if n_execute_jobs <= 1 or all(
+            check.use_summary for _, checks in files_checks for check in checks
+        ):
+            for filename, checks in files_checks:
+                if self._is_failure_limit_reached():
+                    return
+                try:
+                    yield filename, self._run_one_file_and_count(filename, checks, kwargs_dict)
+                except ExecutionCancelled:
+                    return
+            return
+
+        with ThreadPoolExecutor(max_workers=n_execute_jobs) as executor:
+            futures: List[Future] = [
+                executor.submit(self._run_one_file_and_count, filename, checks, kwargs_dict)
+                for filename, checks in files_checks
+            ]
+            for (filename, _), future in zip(files_checks, futures):
+                if self._is_failure_limit_reached():
+                    # not started ones are dropped, running ones are interrupted by
+                    # the cancellation, finished ones are still reported.
+                    for f in futures:
+                        f.cancel()
+                if future.cancelled():
+                    continue
+                try:
+                    yield filename, future.result()
+                except ExecutionCancelled:
+                    continue
+
+    def _get_n_jobs(self, n_files: int) -> int:
+        "number of processes worth to start, 1 means run in current process."
+        if self._loader is not None:
+            return 1
+        n_jobs = getattr(self._args, "jobs", 1)
+        if n_jobs == 0:
+            n_jobs = os.cpu_count() or 1
+        return max(1, min(n_jobs, n_files // MIN_FILES_PER_JOB))
+
+    def _run_in_process_pool(
+        self, ipynb_filenames: List[str], checks: List[Check], n_jobs: int
+    ) -> Iterator[Tuple[str, Dict[str, CheckResult]]]:
+        "run checks in subprocesses chunk by chunk, and yield (filename, results) in order of files."
+        chunk_size = min(
+            MAX_CHUNK_SIZE, math.ceil(len(ipynb_filenames) / (n_jobs * CHUNKS_PER_JOB))
+        )
+        chunks = [
+            ipynb_filenames[i : i + chunk_size]
+            for i in range(0, len(ipynb_filenames), chunk_size)
+        ]
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [
+                executor.submit(
+                    _run_files_in_subprocess, self._args, checks, chunk, self._stamp_files
+                )
+                for chunk in chunks
+            ]
+            try:
+                # results are taken in order of chunks, so the output is deterministic.
+                for chunk, future in zip(chunks, futures):
+                    for filename, (results, stamp) in zip(chunk, future.result()):
+                        if stamp is not None:
+                            self._file_stamps[filename] = stamp
+                        self._add_to_failure_limit(results)
+                        yield filename, results
+                        if self._is_failure_limit_reached():
+                            return
+            finally:
+                for future in futures:
+                    future.cancel()
+
     def _create_kwargs_for_check(self, check: Check) -> KWARGS:
         "pair the kwargs specified by check instance and argparse.Namespace"
         return {kw: attrgetter(kw)(self._args) for kw in check.kwargs_list}
 
-    def _run_one_file(self, filename: str, check: Check, kwargs: KWARGS) -> CheckResult:
-        """run check on one file.
+    def _run_one_file_and_count(
+        self, filename: str, checks: List[Check], kwargs_dict: Dict[str, KWARGS]
+    ) -> Dict[str, CheckResult]:
+        results = self._run_one_file(filename, checks, kwargs_dict)
+        self._add_to_failure_limit(results)
+        return results
+
+    def _add_to_failure_limit(self, results: Dict[str, CheckResult]) -> None:
+        if self._failure_limit is not None:
+            self._failure_limit.add(results)
+
+    def _is_failure_limit_reached(self) -> bool:
+        return self._failure_limit is not None and self._failure_limit.is_reached
+
+    def _run_one_file(
+        self, filename: str, checks: List[Check], kwargs_dict: Dict[str, KWARGS]
+    ) -> Dict[str, CheckResult]:
+        """run checks on one file.
 
         Returns:
-            Union[bool, None]: True if sucess, False if check not pass. 'Error' if error occured.
+            Dict[str, CheckResult]: key is check name. status is True if sucess,
+                False if check not pass. 'Error' if error occured.
         """
         try:
-            nb_json: NB_JSON = load_json(filename)
-            check_result = check.fun(nb_json, **kwargs)
+            nb_json: NB_JSON = self._load_notebook(filename)
         except Exception as e:
-            check_result = self._create_check_result_for_check_that_raised(e)
+            error_result = self._create_check_result_for_check_that_raised(e)
+            return {check.name: error_result for check in checks}
 
-        return check_result
+        nb_summary: Optional[NotebookSummary] = None
+        results: Dict[str, CheckResult] = dict()
+        for check in checks:
+            # add name to kwargs:
+            kwargs = dict(kwargs_dict[check.name], filename=filename, **self._resources)
+            try:
+                if check.use_summary:
+                    if nb_summary is None:
+                        nb_summary = NotebookSummary.from_nb_json(nb_json)
+                    results[check.name] = check.fun(nb_summary, **kwargs)
+                else:
+                    results[check.name] = check.fun(nb_json, **kwargs)
+            except ExecutionCancelled:
+                raise
+            except Exception as e:
+                results[check.name] = self._create_check_result_for_check_that_raised(e)
+        return results
+
+    def _load_notebook(self, filename: str) -> NB_JSON:
+        if self._loader is not None:
+            return self._loader(filename)
+        if self._git_rev is None:
+            if not self._stamp_files:
+                return load_json_without_outputs(filename)
+            raw, self._file_stamps[filename] = read_and_stamp(filename)
+            return loads_without_outputs(raw)
+        with self._blob_reader_lock:
+            if self._blob_reader is None:
+                self._blob_reader = GitBlobReader()
+        return loads_without_outputs(self._blob_reader.read(self._git_rev, filename))
 
     def _create_check_result_for_check_that_raised(self, e: Exception):
         return CheckResult(
@@ -146,11 +481,31 @@ class CheckRunner:
     ) -> None:
         n_results = len(check_results)
         n_success = len([c for c in check_results.values() if c.status is True])
+        # out of budget is not a failure, it is counted on its own (see `--budget`).
+        n_out_of_budget = len(
+            [c for c in check_results.values() if c.status == OUT_OF_BUDGET]
+        )
         kwargs = self._create_kwargs_for_check(check)
-        status_style = Fore.RED if n_success != n_results else Fore.GREEN
+        if n_success + n_out_of_budget != n_results:
+            status_style = Fore.RED
+        elif n_out_of_budget > 0:
+            status_style = Fore.CYAN
+        else:
+            status_style = Fore.GREEN
         status_style = status_style + Style.BRIGHT  # + Back.LIGHTWHITE_EX
+        out_of_budget_msg = (
+            ", " + Fore.CYAN + f"{n_out_of_budget} out of budget" + Fore.RESET
+            if n_out_of_budget > 0
+            else ""
+        )
         status_msg = (
-            " [" + status_style + f"{n_success}" + Style.RESET_ALL + f"/{n_results}]"
+            " ["
+            + status_style
+            + f"{n_success}"
+            + Style.RESET_ALL
+            + f"/{n_results}"
+            + out_of_budget_msg
+            + "]"
         )
         header_msg = (
             Style.BRIGHT
@@ -168,6 +523,8 @@ class CheckRunner:
             color = Fore.GREEN
         elif check_result.status is False:
             color = Fore.RED
+        elif check_result.status == OUT_OF_BUDGET:
+            color = Fore.CYAN
         else:
             color = Fore.RED + Back.YELLOW
         print(
@@ -179,7 +536,7 @@ class CheckRunner:
             + Back.RESET
             + Style.RESET_ALL,
         )
-        if check_result.status is False and len(check_result.info) > 0:
+        if check_result.status in (False, OUT_OF_BUDGET) and len(check_result.info) > 0:
             # prin info:
             print(f"    * {check_result.info}")
 
@@ -193,6 +550,28 @@ class CheckRunner:
         print(msg, end="\n\n")
 
 
+def _run_files_in_subprocess(
+    args: Namespace, checks: List[Check], ipynb_filenames: List[str], stamp_files: bool
+) -> List[Tuple[Dict[str, CheckResult], Optional[FILE_STAMP]]]:
+    """entry point of process pool workers, only compact CheckResults are sent back.
+
+    With `stamp_files`, each result comes with the stamp of the file read for it.
+    """
+    runner = CheckRunner(args)
+    runner._stamp_files = stamp_files
+    kwargs_dict = {check.name: runner._create_kwargs_for_check(check) for check in checks}
+    try:
+        return [
+            (
+                runner._run_one_file(filename, checks, kwargs_dict),
+                runner._file_stamps.pop(filename, None),
+            )
+            for filename in ipynb_filenames
+        ]
+    finally:
+        runner.close()
+
+
 cell_count = Check(
     name="cell_count",
     fun=check_cell_count_not_exceed_max_count,
@@ -204,6 +583,7 @@ cell_count = Check(
         Try to split these notebooks to multiple notebooks.
         {Fore.RESET}"""
     ),
+    use_summary=True,
 )
 
 is_ascending_ = Check(
@@ -217,6 +597,7 @@ is_ascending_ = Check(
         Try to 'restart and run all' or rearrange your cells.
         {Fore.RESET}"""
     ),
+    use_summary=True,
 )
 
 has_md = Check(
@@ -230,6 +611,7 @@ has_md = Check(
         Try to add some markdown cell and write some information about your notebook.
         {Fore.RESET}"""
     ),
+    use_summary=True,
 )
 
 line_in_cell = Check(
@@ -242,6 +624,7 @@ line_in_cell = Check(
         Some of your notebook have too many lines.
         {Fore.RESET}"""
     ),
+    use_summary=True,
 )
 
 total_line_in_nb = Check(
@@ -255,12 +638,13 @@ total_line_in_nb = Check(
         You should consider split your notebook to several notebook with different purpose.
         {Fore.RESET}"""
     ),
+    use_summary=True,
 )
 
 execute = Check(
     name="execute",
     fun=check_nb_can_be_run_without_error_raised,
-    kwargs_list=[],
+    kwargs_list=EXECUTE_KWARGS,
     header_msg="check notebook can be executed and no error raised: ",
     failed_msg=dedent(
         f"""{Fore.RED}
@@ -272,7 +656,7 @@ execute = Check(
 execute_with_parameter = Check(
     name="execute",
     fun=check_nb_can_be_run_parameterizd_without_error_raised,
-    kwargs_list=[],
+    kwargs_list=EXECUTE_KWARGS,
     header_msg="check notebook can be (parametered) executed and no error raised: ",
     failed_msg=dedent(
         f"""{Fore.RED}
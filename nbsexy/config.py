@@ -0,0 +1,194 @@
+"""Project config, read from `.nbsexy.toml` or `[tool.nbsexy]` of `pyproject.toml`.
+
+Example (`pyproject.toml`, in `.nbsexy.toml` drop the `tool.nbsexy` prefix):
+
+    [tool.nbsexy]
+    checks = ["has_md", "cell_count", "is_ascending"]
+    max_cell_count = 30
+    exclude_patterns = ["*scratch*"]
+
+    [[tool.nbsexy.overrides]]
+    paths = ["legacy", "experiments/*"]
+    max_cell_count = 60
+    is_ascending = false
+
+Options have the same names as CLI options, and options given by CLI win. An override
+applies to notebooks in directories (relative to the config file) matching any of
+its `paths`, and in their sub directories. Later overrides win over earlier ones.
+"""
+import fnmatch
+import os
+import posixpath
+from argparse import Namespace
+from copy import copy
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import tomllib as _toml
+except ImportError:  # pragma: no cover - python < 3.11
+    try:
+        import tomli as _toml
+    except ImportError:
+        _toml = None
+
+from nbsexy.checks import available_checks
+
+CONFIG_FILENAMES = (".nbsexy.toml", "pyproject.toml")
+THRESHOLDS = ("max_cell_count", "max_line_in_cell", "max_total_line_in_nb")
+# options that decide how a single notebook is checked, so they can be overridden by path.
+OVERRIDABLE_OPTIONS = frozenset(
+    {"checks", *available_checks, *THRESHOLDS, "execute_without_parameters"}
+)
+# options about a single invocation, not for a project config.
+NON_CONFIG_OPTIONS = frozenset(
+    {"root_dirs", "files_from", "daemon", "no_daemon", "watch", "changed_since", "git_rev"}
+)
+
+
+class Config:
+    """
+    Args:
+        path (str): path of config file.
+        options (Dict[str, Any]): options for all notebooks.
+        overrides (List[Tuple[List[str], Dict[str, Any]]]): pairs of (paths, options).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        options: Dict[str, Any],
+        overrides: List[Tuple[List[str], Dict[str, Any]]],
+    ) -> None:
+        self.path = path
+        self.root = os.path.dirname(os.path.abspath(path))
+        self.options = options
+        self.overrides = overrides
+
+    @classmethod
+    def find(cls, start_dir: str = ".") -> Optional["Config"]:
+        """Find config in `start_dir` and its parents, the nearest one is used.
+
+        Raises:
+            ValueError: if config is invalid.
+        """
+        dirname = os.path.abspath(start_dir)
+        while True:
+            for filename in CONFIG_FILENAMES:
+                path = os.path.join(dirname, filename)
+                if os.path.isfile(path):
+                    config = cls.load(path)
+                    if config is not None:
+                        return config
+            parent = os.path.dirname(dirname)
+            if parent == dirname:
+                return None
+            dirname = parent
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Config"]:
+        """Load config, or None if it is a `pyproject.toml` without `[tool.nbsexy]`.
+
+        Raises:
+            ValueError: if config is invalid.
+        """
+        with open(path, "rb") as f:
+            raw = f.read()
+        is_pyproject = os.path.basename(path) == "pyproject.toml"
+        if is_pyproject and b"tool.nbsexy" not in raw:
+            return None
+        if _toml is None:
+            raise ValueError(f"{path}: reading config needs `tomli` on python < 3.11")
+        try:
+            content = _toml.loads(raw.decode())
+        except (_toml.TOMLDecodeError, UnicodeDecodeError) as e:
+            raise ValueError(f"{path}: {e}")
+        if is_pyproject:
+            content = content.get("tool", {}).get("nbsexy")
+            if content is None:
+                return None
+
+        content = dict(content)
+        overrides = []
+        for override in content.pop("overrides", []):
+            override = dict(override)
+            paths = override.pop("paths", None)
+            if not isinstance(paths, list) or not paths:
+                raise ValueError(f"{path}: every override needs a list of `paths`")
+            unknown = set(override) - OVERRIDABLE_OPTIONS
+            if unknown:
+                raise ValueError(f"{path}: options can not be overridden: {sorted(unknown)}")
+            overrides.append(([p.strip("/") for p in paths], _normalize(override, path)))
+        return cls(path, _normalize(content, path), overrides)
+
+    def get_defaults(self, known_options: Iterable[str]) -> Dict[str, Any]:
+        """options for `ArgumentParser.set_defaults`.
+
+        Raises:
+            ValueError: if any option is unknown.
+        """
+        unknown = set(self.options) - (set(known_options) - NON_CONFIG_OPTIONS)
+        if unknown:
+            raise ValueError(f"{self.path}: unknown options: {sorted(unknown)}")
+        return dict(self.options)
+
+    def group_files(self, args: Namespace, files: List[str]) -> List[Tuple[Namespace, List[str]]]:
+        """Group files by options they are checked with.
+
+        Overrides are resolved once per directory. Options given on the command line
+        (`args.explicit_options`) are never overridden.
+
+        Returns:
+            List[Tuple[Namespace, List[str]]]: pairs of (args, files), `args` is `args`
+                with overrides applied. Files keep their order in each group.
+        """
+        if not self.overrides:
+            return [(args, files)]
+        explicit_options = getattr(args, "explicit_options", set())
+        override_indice_by_dir: Dict[str, Tuple[int, ...]] = dict()
+        groups: Dict[Tuple[int, ...], List[str]] = dict()
+        for filename in files:
+            dirname = os.path.dirname(filename)
+            if dirname not in override_indice_by_dir:
+                override_indice_by_dir[dirname] = self._match_overrides(dirname)
+            groups.setdefault(override_indice_by_dir[dirname], []).append(filename)
+
+        result = []
+        for indice, group_files in groups.items():
+            group_args = copy(args)
+            for i in indice:
+                for name, value in self.overrides[i][1].items():
+                    if name not in explicit_options:
+                        setattr(group_args, name, value)
+            result.append((group_args, group_files))
+        return result
+
+    def _match_overrides(self, dirname: str) -> Tuple[int, ...]:
+        relative = os.path.relpath(os.path.abspath(dirname), self.root)
+        if relative == os.curdir:
+            relative = ""
+        elif relative.startswith(os.pardir):
+            return ()
+        relative = relative.replace(os.sep, "/")
+        # the dir itself and all its parents.
+        candidates = [relative]
+        while relative:
+            relative = posixpath.dirname(relative)
+            candidates.append(relative)
+        return tuple(
+            i
+            for i, (patterns, _) in enumerate(self.overrides)
+            if any(fnmatch.fnmatch(c, p) for c in candidates for p in patterns)
+        )
+
+
+def _normalize(options: Dict[str, Any], path: str) -> Dict[str, Any]:
+    "turn `checks = [...]` into flags of checks, like CLI."
+    options = dict(options)
+    if "checks" in options:
+        checks = options.pop("checks")
+        unknown = set(checks) - set(available_checks)
+        if unknown:
+            raise ValueError(f"{path}: unknown checks: {sorted(unknown)}")
+        for name in available_checks:
+            options.setdefault(name, name in checks)
+    return options
@@ -0,0 +1,249 @@
+"""A long-lived nbsexy process, and the client that forwards commands to it.
+
+`nbsexy --daemon` listens on a Unix socket in the cache dir at the top level of
+the git work tree of current dir, or of current dir if it is not in a work tree
+(`<repo>/.nbsexy_cache/daemon.sock` by default). Later `nbsexy` commands run
+anywhere in the same repository connect to it and the daemon runs `Launcher` for
+them, so interpreter start, imports and loading caches are paid only once. With
+`--kernel_pool`, the daemon also keeps kernels warm between commands.
+
+Protocol: the client sends one json line (version, cwd, argv, terminal columns).
+The daemon replies with frames of `channel (1 byte) + length (4 bytes) + payload`,
+where channel is `o` for stdout, `e` for stderr, and `x` for the exit code.
+If versions do not match the daemon replies `v` and the client runs in process.
+An invalid request gets an error on `e` and exit code 2.
+"""
+import io
+import json
+import os
+import shutil
+import signal
+import socket
+import struct
+import sys
+import traceback
+from argparse import Namespace
+from contextlib import redirect_stderr, redirect_stdout
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Type
+
+from nbsexy import __version__
+from nbsexy.args import ParserGetter
+from nbsexy.cache import StaticResultCache, _make_cache_dir
+from nbsexy.path_helper import find_work_tree_root
+
+if TYPE_CHECKING:
+    from nbsexy.__main__ import Launcher
+
+SOCKET_NAME = "daemon.sock"
+_FRAME_HEADER = struct.Struct(">cI")
+
+
+def get_socket_path(cache_dir: str) -> str:
+    "a relative `cache_dir` is under the top level of the git work tree of current dir."
+    if not os.path.isabs(cache_dir):
+        cache_dir = os.path.join(find_work_tree_root(os.getcwd()), cache_dir)
+    return os.path.join(cache_dir, SOCKET_NAME)
+
+
+def forward_to_daemon(options: Namespace, argv: List[str]) -> Optional[int]:
+    """Run command by daemon, and print its outputs.
+
+    Returns:
+        Optional[int]: exit code, or None if no daemon can run this command.
+    """
+    # the daemon can not read stdin of this process, and serves one command at a time.
+    if not hasattr(socket, "AF_UNIX") or options.files_from == "-" or options.watch:
+        return None
+    path = get_socket_path(options.cache_dir)
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        # stale socket of a daemon that was killed.
+        sock.close()
+        return None
+
+    request = {
+        "version": __version__,
+        "cwd": os.getcwd(),
+        "argv": argv,
+        "columns": shutil.get_terminal_size((80, 24)).columns,
+    }
+    with sock, sock.makefile("rb") as reader:
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        while True:
+            header = reader.read(_FRAME_HEADER.size)
+            if len(header) < _FRAME_HEADER.size:
+                print("nbsexy: error: lost connection to daemon", file=sys.stderr)
+                return 1
+            channel, length = _FRAME_HEADER.unpack(header)
+            payload = reader.read(length)
+            if channel == b"o":
+                sys.stdout.buffer.write(payload)
+                sys.stdout.buffer.flush()
+            elif channel == b"e":
+                sys.stderr.buffer.write(payload)
+                sys.stderr.buffer.flush()
+            elif channel == b"x":
+                return int(payload)
+            else:
+                # b"v": daemon of another version.
+                return None
+
+
+def serve(options: Namespace, launcher_class: Type["Launcher"]) -> int:
+    "Run daemon until it is interrupted (Ctrl-C or SIGTERM)."
+    if not hasattr(socket, "AF_UNIX"):
+        print("nbsexy: error: --daemon needs Unix sockets", file=sys.stderr)
+        return 2
+    path = get_socket_path(options.cache_dir)
+    _make_cache_dir(os.path.dirname(path))
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            print(f"nbsexy: error: a daemon is already listening on {path}", file=sys.stderr)
+            return 2
+        except OSError:
+            os.remove(path)
+        finally:
+            probe.close()
+
+    daemon = _Daemon(options, launcher_class)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # treat SIGTERM like Ctrl-C, so the socket is removed either way.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.bind(path)
+        server.listen()
+        print(f"nbsexy daemon is listening on {path}", flush=True)
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                daemon.handle(conn)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.remove(path)
+        daemon.close()
+
+
+class _Daemon:
+    "State kept warm between commands. Commands are run one by one."
+
+    def __init__(self, options: Namespace, launcher_class: Type["Launcher"]) -> None:
+        self.cwd = os.getcwd()
+        self._launcher_class = launcher_class
+        self.kernel_pool = None
+        if options.kernel_pool > 0:
+            from nbsexy.kernel_pool import KernelPool
+
+            self.kernel_pool = KernelPool(options.kernel_pool)
+        # key is absolute cache dir.
+        self.result_caches: Dict[str, StaticResultCache] = dict()
+
+    def handle(self, conn: socket.socket) -> None:
+        try:
+            with conn.makefile("rb") as reader:
+                request = json.loads(reader.readline())
+            if isinstance(request, dict) and request.get("version") != __version__:
+                _send_frame(conn, b"v", b"")
+                return
+            error = _validate_request(request)
+            if error is not None:
+                _send_frame(conn, b"e", f"nbsexy: error: {error}\n".encode())
+                _send_frame(conn, b"x", b"2")
+                return
+        except ValueError:
+            # not json, or a partial line.
+            try:
+                _send_frame(conn, b"e", b"nbsexy: error: invalid request to daemon\n")
+                _send_frame(conn, b"x", b"2")
+            except OSError:
+                pass
+            return
+        except OSError:
+            return
+
+        stdout = _FrameWriter(conn, b"o")
+        stderr = _FrameWriter(conn, b"e")
+        old_columns = os.environ.get("COLUMNS")
+        os.environ["COLUMNS"] = str(request["columns"])
+        try:
+            os.chdir(request["cwd"])
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                returncode = self._run(request["argv"])
+            _send_frame(conn, b"x", str(returncode).encode())
+        except OSError:
+            # client went away.
+            pass
+        finally:
+            os.chdir(self.cwd)
+            if old_columns is None:
+                os.environ.pop("COLUMNS", None)
+            else:
+                os.environ["COLUMNS"] = old_columns
+
+    def _run(self, argv: List[str]) -> int:
+        try:
+            options = ParserGetter.get_launch_options(argv)
+            cache_dir = os.path.abspath(options.cache_dir)
+            if cache_dir not in self.result_caches:
+                self.result_caches[cache_dir] = StaticResultCache(cache_dir)
+            launcher = self._launcher_class(
+                argv,
+                kernel_pool=self.kernel_pool,
+                result_cache=self.result_caches[cache_dir],
+            )
+            return launcher.run()
+        except SystemExit as e:
+            # like the interpreter does for `sys.exit`.
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+            print(e.code, file=sys.stderr)
+            return 1
+        except Exception:
+            traceback.print_exc()
+            return 1
+
+    def close(self) -> None:
+        if self.kernel_pool is not None:
+            self.kernel_pool.close()
+
+
+def _validate_request(request: Any) -> Optional[str]:
+    "why the request is invalid, or None if it is valid."
+    if not isinstance(request, dict):
+        return "invalid request to daemon: not a json object"
+    argv = request.get("argv")
+    if not isinstance(argv, list) or not all(isinstance(arg, str) for arg in argv):
+        return "invalid request to daemon: argv should be a list of strings"
+    if not isinstance(request.get("cwd"), str) or not os.path.isdir(request["cwd"]):
+        return "invalid request to daemon: cwd should be an existing dir"
+    if not isinstance(request.get("columns"), int):
+        return "invalid request to daemon: columns should be an int"
+    return None
+
+
+class _FrameWriter(io.TextIOBase):
+    "A text stream that sends everything written to client as frames of `channel`."
+
+    def __init__(self, conn: socket.socket, channel: bytes) -> None:
+        self._conn = conn
+        self._channel = channel
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            _send_frame(self._conn, self._channel, text.encode())
+        return len(text)
+
+
+def _send_frame(conn: socket.socket, channel: bytes, payload: bytes) -> None:
+    conn.sendall(_FRAME_HEADER.pack(channel, len(payload)) + payload)
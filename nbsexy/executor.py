@@ -0,0 +1,414 @@
+"""Execute notebooks with papermill.
+
+Functions here are safe to be called from several threads at the same time,
+which is how `--execute_jobs` runs notebooks concurrently.
+
+Notebooks are executed by the `nbsexy` papermill engine, which is the same as
+papermill's default nbclient engine, except that it can run a notebook on a
+kernel that is already started (see `nbsexy.kernel_pool`).
+
+Unlike `papermill.execute_notebook`, the notebook already parsed by the runner is
+executed as it is, instead of reading the file again, and the executed notebook
+is kept in memory (and dropped) unless it is asked to be saved. If it is not saved,
+outputs are dropped as they arrive, except errors and a few latest outputs of each
+cell, so memory does not grow with how much a notebook prints or plots.
+"""
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+
+import nbformat
+from nbclient.util import run_sync
+from nbformat.notebooknode import NotebookNode
+from nbformat.reader import get_version
+from nbformat.v4 import output_from_msg
+from papermill import __version__ as papermill_version
+from papermill.clientwrap import PapermillNotebookClient
+from papermill.engines import NBClientEngine, papermill_engines
+from papermill.exceptions import PapermillExecutionError
+from papermill.execute import ERROR_MARKER_TAG, raise_for_execution_errors
+from papermill.log import logger
+from papermill.parameterize import parameterize_notebook
+from papermill.utils import merge_kwargs, nb_kernel_name, remove_args
+
+from nbsexy._checks_fun import (
+    CELL_SECONDS,
+    BudgetExhausted,
+    Cancellation,
+    KernelLimitExceeded,
+)
+
+if TYPE_CHECKING:
+    from nbsexy.kernel_monitor import KernelMonitor
+    from nbsexy.kernel_pool import KernelPool
+
+ENGINE_NAME = "nbsexy"
+# number of latest outputs (besides errors) kept for each cell, when outputs are dropped.
+DEFAULT_OUTPUT_TAIL = 10
+# with a budget, a cell is interrupted once at most this much time is left.
+MIN_CELL_TIMEOUT_SECONDS = 0.01
+# characters of these outputs shown in a failure report.
+MAX_OUTPUT_TAIL_CHARS = 2000
+MAX_FIRST_LINE_CHARS = 60
+
+
+class NbsexyNotebookClient(PapermillNotebookClient):
+    """papermill's notebook client that also works with a started kernel.
+
+    If a kernel manager is given (`owns_km` is False), the kernel is a warm kernel
+    from `KernelPool`, which is a python kernel started in another directory, so the
+    kernel moves to the notebook's directory before any cell is executed. The kernel
+    client is closed after execution, and the kernel is left to its owner.
+
+    If `cancellation` is set, the kernel is registered to it while executing, and
+    no cell is started once it is cancelled.
+
+    If `output_tail` is set, outputs of a cell are dropped as they arrive, except
+    errors and the latest `output_tail` outputs. Errors decide whether the notebook
+    failed, and the tail is shown in the failure report.
+
+    If `budget` (seconds) is set, cells are executed until it is spent from the first
+    cell on: the running cell is interrupted by nbclient's timeout, no more cell is
+    started, and `BudgetExhausted` is raised.
+
+    If `kernel_monitor` is set, it samples the kernel from its start to the end of
+    execution, and CPU time is counted from the first cell on.
+    """
+
+    cancellation: Optional[Cancellation] = None
+    kernel_monitor: Optional["KernelMonitor"] = None
+    output_tail: Optional[int] = None
+    budget: Optional[float] = None
+    _deadline: Optional[float] = None
+    _n_cells_passed = 0
+    _is_cpu_baseline_set = False
+
+    def set_budget(self, budget: float) -> None:
+        self.budget = budget
+        self.interrupt_on_timeout = True
+        self.timeout_func = self._get_remaining_budget
+
+    def _get_remaining_budget(self, cell) -> float:
+        return max(self._deadline - time.monotonic(), MIN_CELL_TIMEOUT_SECONDS)
+
+    def _is_budget_spent(self) -> bool:
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    def _raise_budget_exhausted(self) -> None:
+        n_cells = len(
+            [
+                cell
+                for cell in self.nb.cells
+                if cell.cell_type == "code"
+                and "injected-parameters" not in cell.metadata.get("tags", [])
+            ]
+        )
+        raise BudgetExhausted(self._n_cells_passed, n_cells)
+
+    async def async_start_new_kernel_client(self):
+        kc = await super().async_start_new_kernel_client()
+        if self.cancellation is not None:
+            self.cancellation.register(self.km)
+        pid = getattr(getattr(self.km, "provisioner", None), "pid", None)
+        if self.kernel_monitor is not None and pid is not None:
+            self.kernel_monitor.start(pid)
+        cwd = self.resources.get("metadata", {}).get("path")
+        if not self.owns_km and cwd:
+            msg_id = kc.execute(
+                f"import os as _nbsexy_os; _nbsexy_os.chdir({cwd!r}); del _nbsexy_os",
+                silent=True,
+                store_history=False,
+            )
+            await self.async_wait_for_reply(msg_id)
+        return kc
+
+    start_new_kernel_client = run_sync(async_start_new_kernel_client)
+
+    async def async_execute_cell(self, cell, *args, **kwargs):
+        if self.cancellation is not None:
+            self.cancellation.check()
+        if self.kernel_monitor is not None and not self._is_cpu_baseline_set:
+            self._is_cpu_baseline_set = True
+            self.kernel_monitor.set_cpu_baseline()
+        if self.budget is None or cell.cell_type != "code":
+            return await super().async_execute_cell(cell, *args, **kwargs)
+
+        if self._deadline is None:
+            self._deadline = time.monotonic() + self.budget
+        if self._is_budget_spent():
+            self._raise_budget_exhausted()
+        try:
+            result = await super().async_execute_cell(cell, *args, **kwargs)
+        except Exception:
+            # the error (or the missing reply) is from the interruption.
+            if self._is_budget_spent():
+                self._raise_budget_exhausted()
+            raise
+        if "injected-parameters" not in cell.metadata.get("tags", []):
+            self._n_cells_passed += 1
+        return result
+
+    execute_cell = run_sync(async_execute_cell)
+
+    def output(self, outs, msg, display_id, cell_index):
+        parent_msg_id = msg["parent_header"].get("msg_id")
+        if self.output_tail is None or self.output_hook_stack[parent_msg_id]:
+            return super().output(outs, msg, display_id, cell_index)
+        try:
+            out = output_from_msg(msg)
+        except ValueError:
+            self.log.error(f"unhandled iopub msg: {msg['msg_type']}")
+            return None
+        if self.clear_before_next_output:
+            outs[:] = []
+            self.clear_before_next_output = False
+        # `display_id` is not recorded, so display updates never look for dropped outputs.
+        outs.append(out)
+        _drop_old_outputs(outs, self.output_tail)
+        return out
+
+    def execute(self, **kwargs):
+        try:
+            return super().execute(**kwargs)
+        finally:
+            if self.cancellation is not None and self.km is not None:
+                self.cancellation.unregister(self.km)
+            if self.kernel_monitor is not None:
+                self.kernel_monitor.stop()
+            if not self.owns_km and self.kc is not None:
+                self.kc.stop_channels()
+
+
+class NbsexyEngine(NBClientEngine):
+    "Same as papermill's `NBClientEngine`, but execute with `NbsexyNotebookClient`."
+
+    @classmethod
+    def execute_managed_notebook(
+        cls,
+        nb_man,
+        kernel_name,
+        log_output=False,
+        stdout_file=None,
+        stderr_file=None,
+        start_timeout=60,
+        execution_timeout=None,
+        cancellation=None,
+        output_tail=None,
+        budget=None,
+        kernel_monitor=None,
+        **kwargs,
+    ):
+        safe_kwargs = remove_args(["timeout", "startup_timeout"], **kwargs)
+        final_kwargs = merge_kwargs(
+            safe_kwargs,
+            timeout=execution_timeout if execution_timeout else kwargs.get("timeout"),
+            startup_timeout=start_timeout,
+            kernel_name=kernel_name,
+            log=logger,
+            log_output=log_output,
+            stdout_file=stdout_file,
+            stderr_file=stderr_file,
+        )
+        client = NbsexyNotebookClient(nb_man, **final_kwargs)
+        client.cancellation = cancellation
+        client.output_tail = output_tail
+        client.kernel_monitor = kernel_monitor
+        if budget is not None:
+            client.set_budget(budget)
+        return client.execute()
+
+
+papermill_engines.register(ENGINE_NAME, NbsexyEngine)
+
+
+def execute_notebook(
+    nb: Union[Dict[str, Any], NotebookNode],
+    filename: str,
+    parameters: Dict[str, Any],
+    kernel_name: Optional[str] = None,
+    kernel_pool: Optional["KernelPool"] = None,
+    cancellation: Optional[Cancellation] = None,
+    save_path: Optional[str] = None,
+    output_tail: int = DEFAULT_OUTPUT_TAIL,
+    budget: Optional[float] = None,
+    kernel_monitor: Optional["KernelMonitor"] = None,
+    progress_bar: bool = True,
+) -> List[CELL_SECONDS]:
+    """Execute notebook in its own directory.
+
+    Args:
+        nb: parsed content of notebook `filename` (outputs are not needed), it is not
+            modified. A `NotebookNode` from `to_notebook_node` is executed as is without
+            another conversion, so it is owned by this call.
+        kernel_name: kernelspec name of notebook, used to get a warm kernel from `kernel_pool`.
+        kernel_pool: if given, try to execute notebook on a warm kernel.
+        cancellation: if given, executing can be cancelled by it from another thread.
+        save_path: if given, the executed notebook is written to it, even if it failed.
+        output_tail: if not saved, the number of latest outputs (besides errors) kept
+            for each cell while executing, others are dropped as they arrive.
+        budget: if given, stop executing once cells took this many seconds.
+        kernel_monitor: if given, it measures the kernel, and may kill it over limits.
+        progress_bar: whether papermill shows its progress bar.
+    Returns:
+        List[CELL_SECONDS]: wall time of code cells, see `get_cell_seconds`.
+    Raises:
+        PapermillExecutionError: if any cell raised error.
+        ExecutionCancelled: if cancelled before any cell is executed.
+        BudgetExhausted: if `budget` is spent before all cells are executed.
+        KernelLimitExceeded: if the kernel is killed by `kernel_monitor`.
+    """
+    parent = find_file_parent(filename)
+    if not isinstance(nb, NotebookNode):
+        nb = to_notebook_node(nb)
+    if parameters:
+        nb = parameterize_notebook(nb, parameters)
+    nb.metadata.papermill["input_path"] = filename
+    nb.metadata.papermill["output_path"] = save_path
+    # cells added by papermill to a notebook it failed before.
+    nb.cells = [cell for cell in nb.cells if ERROR_MARKER_TAG not in cell.metadata.tags]
+    kernel_name = nb_kernel_name(nb, kernel_name)
+
+    km = None
+    if kernel_pool is not None:
+        km = kernel_pool.acquire(kernel_name)
+    try:
+        # `cwd` of papermill calls os.chdir, which changes the working dir of the whole
+        # process and races between threads, so kernel's working dir is passed to
+        # nbclient by `resources` instead. No `output_path` is given to the engine, so
+        # the notebook is never saved after each cell.
+        nb = papermill_engines.execute_notebook_with_engine(
+            ENGINE_NAME,
+            nb,
+            kernel_name=kernel_name,
+            input_path=filename,
+            km=km,
+            resources={"metadata": {"path": parent}},
+            cancellation=cancellation,
+            output_tail=None if save_path is not None else output_tail,
+            budget=budget,
+            kernel_monitor=kernel_monitor,
+            progress_bar=progress_bar,
+        )
+    except Exception as e:
+        # the error is from the kernel being killed.
+        if kernel_monitor is not None and kernel_monitor.limit_exceeded:
+            raise KernelLimitExceeded(kernel_monitor.limit_exceeded) from e
+        raise
+    finally:
+        if km is not None:
+            kernel_pool.release(km)
+    if kernel_monitor is not None and kernel_monitor.limit_exceeded:
+        raise KernelLimitExceeded(kernel_monitor.limit_exceeded)
+
+    if save_path is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
+        # writes the notebook with error markers (like papermill does) before raising.
+        raise_for_execution_errors(nb, save_path)
+        nbformat.write(nb, save_path)
+    else:
+        _raise_for_execution_errors(nb)
+    return get_cell_seconds(nb)
+
+
+def get_cell_seconds(nb: NotebookNode) -> List[CELL_SECONDS]:
+    """Wall time of executed code cells, recorded by papermill in cell metadata.
+
+    Cells are indexed by their position in the notebook (from 0), the cell injected
+    for parameters is not counted.
+    """
+    cell_seconds = []
+    index = 0
+    for cell in nb.cells:
+        if "injected-parameters" in cell.metadata.get("tags", []):
+            continue
+        seconds = cell.metadata.get("papermill", {}).get("duration")
+        if cell.cell_type == "code" and seconds is not None:
+            first_line = cell.source.strip().split("\n", 1)[0][:MAX_FIRST_LINE_CHARS]
+            cell_seconds.append((index, seconds, first_line))
+        index += 1
+    return cell_seconds
+
+
+def to_notebook_node(nb: Union[Dict[str, Any], NotebookNode]) -> NotebookNode:
+    """A copy of parsed notebook as a v4 `NotebookNode`, with metadata papermill needs.
+
+    Same as `papermill.iorw.load_notebook_node`, but without reading a file.
+    """
+    major, minor = get_version(nb)
+    if major not in nbformat.versions:
+        raise nbformat.NBFormatError(f"Unsupported nbformat version {major}")
+    # like `nbformat.reads` after json is parsed: a copy with multi-line sources joined.
+    nb = nbformat.versions[major].to_notebook_json(nb, minor=minor)
+    nb = nbformat.convert(nb, 4)
+    nb = nbformat.v4.upgrade(nb) or nb
+    nb.metadata.setdefault(
+        "papermill",
+        {
+            "default_parameters": dict(),
+            "parameters": dict(),
+            "environment_variables": dict(),
+            "version": papermill_version,
+        },
+    )
+    for cell in nb.cells:
+        cell.metadata.setdefault("tags", [])
+        cell.metadata.setdefault("papermill", dict())
+    return nb
+
+
+def _raise_for_execution_errors(nb: NotebookNode) -> None:
+    """same as `papermill.execute.raise_for_execution_errors`, without saving the notebook.
+
+    The error has `output_tail`: text of the outputs kept before the error in the cell.
+    """
+    for index, cell in enumerate(nb.cells):
+        outputs = cell.get("outputs", [])
+        for i, output in enumerate(outputs):
+            if output.output_type != "error":
+                continue
+            if output.ename == "SystemExit" and output.evalue in ("", "0"):
+                continue
+            error = PapermillExecutionError(
+                cell_index=index,
+                exec_count=cell.execution_count,
+                source=cell.source,
+                ename=output.ename,
+                evalue=output.evalue,
+                traceback=output.traceback,
+            )
+            error.output_tail = _get_output_text(outputs[:i])[-MAX_OUTPUT_TAIL_CHARS:]
+            raise error
+
+
+def _drop_old_outputs(outputs: List[NotebookNode], n_kept: int) -> None:
+    "drop outputs but errors and the latest `n_kept` ones, in place."
+    indice = [i for i, output in enumerate(outputs) if output.output_type != "error"]
+    for i in reversed(indice[: max(len(indice) - n_kept, 0)]):
+        del outputs[i]
+
+
+def _get_output_text(outputs: List[NotebookNode]) -> str:
+    texts = []
+    for output in outputs:
+        if output.output_type == "stream":
+            texts.append(output.text)
+        elif "data" in output and "text/plain" in output.data:
+            texts.append(output.data["text/plain"] + "\n")
+    return "".join(texts)
+
+
+def get_saved_path(save_dir: str, filename: str) -> str:
+    """Where executed notebook of `filename` is saved in `save_dir`: at the same path
+    relative to current dir, or at its absolute path (under `save_dir`) if it is outside."""
+    path = os.path.abspath(filename)
+    relative = os.path.relpath(path)
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        relative = os.path.splitdrive(path)[1].lstrip(os.sep)
+    return os.path.join(save_dir, relative)
+
+
+def find_file_parent(filename: str) -> str:
+    parent, _ = os.path.split(filename)
+    if len(parent) < 1:
+        raise ValueError(f"can not find parent for file: {filename}")
+    return parent
@@ -0,0 +1,60 @@
+"""Read files from git objects, so notebooks can be checked without a checkout."""
+import posixpath
+import subprocess
+import threading
+from typing import Optional
+
+
+class GitBlobReader:
+    """Read blobs by one long-lived `git cat-file --batch` process.
+
+    Args:
+        cwd (str, optional): a directory inside the repository (work tree or bare).
+    """
+
+    def __init__(self, cwd: Optional[str] = None) -> None:
+        self._lock = threading.Lock()
+        # "REV:./path" is not allowed in bare repositories, so paths are made
+        # relative to repository root by this prefix.
+        self._prefix = subprocess.run(
+            ["git", "rev-parse", "--show-prefix"],
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.strip()
+        self._proc = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    def read(self, rev: str, path: str) -> bytes:
+        """Get content of `path` at `rev`, `path` is relative to current dir like `git show`.
+
+        Raises:
+            FileNotFoundError: if there is no such file at `rev`.
+        """
+        spec = f"{rev}:{posixpath.normpath(self._prefix + path)}"
+        with self._lock:
+            self._proc.stdin.write(spec.encode() + b"\n")
+            self._proc.stdin.flush()
+            header = self._proc.stdout.readline()
+            if not header:
+                raise RuntimeError("git cat-file exited unexpectedly")
+            fields = header.split()
+            if len(fields) != 3:
+                # "<spec> missing" or "<spec> ambiguous"
+                raise FileNotFoundError(f"{path} is not found at {rev}")
+            _, object_type, size = fields
+            content = self._proc.stdout.read(int(size))
+            self._proc.stdout.read(1)  # the trailing newline
+        if object_type != b"blob":
+            raise FileNotFoundError(f"{path} is a {object_type.decode()} at {rev}")
+        return content
+
+    def close(self) -> None:
+        self._proc.stdin.close()
+        self._proc.wait()
+        self._proc.stdout.close()
@@ -0,0 +1,178 @@
+"""Resource usage of kernels executing notebooks, for `--execute`.
+
+While a notebook is executed, a thread samples the kernel and all its child processes
+from /proc: peak RSS (summed over the process tree), CPU seconds (including children
+already reaped) and wall time. CPU seconds are counted from `set_cpu_baseline` (the first
+cell), and the CPU limit is enforced from then on, so kernel startup, warm-up, or
+earlier use of a pooled kernel does not count against the limit. If a limit is given and exceeded, the whole process tree
+is killed, so a notebook leaking memory or spinning all cores fails with a clear reason
+instead of taking the machine down with it.
+
+Without /proc (not Linux), nothing is measured and limits are not enforced.
+"""
+import os
+import signal
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from nbsexy._checks_fun import KERNEL_USAGE, get_kernel_limit_reasons
+
+PROC_DIR = "/proc"
+SAMPLE_INTERVAL_SECONDS = 0.2
+MB = 1024 * 1024
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+    _CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+except (AttributeError, ValueError, OSError):  # pragma: no cover - not posix
+    _PAGE_SIZE, _CLOCK_TICKS = 4096, 100
+# (pid, ppid, rss bytes, cpu seconds) of a process.
+_PROCESS_STAT = Tuple[int, int, int, float]
+
+
+class KernelMonitor:
+    """Sample resource usage of a kernel process tree, and kill it over limits.
+
+    Args:
+        max_memory (Optional[float]): MB, limit of RSS of the kernel process tree.
+        max_cpu_seconds (Optional[float]): limit of CPU seconds of the kernel process tree.
+        interval (float): seconds between samples.
+    """
+
+    def __init__(
+        self,
+        max_memory: Optional[float] = None,
+        max_cpu_seconds: Optional[float] = None,
+        interval: float = SAMPLE_INTERVAL_SECONDS,
+    ) -> None:
+        self.max_memory = max_memory
+        self.max_cpu_seconds = max_cpu_seconds
+        self.interval = interval
+        # why the kernel is killed, if it is.
+        self.limit_exceeded: Optional[str] = None
+        self._pid: Optional[int] = None
+        self._peak_rss = 0
+        self._cpu_seconds = 0.0
+        # CPU seconds of the kernel before the first cell, None until it starts.
+        self._cpu_baseline: Optional[float] = None
+        self._start_time: Optional[float] = None
+        self._end_time: Optional[float] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def is_supported() -> bool:
+        return os.path.isfile(os.path.join(PROC_DIR, "self", "stat"))
+
+    def start(self, pid: int) -> None:
+        "Start sampling the kernel process `pid`."
+        self._pid = pid
+        self._start_time = time.monotonic()
+        self._sample()
+        self._thread = threading.Thread(
+            target=self._run, name="nbsexy-kernel-monitor", daemon=True
+        )
+        self._thread.start()
+
+    def set_cpu_baseline(self) -> None:
+        "Count CPU seconds from now on, called when the first cell starts."
+        if self._pid is None:
+            return
+        self._sample()
+        self._cpu_baseline = self._cpu_seconds
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        self._sample()
+        self._end_time = time.monotonic()
+
+    @property
+    def usage(self) -> Optional[KERNEL_USAGE]:
+        "peak_rss_mb, cpu_seconds and wall_seconds, or None if never started."
+        if self._start_time is None:
+            return None
+        end_time = self._end_time if self._end_time is not None else time.monotonic()
+        return {
+            "peak_rss_mb": round(self._peak_rss / MB, 1),
+            "cpu_seconds": round(max(self._cpu_seconds - (self._cpu_baseline or 0.0), 0.0), 2),
+            "wall_seconds": round(end_time - self._start_time, 2),
+        }
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            if not self._sample():
+                # the kernel is gone.
+                return
+            max_cpu_seconds = self.max_cpu_seconds if self._cpu_baseline is not None else None
+            reasons = get_kernel_limit_reasons(self.usage, self.max_memory, max_cpu_seconds)
+            if reasons:
+                self.limit_exceeded = "; ".join(reasons) + ", the kernel is killed"
+                self._kill()
+                return
+
+    def _sample(self) -> bool:
+        "update usage from the process tree, False if the kernel is gone."
+        processes = _read_process_tree(self._pid)
+        if not processes:
+            return False
+        self._peak_rss = max(self._peak_rss, sum(rss for _, _, rss, _ in processes))
+        self._cpu_seconds = max(self._cpu_seconds, sum(cpu for _, _, _, cpu in processes))
+        return True
+
+    def _kill(self) -> None:
+        # the kernel first, so it does not start more processes.
+        for pid, _, _, _ in _read_process_tree(self._pid):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+
+def _read_process_tree(root_pid: int) -> List[_PROCESS_STAT]:
+    "stats of `root_pid` and its live descendants, root first, or empty if it is gone."
+    stats: Dict[int, _PROCESS_STAT] = dict()
+    children: Dict[int, List[int]] = dict()
+    try:
+        entries = os.listdir(PROC_DIR)
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        stat = _read_process_stat(int(entry))
+        if stat is not None:
+            stats[stat[0]] = stat
+            children.setdefault(stat[1], []).append(stat[0])
+
+    tree = []
+    stack = [root_pid] if root_pid in stats else []
+    while stack:
+        pid = stack.pop()
+        tree.append(stats[pid])
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+def _read_process_stat(pid: int) -> Optional[_PROCESS_STAT]:
+    try:
+        with open(os.path.join(PROC_DIR, str(pid), "stat"), "rt") as f:
+            content = f.read()
+    except OSError:
+        return None
+    # the command name may contain spaces and parentheses, fields follow the last ")".
+    fields = content[content.rfind(")") + 2 :].split()
+    if not fields or fields[0] == "Z":
+        # a zombie is already dead, its CPU time goes to its parent once reaped.
+        return None
+    try:
+        ppid = int(fields[1])
+        utime, stime, cutime, cstime = (int(x) for x in fields[11:15])
+        rss_pages = int(fields[21])
+    except (IndexError, ValueError):
+        return None
+    cpu_seconds = (utime + stime + cutime + cstime) / _CLOCK_TICKS
+    return (pid, ppid, rss_pages * _PAGE_SIZE, cpu_seconds)
@@ -0,0 +1,135 @@
+"""Keep kernels started ahead of time for `--execute`.
+
+Starting a kernel (and importing heavy packages in it) can take seconds for every
+notebook. `KernelPool` starts kernels in background while other notebooks are
+executing, so the next notebook of the same kernelspec gets a kernel that is
+already up. A kernel only serves one notebook: it is shut down after that and a
+fresh one is started to take its place, so no state leaks between notebooks.
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from jupyter_client.kernelspec import KernelSpecManager
+from jupyter_client.manager import AsyncKernelManager
+
+# warm kernels are moved to notebook's directory by running python code.
+SUPPORTED_LANGUAGES = {"python"}
+
+
+class KernelPool:
+    """Kernels started ahead of time, keyed by kernelspec name.
+
+    Args:
+        size (int): the number of warm kernels kept for each kernelspec.
+        startup_timeout (int): seconds to wait for a kernel to be ready.
+    """
+
+    def __init__(self, size: int, startup_timeout: int = 60) -> None:
+        self.size = size
+        self.startup_timeout = startup_timeout
+        self.n_hits = 0
+        self.n_misses = 0
+        self.startup_times: List[float] = []
+        self._lock = threading.Lock()
+        self._warm_kernels: Dict[str, List[Future]] = defaultdict(list)
+        self._languages: Dict[str, Optional[str]] = dict()
+        self._kernel_spec_manager = KernelSpecManager()
+        self._starter = ThreadPoolExecutor(
+            max_workers=max(size, 1), thread_name_prefix="nbsexy-kernel-pool"
+        )
+
+    def acquire(self, kernel_name: str) -> Optional[AsyncKernelManager]:
+        """Get a started kernel, or None if there is no warm kernel for this kernelspec.
+
+        Either way, the pool starts kernels in background for following notebooks.
+        """
+        if self._get_language(kernel_name) not in SUPPORTED_LANGUAGES:
+            with self._lock:
+                self.n_misses += 1
+            return None
+
+        with self._lock:
+            warm_kernels = self._warm_kernels[kernel_name]
+            future = warm_kernels.pop(0) if warm_kernels else None
+            while len(warm_kernels) < self.size:
+                warm_kernels.append(self._starter.submit(self._start_kernel, kernel_name))
+
+        km = None
+        if future is not None:
+            try:
+                km = future.result()
+            except Exception:
+                # failed to start, let the caller start a kernel and report the error.
+                km = None
+        with self._lock:
+            if km is None:
+                self.n_misses += 1
+            else:
+                self.n_hits += 1
+        return km
+
+    def release(self, km: AsyncKernelManager) -> None:
+        "Shut down a kernel which has served a notebook."
+        self._starter.submit(_shutdown_kernel, km)
+
+    def close(self) -> None:
+        "Shut down all kernels."
+        self._starter.shutdown(wait=True)
+        for futures in self._warm_kernels.values():
+            for future in futures:
+                if future.exception() is None:
+                    _shutdown_kernel(future.result())
+        self._warm_kernels.clear()
+
+    def reset_stats(self) -> None:
+        "Reset statistics, for a pool that serves several runs."
+        with self._lock:
+            self.n_hits = 0
+            self.n_misses = 0
+            self.startup_times = []
+
+    def get_summary(self) -> str:
+        startup = ""
+        if self.startup_times:
+            average = sum(self.startup_times) / len(self.startup_times)
+            startup = f", average kernel startup {average:.2f}s"
+        return f"kernel pool: {self.n_hits} hits, {self.n_misses} misses{startup}"
+
+    def _get_language(self, kernel_name: str) -> Optional[str]:
+        with self._lock:
+            if kernel_name not in self._languages:
+                try:
+                    spec = self._kernel_spec_manager.get_kernel_spec(kernel_name)
+                    self._languages[kernel_name] = spec.language
+                except Exception:
+                    # e.g. NoSuchKernel, papermill will report it.
+                    self._languages[kernel_name] = None
+            return self._languages[kernel_name]
+
+    def _start_kernel(self, kernel_name: str) -> AsyncKernelManager:
+        start_time = time.time()
+        km = AsyncKernelManager(kernel_name=kernel_name)
+        asyncio.run(self._async_start_kernel(km))
+        with self._lock:
+            self.startup_times.append(time.time() - start_time)
+        return km
+
+    async def _async_start_kernel(self, km: AsyncKernelManager) -> None:
+        await km.start_kernel()
+        kc = km.client()
+        kc.start_channels()
+        try:
+            await kc.wait_for_ready(timeout=self.startup_timeout)
+        except Exception:
+            kc.stop_channels()
+            await km.shutdown_kernel(now=True)
+            raise
+        kc.stop_channels()
+
+
+def _shutdown_kernel(km: AsyncKernelManager) -> None:
+    asyncio.run(km.shutdown_kernel(now=True))
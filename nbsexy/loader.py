@@ -0,0 +1,156 @@
+"""Load notebooks for static checks without decoding cell outputs.
+
+Static checks never look at `outputs` (or markdown `attachments`), but these
+subtrees are usually most of the bytes of an `.ipynb` file: base64 images,
+long stdout streams and so on. The loader scans the raw bytes, jumps over
+these subtrees without building any python object for them, and only decodes
+what is left.
+"""
+import json
+import re
+from typing import Any, Callable, Dict
+
+try:
+    import orjson
+
+    _json_loads: Callable[[bytes], Any] = orjson.loads
+except ImportError:  # pragma: no cover - depends on environment
+    _json_loads = json.loads
+
+NB_JSON = Dict[str, Any]
+
+SKIPPED_KEYS = (b'"outputs"', b'"attachments"')
+
+_VALUE_START_RE = re.compile(rb"\s*:\s*[\[{]")
+_BRACKETS = (b"[", b"]", b"{", b"}")
+_OPENERS = frozenset(b"[{")
+_EMPTY_CONTAINER = {ord("["): b"[]", ord("{"): b"{}"}
+_BACKSLASH = ord("\\")
+# brackets are searched window by window, so `find` never scans far beyond the
+# bracket we are looking for.
+_WINDOW = 4096
+
+
+def load_json_without_outputs(file: str) -> NB_JSON:
+    """Load notebook file, with `outputs` and `attachments` replaced by empty containers."""
+    with open(file, "rb") as f:
+        raw = f.read()
+    return loads_without_outputs(raw)
+
+
+def loads_without_outputs(raw: bytes) -> NB_JSON:
+    "Same as `load_json_without_outputs`, but take the content of notebook."
+    return _json_loads(strip_outputs(raw))
+
+
+def strip_outputs(raw: bytes) -> bytes:
+    """Replace the values of `outputs` and `attachments` keys by empty containers.
+
+    Only `find` and `count` are used to move forward, so the scan runs at memchr
+    speed and no python object is created for skipped values. A key found inside
+    a string literal (e.g. a cell source contains `"outputs": [`) is detected by
+    `_skip_strings_before` and ignored.
+    """
+    pieces = []
+    copied = 0
+    pos = 0
+    # the next occurrence of each key, -1 if there is no more.
+    next_keys = {key: raw.find(key) for key in SKIPPED_KEYS}
+    while True:
+        for key, key_pos in next_keys.items():
+            if 0 <= key_pos < pos:
+                next_keys[key] = raw.find(key, pos)
+        candidates = [(key_pos, key) for key, key_pos in next_keys.items() if key_pos >= 0]
+        if not candidates:
+            break
+        key_pos, key = min(candidates)
+        pos = _skip_strings_before(raw, pos, key_pos)
+        if pos > key_pos:
+            # the key is a part of string literal.
+            continue
+        key_end = key_pos + len(key)
+        value = _VALUE_START_RE.match(raw, key_end)
+        if value is None:
+            # a string value equals to "outputs", or the value is not a container.
+            pos = key_end
+            continue
+        value_start = value.end() - 1
+        value_end = _find_container_end(raw, value_start)
+        pieces.append(raw[copied:value_start])
+        pieces.append(_EMPTY_CONTAINER[raw[value_start]])
+        copied = pos = value_end
+    if copied == 0:
+        return raw
+    pieces.append(raw[copied:])
+    return b"".join(pieces)
+
+
+def _find_container_end(raw: bytes, start: int) -> int:
+    "return the index after the bracket which closes the container opened at `start`."
+    depth = 0
+    pos = start
+    while pos < len(raw):
+        window_end = min(pos + _WINDOW, len(raw))
+        bracket_pos = _find_first_bracket(raw, pos, window_end)
+        limit = window_end if bracket_pos < 0 else bracket_pos
+        pos = _skip_strings_before(raw, pos, limit)
+        if pos > limit:
+            # window ends inside (or bracket is a part of) a string literal.
+            continue
+        if bracket_pos < 0:
+            pos = window_end
+            continue
+        pos = bracket_pos + 1
+        if raw[bracket_pos] in _OPENERS:
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return pos
+    raise ValueError(f"unterminated container at position {start}")
+
+
+def _find_first_bracket(raw: bytes, start: int, end: int) -> int:
+    positions = [raw.find(bracket, start, end) for bracket in _BRACKETS]
+    positions = [p for p in positions if p >= 0]
+    return min(positions) if positions else -1
+
+
+def _skip_strings_before(raw: bytes, pos: int, limit: int) -> int:
+    """Skip string literals which start in `raw[pos:limit]`, `pos` must be outside a string.
+
+    Returns:
+        int: the index after the last skipped string (or `pos` if there is no string),
+            larger than `limit` means `limit` is inside a string literal.
+    """
+    if raw.find(b'\\"', pos, limit) < 0:
+        # no escaped quote, so quotes are paired in order.
+        last_quote = raw.rfind(b'"', pos, limit)
+        if last_quote < 0:
+            return pos
+        if raw.count(b'"', pos, limit) % 2 == 0:
+            return last_quote + 1
+        return _find_string_end(raw, last_quote)
+
+    while True:
+        quote = raw.find(b'"', pos, limit)
+        if quote < 0:
+            return pos
+        pos = _find_string_end(raw, quote)
+        if pos > limit:
+            return pos
+
+
+def _find_string_end(raw: bytes, start: int) -> int:
+    "return the index after the quote which closes the string opened at `start`."
+    pos = start + 1
+    while True:
+        end = raw.find(b'"', pos)
+        if end < 0:
+            raise ValueError(f"unterminated string at position {start}")
+        n_backslash = 0
+        while raw[end - 1 - n_backslash] == _BACKSLASH:
+            n_backslash += 1
+        if n_backslash % 2 == 0:
+            return end + 1
+        pos = end + 1
@@ -1,36 +1,239 @@
+import os
 import pathlib
+import posixpath
 import re
-from pathlib import Path
-from typing import Iterable, List, Set
+import subprocess
+import sys
+from pathlib import Path, PurePath
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 # reference: https://github.com/nbQA-dev/nbQA/blob/master/nbqa/__main__.py#L45
-
-EXCLUDES = (
-    r"/("
-    r"\.direnv|\.eggs|\.git|\.hg|\.ipynb_checkpoints|\.mypy_cache|\.nox|\.svn|\.tox|\.venv|"
-    r"_build|buck-out|build|dist|venv"
-    r")/"
+EXCLUDED_DIR_NAMES = frozenset(
+    {
+        ".direnv",
+        ".eggs",
+        ".git",
+        ".hg",
+        ".ipynb_checkpoints",
+        ".mypy_cache",
+        ".nox",
+        ".svn",
+        ".tox",
+        ".venv",
+        "_build",
+        "buck-out",
+        "build",
+        "dist",
+        "venv",
+    }
 )
+EXCLUDES = r"/(" + "|".join(re.escape(name) for name in sorted(EXCLUDED_DIR_NAMES)) + r")/"
 
 
 def collect_files_contain_given_suffix_from_paths(
-    paths: Iterable[str], suffix: str = ".ipynb"
+    paths: Iterable[str],
+    suffix: str = ".ipynb",
+    exclude_patterns: Iterable[str] = (),
+    use_git: bool = False,
+    include_untracked: bool = False,
 ) -> Set[str]:
+    """Collect files with `suffix` from given files and directories.
+
+    Directories in `EXCLUDED_DIR_NAMES` are not walked into, and files matching any
+    of `exclude_patterns` (see `exclude_path_by_glob_patterns`) are dropped.
+    Returned paths are absolute.
+
+    Args:
+        use_git: list files of a directory inside a git work tree from the git index,
+            which also honours `.gitignore`. Directories outside of work trees are walked.
+        include_untracked: with `use_git`, also list untracked files that are not ignored.
+    """
     result = set()
+    exclude_patterns = list(exclude_patterns)
     if not suffix.startswith("."):
         suffix = "." + suffix
     for p in paths:
         path = Path(p)
         if path.is_dir():
-            cur = _iter_dir_and_get_all_files_with_given_suffix(path, suffix)
-            cur = _filter_exclude_patterns(cur)
+            cur = None
+            if use_git:
+                cur = _list_git_files_with_given_suffix(
+                    path, suffix, exclude_patterns, include_untracked
+                )
+            if cur is None:
+                cur = _iter_dir_and_get_all_files_with_given_suffix(
+                    path, suffix, exclude_patterns
+                )
             result.update(cur)
         else:
             if path.suffix == suffix:
-                result.add(str(path.resolve()))
+                result.update(
+                    exclude_path_by_glob_patterns([str(path.resolve())], exclude_patterns)
+                )
+    return result
+
+
+def collect_files_changed_since(
+    paths: Iterable[str],
+    ref: str,
+    suffix: str = ".ipynb",
+    exclude_patterns: Iterable[str] = (),
+) -> Set[str]:
+    """Collect files with `suffix` from given files and directories, which are added,
+    modified or renamed between git `ref` and the work tree, or untracked and not ignored.
+
+    Only git is asked, directories are not walked. Paths are grouped by the work tree
+    they are in, and each work tree is asked once (one `git diff` and one `git ls-files`),
+    however many paths are given. Filtered the same way as
+    `collect_files_contain_given_suffix_from_paths`.
+
+    Raises:
+        ValueError: if a path is not in a git work tree, or `ref` is not found.
+    """
+    exclude_patterns = list(exclude_patterns)
+    if not suffix.startswith("."):
+        suffix = "." + suffix
+    # Dict[candidate top level, (dirs, files)] of given paths, all realpath.
+    requested: Dict[str, Tuple[Set[str], Set[str]]] = dict()
+    candidates: Dict[str, str] = dict()
+    for p in paths:
+        path = Path(p)
+        if path.is_dir():
+            dirname = os.path.realpath(path)
+        elif path.suffix == suffix:
+            dirname = os.path.dirname(os.path.realpath(path))
+        else:
+            continue
+        if dirname not in candidates:
+            candidates[dirname] = find_work_tree_root(dirname)
+        dirs, files = requested.setdefault(candidates[dirname], (set(), set()))
+        if path.is_dir():
+            dirs.add(dirname)
+        else:
+            files.add(os.path.join(dirname, path.name))
+
+    # a `.git` may not be a real repository, git decides which work tree it is.
+    by_top: Dict[str, Tuple[Set[str], Set[str]]] = dict()
+    for candidate, (dirs, files) in requested.items():
+        top = _run_git(candidate, "rev-parse", "--show-toplevel").rstrip("\n")
+        top_dirs, top_files = by_top.setdefault(top, (set(), set()))
+        top_dirs.update(dirs)
+        top_files.update(files)
+
+    result = set()
+    for top, (dirs, files) in by_top.items():
+        changed = _run_git(top, "diff", "-z", "--name-only", "--diff-filter=AMR", "-M", ref)
+        untracked = _run_git(top, "ls-files", "-z", "--others", "--exclude-standard")
+        changed_files = {
+            os.path.join(top, relpath)
+            for relpath in changed.split("\0") + untracked.split("\0")
+            if relpath.endswith(suffix)
+        }
+        found = [f for f in changed_files if f in files]
+        for root in dirs:
+            for f in changed_files:
+                dir_parts = Path(os.path.relpath(f, root)).parts[:-1]
+                if os.pardir not in dir_parts[:1] and not EXCLUDED_DIR_NAMES.intersection(
+                    dir_parts
+                ):
+                    found.append(f)
+        if exclude_patterns:
+            found = exclude_path_by_glob_patterns(found, exclude_patterns)
+        result.update(found)
     return result
 
 
+def collect_files_at_git_rev(
+    paths: Iterable[str],
+    rev: str,
+    suffix: str = ".ipynb",
+    exclude_patterns: Iterable[str] = (),
+) -> List[str]:
+    """Collect files with `suffix` under given paths in git tree of `rev`, the work
+    tree is not read at all. Returned paths are relative to current dir, and filtered
+    the same way as `collect_files_contain_given_suffix_from_paths`.
+
+    The whole tree is listed by one `git ls-tree` call and matched against `paths`
+    here, so paths never go to the command line and there is no limit of their number.
+
+    Raises:
+        ValueError: if current dir is not in a git repository, `rev` is not found,
+            or a path is outside the repository.
+    """
+    exclude_patterns = list(exclude_patterns)
+    if not suffix.startswith("."):
+        suffix = "." + suffix
+    # paths in git trees are relative to the top level, current dir is `prefix` in it.
+    prefix = _run_git(".", "rev-parse", "--show-prefix").rstrip("\n")
+    wanted = {_to_path_in_git_tree(p, prefix) for p in paths}
+    listed = _run_git(".", "ls-tree", "-r", "-z", "--name-only", "--full-tree", rev)
+    files = []
+    for tree_path in listed.split("\0"):
+        if not tree_path.endswith(suffix):
+            continue
+        dirs = tree_path.split("/")[:-1]
+        if EXCLUDED_DIR_NAMES.intersection(dirs):
+            continue
+        # the file itself, or any dir containing it is wanted.
+        ancestors = ["/".join(dirs[:i]) for i in range(len(dirs) + 1)]
+        if tree_path in wanted or any(ancestor in wanted for ancestor in ancestors):
+            files.append(posixpath.relpath(tree_path, prefix or "."))
+    if exclude_patterns:
+        files = exclude_path_by_glob_patterns(files, exclude_patterns)
+    return files
+
+
+def _to_path_in_git_tree(path: str, prefix: str) -> str:
+    "path relative to the top level of repository, \"\" for the top level itself."
+    if os.path.isabs(path):
+        path = os.path.relpath(path)
+    tree_path = posixpath.normpath(prefix + Path(path).as_posix())
+    if tree_path == ".":
+        return ""
+    if tree_path == ".." or tree_path.startswith("../"):
+        raise ValueError(f"{path} is outside repository")
+    return tree_path
+
+
+def find_work_tree_root(start_dir: str) -> str:
+    "the nearest dir with `.git` (a dir, or a file for worktrees), or `start_dir`."
+    dirname = os.path.abspath(start_dir)
+    while True:
+        if os.path.exists(os.path.join(dirname, ".git")):
+            return dirname
+        parent = os.path.dirname(dirname)
+        if parent == dirname:
+            return os.path.abspath(start_dir)
+        dirname = parent
+
+
+def iter_paths_from_file(file: str) -> Iterator[str]:
+    """Read paths separated by NUL (like `git ls-files -z`) or newline from `file`,
+    `-` means stdin. The file is read chunk by chunk, so it can be arbitrarily large.
+    The separator is NUL if the first chunk contains any.
+    """
+    f = sys.stdin.buffer if file == "-" else open(file, "rb")
+    try:
+        sep, rest = None, b""
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            if sep is None:
+                sep = b"\0" if b"\0" in chunk else b"\n"
+            *records, rest = (rest + chunk).split(sep)
+            yield from _decode_path_records(records, sep)
+        yield from _decode_path_records([rest], sep)
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+
+def _decode_path_records(records: List[bytes], sep: Optional[bytes]) -> Iterator[str]:
+    for record in records:
+        if sep == b"\n":
+            record = record.rstrip(b"\r")
+        if record:
+            yield os.fsdecode(record)
+
+
 def exclude_path_by_glob_patterns(
     paths: Iterable[str], exclude_patterns: List[str], base_path=None
 ) -> List[str]:
@@ -51,11 +254,100 @@ def exclude_path_by_glob_patterns(
 
 
 def _iter_dir_and_get_all_files_with_given_suffix(
-    path: pathlib.PosixPath, suffix: str
-) -> Iterable[str]:
+    path: pathlib.PosixPath, suffix: str, exclude_patterns: List[str] = ()
+) -> Iterator[str]:
 
     assert path.is_dir(), f"given path is not a dir: {str(path)}"
-    return (str(i.resolve()) for i in path.rglob("*" + suffix))
+    # only the root is resolved, paths below are joined to it without extra syscalls.
+    return _walk_dir(os.path.realpath(path), suffix, list(exclude_patterns))
+
+
+def _walk_dir(root: str, suffix: str, exclude_patterns: List[str]) -> Iterator[str]:
+    """walk by `os.scandir`, excluded dirs are pruned before descending.
+
+    Symlinks to directories are followed, a directory already walked (e.g. by a
+    symlink to its parent) is skipped, so symlink loops end.
+    """
+    visited: Set[Tuple[int, int]] = set()
+    stack = [root]
+    while stack:
+        dirname = stack.pop()
+        try:
+            stat = os.stat(dirname)
+            if (stat.st_dev, stat.st_ino) in visited:
+                continue
+            visited.add((stat.st_dev, stat.st_ino))
+            entries = list(os.scandir(dirname))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name not in EXCLUDED_DIR_NAMES:
+                    stack.append(entry.path)
+            elif entry.name.endswith(suffix):
+                if not exclude_patterns or not any(
+                    PurePath(entry.path).match(p) for p in exclude_patterns
+                ):
+                    yield entry.path
+
+
+def _list_git_files_with_given_suffix(
+    path: pathlib.PosixPath,
+    suffix: str,
+    exclude_patterns: List[str] = (),
+    include_untracked: bool = False,
+) -> Optional[List[str]]:
+    """list files by one `git ls-files` call, or None if `path` is not in a git work tree.
+
+    Tracked files deleted from the work tree are skipped.
+    """
+    root = os.path.realpath(path)
+    # -t tags each file: "H" cached, "R" deleted, "?" untracked.
+    cmd = ["git", "-C", root, "ls-files", "-z", "-t", "--cached", "--deleted"]
+    if include_untracked:
+        cmd += ["--others", "--exclude-standard"]
+    try:
+        proc = subprocess.run(
+            cmd + ["--", "*" + suffix],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError:
+        # git is not installed.
+        return None
+    if proc.returncode != 0:
+        return None
+
+    files, deleted = [], set()
+    for record in proc.stdout.split(b"\0"):
+        if not record:
+            continue
+        tag, relpath = record[:1], os.fsdecode(record[2:])
+        if tag == b"R":
+            deleted.add(relpath)
+        elif not EXCLUDED_DIR_NAMES.intersection(relpath.split("/")[:-1]):
+            files.append(relpath)
+    files = [
+        os.path.join(root, relpath) for relpath in dict.fromkeys(files) if relpath not in deleted
+    ]
+    if exclude_patterns:
+        files = exclude_path_by_glob_patterns(files, exclude_patterns)
+    return files
+
+
+def _run_git(cwd: str, *args: str) -> str:
+    proc = subprocess.run(
+        ["git", "-C", cwd, *args], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if proc.returncode != 0:
+        # only the first line, git may append its usage.
+        message = os.fsdecode(proc.stderr).strip().split("\n", 1)[0]
+        raise ValueError(f"git {' '.join(args)} failed in {cwd}: {message}")
+    return os.fsdecode(proc.stdout)
 
 
 def _filter_exclude_patterns(paths: Iterable[str]) -> Iterable[str]:
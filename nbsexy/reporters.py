@@ -0,0 +1,206 @@
+"""Machine readable reports for `--format`, written while checks are running.
+
+Every reporter gets results of a file by `add` as soon as all checks on it finish.
+JSON Lines are written right away. JUnit XML and SARIF need totals or a closing
+bracket, so their entries are spooled to a temp file and wrapped by `close`, the
+memory used stays the same however many notebooks are checked.
+"""
+import json
+import os
+import tempfile
+from typing import IO, Any, Dict, List
+from xml.sax.saxutils import escape, quoteattr
+
+from nbsexy import __version__
+from nbsexy._checks_fun import OUT_OF_BUDGET, CheckResult
+
+FORMATS = ("jsonl", "junit", "sarif")
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+
+
+class Reporter:
+    """
+    Args:
+        stream (IO[str]): where the report is written, not closed by reporter.
+        check_descriptions (Dict[str, str]): key is check name.
+    """
+
+    def __init__(self, stream: IO[str], check_descriptions: Dict[str, str]) -> None:
+        self.stream = stream
+        self.check_descriptions = check_descriptions
+
+    def add(self, filename: str, results: Dict[str, CheckResult]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.stream.flush()
+
+
+class JsonlReporter(Reporter):
+    """one line per result, with keys file, check, status and info.
+
+    status is pass, fail, error, or out_of_budget (see `--budget`). Results of executed
+    notebooks also have kernel_usage (peak_rss_mb, cpu_seconds and wall_seconds).
+    """
+
+    def add(self, filename: str, results: Dict[str, CheckResult]) -> None:
+        for check_name, result in results.items():
+            record: Dict[str, Any] = {
+                "file": filename,
+                "check": check_name,
+                "status": _get_status_name(result),
+                "info": result.info,
+            }
+            if result.kernel_usage is not None:
+                record["kernel_usage"] = result.kernel_usage
+            self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+
+class _SpooledReporter(Reporter):
+    "write entries to a temp file, and copy them into the report at the end."
+
+    def __init__(self, stream: IO[str], check_descriptions: Dict[str, str]) -> None:
+        super().__init__(stream, check_descriptions)
+        self._spool = tempfile.TemporaryFile("w+t", encoding="utf-8")
+
+    def close(self) -> None:
+        self._spool.seek(0)
+        self._write_report()
+        self._spool.close()
+        super().close()
+
+    def _copy_spool(self) -> None:
+        for chunk in iter(lambda: self._spool.read(1024 * 1024), ""):
+            self.stream.write(chunk)
+
+    def _write_report(self) -> None:
+        raise NotImplementedError
+
+
+class JunitReporter(_SpooledReporter):
+    """a testcase per result, `classname` is check name and `name` is filename.
+
+    Results out of budget are skipped testcases.
+    """
+
+    def __init__(self, stream: IO[str], check_descriptions: Dict[str, str]) -> None:
+        super().__init__(stream, check_descriptions)
+        self.n_tests = self.n_failures = self.n_errors = self.n_skipped = 0
+
+    def add(self, filename: str, results: Dict[str, CheckResult]) -> None:
+        for check_name, result in results.items():
+            self.n_tests += 1
+            testcase = (
+                f"<testcase classname={quoteattr(check_name)} name={quoteattr(filename)}"
+            )
+            if result.status is True:
+                self._spool.write(testcase + "/>\n")
+                continue
+            if result.status == OUT_OF_BUDGET:
+                self.n_skipped += 1
+                self._spool.write(
+                    f"{testcase}><skipped message={quoteattr(result.info)}/></testcase>\n"
+                )
+                continue
+            if result.status is False:
+                self.n_failures += 1
+                tag = "failure"
+            else:
+                self.n_errors += 1
+                tag = "error"
+            message = quoteattr(self.check_descriptions.get(check_name, check_name))
+            self._spool.write(
+                f"{testcase}><{tag} message={message}>{escape(result.info)}</{tag}>"
+                "</testcase>\n"
+            )
+
+    def _write_report(self) -> None:
+        self.stream.write('<?xml version="1.0" encoding="utf-8"?>\n<testsuites>\n')
+        self.stream.write(
+            f'<testsuite name="nbsexy" tests="{self.n_tests}" failures="{self.n_failures}"'
+            f' errors="{self.n_errors}" skipped="{self.n_skipped}">\n'
+        )
+        self._copy_spool()
+        self.stream.write("</testsuite>\n</testsuites>\n")
+
+
+class SarifReporter(_SpooledReporter):
+    """SARIF 2.1.0, a rule per check, and a result per failed (or errored) check on a file.
+
+    Results out of budget are notes.
+    """
+
+    def __init__(self, stream: IO[str], check_descriptions: Dict[str, str]) -> None:
+        super().__init__(stream, check_descriptions)
+        self._n_results = 0
+
+    def add(self, filename: str, results: Dict[str, CheckResult]) -> None:
+        for check_name, result in results.items():
+            if result.status is True:
+                continue
+            if result.status is False:
+                level = "error"
+                message = result.info or self.check_descriptions.get(check_name, check_name)
+            elif result.status == OUT_OF_BUDGET:
+                level, message = "note", result.info
+            else:
+                level, message = "warning", f"check raised error: {result.info}"
+            sarif_result = {
+                "ruleId": check_name,
+                "level": level,
+                "message": {"text": message},
+                "locations": [
+                    {"physicalLocation": {"artifactLocation": {"uri": _to_uri(filename)}}}
+                ],
+            }
+            if self._n_results > 0:
+                self._spool.write(",\n")
+            self._spool.write(json.dumps(sarif_result))
+            self._n_results += 1
+
+    def _write_report(self) -> None:
+        rules: List[Dict[str, object]] = [
+            {"id": name, "shortDescription": {"text": description}}
+            for name, description in self.check_descriptions.items()
+        ]
+        tool = {
+            "driver": {
+                "name": "nbsexy",
+                "version": __version__,
+                "informationUri": "https://github.com/hyades910739/nbsexy",
+                "rules": rules,
+            }
+        }
+        self.stream.write(
+            '{"$schema": "%s", "version": "2.1.0", "runs": [{"tool": %s, "results": [\n'
+            % (SARIF_SCHEMA, json.dumps(tool))
+        )
+        self._copy_spool()
+        self.stream.write("\n]}]}\n")
+
+
+def create_reporter(
+    format: str, stream: IO[str], check_descriptions: Dict[str, str]
+) -> Reporter:
+    reporter_classes = {"jsonl": JsonlReporter, "junit": JunitReporter, "sarif": SarifReporter}
+    return reporter_classes[format](stream, check_descriptions)
+
+
+def _get_status_name(result: CheckResult) -> str:
+    if result.status is True:
+        return "pass"
+    elif result.status is False:
+        return "fail"
+    elif result.status == OUT_OF_BUDGET:
+        return "out_of_budget"
+    return "error"
+
+
+def _to_uri(filename: str) -> str:
+    "relative to current dir if possible, since SARIF viewers resolve uri from repo root."
+    if os.path.isabs(filename):
+        relative = os.path.relpath(filename)
+        if not relative.startswith(os.pardir):
+            filename = relative
+    return filename.replace(os.sep, "/")
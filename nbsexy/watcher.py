@@ -0,0 +1,226 @@
+"""Watch notebooks for `--watch`.
+
+On Linux, changes are received from inotify (by ctypes, no extra dependency).
+Elsewhere, or if inotify is not available, directories are polled. Either way,
+directories in `path_helper.EXCLUDED_DIR_NAMES` (like `.ipynb_checkpoints`) are
+never watched, and changes are debounced, since Jupyter autosaves a notebook by
+several writes and renames in a row.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path, PurePath
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from nbsexy.path_helper import (
+    EXCLUDED_DIR_NAMES,
+    _iter_dir_and_get_all_files_with_given_suffix,
+)
+
+# a change is reported after no more change happens for this long.
+DEBOUNCE_SECONDS = 0.5
+POLL_INTERVAL_SECONDS = 1.0
+
+# from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class Watcher:
+    """Watch notebooks under given files and directories.
+
+    Args:
+        paths: files and directories to watch, directories are watched recursively.
+        suffix: only files with this suffix are reported.
+        exclude_patterns: files matching any of these patterns are not reported.
+    """
+
+    def __init__(
+        self, paths: Iterable[str], suffix: str = ".ipynb", exclude_patterns: Iterable[str] = ()
+    ) -> None:
+        self.suffix = suffix if suffix.startswith(".") else "." + suffix
+        self.exclude_patterns = list(exclude_patterns)
+        self._dirs: List[str] = []
+        self._files: Set[str] = set()
+        for p in paths:
+            if os.path.isdir(p):
+                self._dirs.append(os.path.realpath(p))
+            else:
+                self._files.add(os.path.realpath(p))
+        self._inotify: Optional[_Inotify] = None
+        if sys.platform == "linux":
+            self._inotify = _Inotify.create()
+        if self._inotify is not None:
+            for dirname in self._dirs:
+                self._inotify.add_watch_recursively(dirname)
+            for dirname in {os.path.dirname(f) for f in self._files}:
+                self._inotify.add_watch(dirname)
+        else:
+            self._snapshot = self._take_snapshot()
+
+    @property
+    def method(self) -> str:
+        return "inotify" if self._inotify is not None else "polling"
+
+    def wait_for_changes(self) -> Set[str]:
+        """Block until some notebooks are created, modified or deleted, and return them.
+
+        Changes are collected until nothing changes for `DEBOUNCE_SECONDS`.
+        """
+        changed: Set[str] = set()
+        while True:
+            timeout = DEBOUNCE_SECONDS if changed else None
+            new_changes = self._read_changes(timeout)
+            if new_changes is None:
+                # no change in timeout.
+                return changed
+            changed.update(path for path in new_changes if self._is_target(path))
+
+    def close(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+
+    def _read_changes(self, timeout: Optional[float]) -> Optional[Set[str]]:
+        "changed paths (may be empty), or None if nothing happened in `timeout` seconds."
+        if self._inotify is not None:
+            return self._inotify.read(timeout, on_overflow=self._get_all_files)
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            interval = POLL_INTERVAL_SECONDS
+            if timeout is not None:
+                interval = min(timeout, interval)
+            time.sleep(interval)
+            snapshot = self._take_snapshot()
+            changed = {
+                path
+                for path in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is not None and time.time() >= deadline:
+                return None
+
+    def _take_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = dict()
+        for path in self._get_all_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _get_all_files(self) -> Set[str]:
+        files = set(self._files)
+        for dirname in self._dirs:
+            if os.path.isdir(dirname):
+                files.update(
+                    _iter_dir_and_get_all_files_with_given_suffix(Path(dirname), self.suffix)
+                )
+        return files
+
+    def _is_target(self, path: str) -> bool:
+        name = os.path.basename(path)
+        # Jupyter saves to a temp file `.~name.ipynb` first.
+        if not name.endswith(self.suffix) or name.startswith(".~"):
+            return False
+        if path not in self._files:
+            root = next((d for d in self._dirs if path.startswith(d + os.sep)), None)
+            if root is None:
+                return False
+            relative_dirs = os.path.relpath(path, root).split(os.sep)[:-1]
+            if EXCLUDED_DIR_NAMES.intersection(relative_dirs):
+                return False
+        return not any(PurePath(path).match(p) for p in self.exclude_patterns)
+
+
+class _Inotify:
+    "minimal inotify binding, only what `Watcher` needs."
+
+    def __init__(self, libc: ctypes.CDLL, fd: int) -> None:
+        self._libc = libc
+        self._fd = fd
+        self._dirs: Dict[int, str] = dict()  # watch descriptor -> dir
+
+    @classmethod
+    def create(cls) -> Optional["_Inotify"]:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    def add_watch(self, dirname: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirname), WATCH_MASK)
+        if wd >= 0:
+            self._dirs[wd] = dirname
+
+    def add_watch_recursively(self, root: str) -> None:
+        stack = [root]
+        while stack:
+            dirname = stack.pop()
+            self.add_watch(dirname)
+            try:
+                entries = list(os.scandir(dirname))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and entry.name not in EXCLUDED_DIR_NAMES:
+                    stack.append(entry.path)
+
+    def read(
+        self, timeout: Optional[float], on_overflow: Callable[[], Set[str]]
+    ) -> Optional[Set[str]]:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return None
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed: Set[str] = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # events are lost, report every file.
+                changed.update(on_overflow())
+                continue
+            dirname = self._dirs.get(wd)
+            if dirname is None or not name:
+                continue
+            path = os.path.join(dirname, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and name not in EXCLUDED_DIR_NAMES:
+                    # files may be written before the new dir is watched.
+                    self.add_watch_recursively(path)
+                    changed.update(
+                        os.path.join(d, f) for d, _, files in os.walk(path) for f in files
+                    )
+            else:
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
@@ -1,11 +1,16 @@
+import re
+
 import setuptools
 
 with open("README.md", "r") as f:
     long_description = f.read()
 
+with open("nbsexy/__init__.py", "r") as f:
+    version = re.search(r'__version__ = "(.*)"', f.read()).group(1)
+
 setuptools.setup(
     name="nbsexy",
-    version="0.0.6a",
+    version=version,
     author="hyades910739",
     author_email="hyades910739@gmail.com",
     description="A tool to make your notebook sexier than before.",
@@ -23,6 +28,11 @@ setuptools.setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
-    install_requires=["colorama>=0.4.4", "papermill==2.3.4"],
+    python_requires=">=3.7",
+    install_requires=[
+        "colorama>=0.4.4",
+        "papermill==2.3.4",
+        "tomli>=1.1.0; python_version < '3.11'",
+    ],
+    extras_require={"fast": ["orjson"]},
 )
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def run_in_tmp_dir(tmp_path, monkeypatch):
+    "nbsexy writes caches to current dir, run every test in a new dir to keep tests isolated."
+    monkeypatch.chdir(tmp_path)
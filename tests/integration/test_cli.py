@@ -1,5 +1,7 @@
+import json
 import os
 import subprocess
+import sys
 from subprocess import PIPE
 
 import nbsexy
@@ -162,3 +164,196 @@ def test_exclude_patterns_that_match_no_one_should_not_exclude_anything():
         universal_newlines=True,
     )
     assert output.returncode == 1
+
+
+def test_changed_since_unknown_ref_will_exit():
+    output = subprocess.run(
+        ["nbsexy", ".", "--cell_count", "--changed_since", "no_such_ref"],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    last_line = output.stderr.strip().split("\n")[-1]
+    expected = "nbsexy: error: --changed_since: no_such_ref is not a commit of git repository."
+    assert last_line == expected
+    assert output.returncode == 2
+
+
+def test_changed_since_with_root_outside_git_will_exit(tmp_path):
+    # current dir is in the repository, but the root is not.
+    (tmp_path / "nb.ipynb").write_text("{}")
+    output = subprocess.run(
+        ["nbsexy", str(tmp_path), "--has_md", "--changed_since", "HEAD", "--no_cache"],
+        cwd=root_path,
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    assert output.stderr.startswith("nbsexy: error: git rev-parse --show-toplevel")
+    assert "not a git repository" in output.stderr
+    assert len(output.stderr.strip().split("\n")) == 1
+    assert "Traceback" not in output.stdout + output.stderr
+    assert output.returncode == 2
+
+
+def test_execute_with_git_rev_will_exit():
+    output = subprocess.run(
+        ["nbsexy", ".", "--execute", "--git_rev", "HEAD"],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    last_line = output.stderr.strip().split("\n")[-1]
+    assert last_line == "nbsexy: error: --execute is not allowed with --git_rev"
+
+
+def test_git_rev_unknown_rev_will_exit():
+    output = subprocess.run(
+        ["nbsexy", ".", "--has_md", "--git_rev", "nosuchrev"],
+        cwd=root_path,
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    last_line = output.stderr.strip().split("\n")[-1]
+    assert last_line == "nbsexy: error: --git_rev: nosuchrev is not a commit of git repository."
+    assert "Traceback" not in output.stderr
+    assert output.returncode == 2
+
+
+def test_files_from_stdin_with_root_dirs():
+    successed = os.path.join(notebook_base_path, "successed")
+    failed_nb = os.path.join(notebook_base_path, "failed", "nb_without_md.ipynb")
+    output = subprocess.run(
+        ["nbsexy", successed, "--files_from", "-", "--has_md"],
+        input=failed_nb + "\0",
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    assert "Found 4 notebooks" in output.stdout
+    assert "1 failed" in output.stdout
+    assert output.returncode == 1
+
+
+# cumulative import time of `nbsexy.__main__` in microseconds, importing papermill
+# alone takes longer than this.
+IMPORT_TIME_BUDGET_US = 250_000
+EXECUTION_MODULES = ("papermill", "nbformat", "nbclient", "jupyter_client", "asyncio")
+
+
+def test_static_only_run_does_not_import_execution_machinery():
+    path = os.path.join(notebook_base_path, "successed", "valid_nb_1.ipynb")
+    code = (
+        "import sys\n"
+        "from nbsexy.__main__ import Launcher\n"
+        f"sys.argv = ['nbsexy', {path!r}, '--has_md', '--no_cache']\n"
+        "Launcher().run()\n"
+        f"print([m for m in {EXECUTION_MODULES!r} if m in sys.modules])\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], stdout=PIPE, stderr=PIPE, universal_newlines=True
+    )
+    assert output.stdout.strip().split("\n")[-1] == "[]"
+
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import nbsexy.__main__"],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    main_line = [
+        line for line in output.stderr.split("\n") if line.endswith("| nbsexy.__main__")
+    ]
+    cumulative_us = int(main_line[0].split("|")[1])
+    assert cumulative_us < IMPORT_TIME_BUDGET_US
+
+
+def test_checks_and_overrides_from_config(tmp_path):
+    with open(os.path.join(notebook_base_path, "failed", "nb_with_21_cells.ipynb")) as f:
+        content = f.read()
+    for dirname in ("nbs", os.path.join("nbs", "legacy")):
+        os.makedirs(tmp_path / dirname)
+        (tmp_path / dirname / "nb.ipynb").write_text(content)
+    (tmp_path / ".nbsexy.toml").write_text(
+        'checks = ["cell_count"]\n'
+        "[[overrides]]\n"
+        'paths = ["nbs/legacy"]\n'
+        "max_cell_count = 30\n"
+    )
+    output = subprocess.run(
+        ["nbsexy", "nbs", "--no_cache"],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    assert "[CHECKS: cell_count]" in output.stdout
+    assert "1 passed, " in output.stdout
+    assert "1 failed, " in output.stdout
+
+    # options given by CLI win.
+    output = subprocess.run(
+        ["nbsexy", "nbs", "--no_cache", "--max_cell_count", "25"],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    assert "2 passed, " in output.stdout
+    output = subprocess.run(
+        ["nbsexy", "nbs", "--no_cache", "--max_cell_count", "5"],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    assert "2 failed, " in output.stdout
+    assert "does not exceed 5:" in output.stdout
+    assert "does not exceed 30" not in output.stdout
+
+    # without CLI options, each group is printed with its own threshold.
+    output = subprocess.run(
+        ["nbsexy", "nbs", "--no_cache", "--verbose"],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    assert "does not exceed 20:" in output.stdout
+    assert "does not exceed 30:" in output.stdout
+
+
+def test_format_jsonl_to_stdout_and_file(tmp_path):
+    path = os.path.join(notebook_base_path, "failed", "nb_without_md.ipynb")
+    output = subprocess.run(
+        ["nbsexy", path, "--has_md", "--no_cache", "--no_daemon", "--format", "jsonl"],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    # stdout only has the report, the usual one goes to stderr.
+    assert json.loads(output.stdout)["status"] == "fail"
+    assert "1 failed, " in output.stderr
+    assert output.returncode == 1
+
+    report = tmp_path / "report.xml"
+    output = subprocess.run(
+        ["nbsexy", path, "--has_md", "--no_cache", "--format", "junit", "--output", str(report)],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    assert "1 failed, " in output.stdout
+    assert 'failures="1"' in report.read_text()
+
+
+def test_fail_fast_reports_partial_results():
+    path = os.path.join(notebook_base_path, "failed")
+    output = subprocess.run(
+        ["nbsexy", path, "--is_ascending", "--no_cache", "--fail_fast"],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    # the first notebook is not a notebook at all.
+    assert "stopped after 1 failed or errored checks (--max_failures 1)" in output.stdout
+    assert "10 notebooks not checked" in output.stdout
+    assert "1 error, " in output.stdout
+    assert output.returncode == 1
@@ -0,0 +1,106 @@
+import os
+import re
+import socket
+import struct
+import subprocess
+import time
+from subprocess import PIPE
+
+import pytest
+
+import nbsexy
+from nbsexy.daemon import get_socket_path
+
+root_path, _ = os.path.split(os.path.split(nbsexy.__file__)[0])
+notebook_base_path = os.path.join(root_path, "tests", "integration", "notebooks")
+socket_path = os.path.join(".nbsexy_cache", "daemon.sock")
+
+
+@pytest.fixture
+def daemon():
+    proc = subprocess.Popen(["nbsexy", "--daemon"], stdout=PIPE, stderr=PIPE)
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.1)
+    yield proc
+    proc.terminate()
+    proc.wait(timeout=10)
+
+
+def _run(*args):
+    return subprocess.run(
+        ["nbsexy", *args], stdout=PIPE, stderr=PIPE, universal_newlines=True
+    )
+
+
+def _remove_time_spent(text):
+    return re.sub(r"in [0-9.]+s", "in Xs", text)
+
+
+def test_output_and_exit_code_are_same_with_or_without_daemon(daemon):
+    args = [notebook_base_path, "--has_md", "--cell_count", "--refresh_cache"]
+    by_daemon = _run(*args)
+    in_process = _run(*args, "--no_daemon")
+
+    assert by_daemon.returncode == in_process.returncode == 1
+    assert _remove_time_spent(by_daemon.stdout) == _remove_time_spent(in_process.stdout)
+    assert by_daemon.stderr == in_process.stderr == ""
+
+    by_daemon, in_process = _run("--has_md"), _run("--has_md", "--no_daemon")
+    assert by_daemon.returncode == in_process.returncode == 2
+    assert by_daemon.stderr == in_process.stderr
+
+
+def test_socket_is_removed_after_daemon_is_terminated(daemon):
+    assert os.path.exists(socket_path)
+    daemon.terminate()
+    daemon.wait(timeout=10)
+    assert not os.path.exists(socket_path)
+    # fall back to run in process.
+    output = _run(os.path.join(notebook_base_path, "successed"), "--has_md")
+    assert output.returncode == 0
+
+
+def _send_raw_request(data):
+    "send raw bytes as a request, and return (stderr, exit code) replied."
+    frames = {b"e": b"", b"x": b""}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(data)
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("rb") as reader:
+            while True:
+                header = reader.read(5)
+                if len(header) < 5:
+                    break
+                channel, length = struct.unpack(">cI", header)
+                frames[channel] += reader.read(length)
+    return frames[b"e"].decode(), frames[b"x"].decode()
+
+
+def test_invalid_requests_get_error_and_daemon_keeps_serving(daemon):
+    version = nbsexy.__version__
+    for data in [
+        b'{"version": "%s", "argv": ["--has_md"]}\n' % version.encode(),
+        b"[1, 2]\n",
+        b'{"version": "%s", "cwd": ' % version.encode(),
+    ]:
+        stderr, returncode = _send_raw_request(data)
+        assert stderr.startswith("nbsexy: error: invalid request to daemon")
+        assert returncode == "2"
+
+    assert daemon.poll() is None
+    output = _run(os.path.join(notebook_base_path, "successed"), "--has_md")
+    assert output.returncode == 0
+
+
+def test_socket_is_at_top_level_of_git_work_tree(tmp_path, monkeypatch):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    (tmp_path / "sub" / "deeper").mkdir(parents=True)
+    expected = os.path.join(str(tmp_path), ".nbsexy_cache", "daemon.sock")
+
+    assert get_socket_path(".nbsexy_cache") == expected
+    monkeypatch.chdir(tmp_path / "sub" / "deeper")
+    assert get_socket_path(".nbsexy_cache") == expected
+    assert get_socket_path("/abs/cache") == os.path.join("/abs/cache", "daemon.sock")
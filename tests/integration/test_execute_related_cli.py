@@ -151,3 +151,81 @@ def test_check_run_and_nb_raise_error_during_run_should_raise():
     assert "PapermillExecutionError" in output.stdout
     assert "ZeroDivisionError" in output.stdout
     assert output.returncode == 1
+
+
+def test_execute_notebooks_concurrently_success():
+    path1 = os.path.join(notebook_base_path, "successed", "valid_nb_1.ipynb")
+    path2 = os.path.join(notebook_base_path, "successed", "notebook_that_read_file.ipynb")
+    path3 = os.path.join(notebook_base_path, "failed", "nb_that_raise_error.ipynb")
+    output = subprocess.run(
+        ["nbsexy", path1, path2, path3, "--execute", "--execute_jobs", "3"],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    assert "ZeroDivisionError" in output.stdout
+    assert "2 passed, " in output.stdout
+    assert "1 failed, " in output.stdout
+    assert output.returncode == 1
+
+
+def test_execute_with_kernel_pool_success():
+    path1 = os.path.join(notebook_base_path, "successed", "valid_nb_1.ipynb")
+    path2 = os.path.join(notebook_base_path, "successed", "notebook_that_read_file.ipynb")
+    output = subprocess.run(
+        ["nbsexy", path1, path2, "--execute", "--kernel_pool", "1"],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    assert "kernel pool: 1 hits, 1 misses" in output.stdout
+    assert output.returncode == 0
+
+
+def test_execute_result_is_cached_and_can_be_refreshed():
+    path1 = os.path.join(notebook_base_path, "successed", "valid_nb_1.ipynb")
+    path2 = os.path.join(notebook_base_path, "failed", "nb_that_raise_error.ipynb")
+    outputs = [
+        subprocess.run(
+            ["nbsexy", path1, path2, "--execute", "--cache_executions"] + args,
+            stdout=PIPE,
+            stderr=PIPE,
+            universal_newlines=True,
+        )
+        for args in ([], [], ["--refresh_cache"], ["--no_cache"])
+    ]
+    assert "execution cache: 0 hits, 2 misses" in outputs[0].stdout
+    assert "execution cache: 2 hits, 0 misses" in outputs[1].stdout
+    assert "execution cache: 0 hits, 2 misses" in outputs[2].stdout
+    assert "execution cache" not in outputs[3].stdout
+    for output in outputs:
+        assert "static check cache" not in output.stdout
+        assert "ZeroDivisionError" in output.stdout
+        assert output.returncode == 1
+
+
+def test_execute_result_is_not_cached_by_default():
+    path = os.path.join(notebook_base_path, "successed", "valid_nb_1.ipynb")
+    for _ in range(2):
+        output = subprocess.run(
+            ["nbsexy", path, "--execute"],
+            stdout=PIPE,
+            stderr=PIPE,
+            universal_newlines=True,
+        )
+        assert "execution cache" not in output.stdout
+        assert output.returncode == 0
+    assert not os.path.exists(os.path.join(".nbsexy_cache", "execute"))
+
+
+def test_execute_saves_executed_notebook_only_if_asked(tmp_path):
+    path = os.path.join(notebook_base_path, "successed", "valid_nb_1.ipynb")
+    output = subprocess.run(
+        ["nbsexy", path, "--execute", "--no_cache", "--save_executed", str(tmp_path)],
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    assert output.returncode == 0
+    saved = os.path.join(tmp_path, os.path.relpath(path))
+    assert os.path.isfile(saved)
@@ -0,0 +1,70 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import nbsexy
+
+root_path, _ = os.path.split(os.path.split(nbsexy.__file__)[0])
+notebook_base_path = os.path.join(root_path, "tests", "integration", "notebooks")
+valid_nb = os.path.join(notebook_base_path, "successed", "valid_nb_1.ipynb")
+nb_without_md = os.path.join(notebook_base_path, "failed", "nb_without_md.ipynb")
+
+
+def test_check_accepts_paths_bytes_and_dicts():
+    with open(nb_without_md, "rb") as f:
+        raw = f.read()
+    results = nbsexy.check([valid_nb, raw, json.loads(raw)], checks=["has_md"])
+
+    assert list(results) == [valid_nb, "<notebook 1>", "<notebook 2>"]
+    assert [r["has_md"].status for r in results.values()] == [True, False, False]
+    assert nbsexy.check({"a": raw}, checks=["has_md"])["a"]["has_md"].status is False
+
+
+def test_check_with_thresholds_and_dir():
+    folder = os.path.join(notebook_base_path, "successed")
+    default = nbsexy.check(folder, checks=["cell_count"])
+    strict = nbsexy.check(folder, checks=["cell_count"], thresholds={"max_cell_count": 1})
+
+    assert len(default) == 3
+    assert all(r["cell_count"].status is True for r in default.values())
+    assert all(r["cell_count"].status is False for r in strict.values())
+
+
+def test_check_unknown_check_should_raise():
+    with pytest.raises(ValueError):
+        nbsexy.check(valid_nb, checks=["no_such_check"])
+    with pytest.raises(ValueError):
+        nbsexy.check(valid_nb, thresholds={"max_something": 1})
+
+
+def _get_statuses(results):
+    return {name: {c: r.status for c, r in checks.items()} for name, checks in results.items()}
+
+
+def test_check_from_threads_get_same_results():
+    files = [valid_nb, nb_without_md] * 20
+    expected = _get_statuses(nbsexy.check(files))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        all_results = list(executor.map(lambda _: nbsexy.check(files), range(16)))
+    for results in all_results:
+        assert _get_statuses(results) == expected
+
+
+def test_check_execute_prints_nothing(tmp_path, capsys):
+    path = tmp_path / "nb.ipynb"
+    with open(valid_nb) as f:
+        content = json.load(f)
+    content["cells"] = [c for c in content["cells"] if c["cell_type"] == "markdown"]
+    code_cell = {"cell_type": "code", "execution_count": None, "metadata": {}, "outputs": []}
+    content["cells"].append(dict(code_cell, source="x = 1"))
+    kernelspec = {"display_name": "Python 3", "language": "python", "name": "python3"}
+    content["metadata"]["kernelspec"] = kernelspec
+    path.write_text(json.dumps(content))
+    capsys.readouterr()
+
+    results = nbsexy.check(str(path), checks=["execute"])
+
+    assert results[str(path)]["execute"].status is True
+    assert capsys.readouterr() == ("", "")
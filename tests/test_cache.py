@@ -0,0 +1,87 @@
+import os
+import time
+
+from nbsexy._checks_fun import CheckResult
+from nbsexy.cache import ExecutionCache, StaticResultCache, read_and_stamp
+
+NB_JSON = {"cells": [{"cell_type": "code", "source": ["a = 1\n", "b = 2"]}]}
+
+
+def test_execution_cache_key_changes_with_code_parameters_and_inputs(tmp_path):
+    input_file = tmp_path / "data.csv"
+    input_file.write_text("a,b")
+    cache = ExecutionCache(str(tmp_path / "cache"), input_files=[str(input_file)])
+    key = cache.get_key(NB_JSON, "nb.ipynb", {"n": 1}, "python3")
+
+    assert key == cache.get_key(NB_JSON, "nb.ipynb", {"n": 1}, "python3")
+    assert key != cache.get_key(NB_JSON, "nb.ipynb", {"n": 2}, "python3")
+    assert key != cache.get_key(NB_JSON, "nb.ipynb", {"n": 1}, "R")
+    changed_nb = {"cells": [{"cell_type": "code", "source": ["a = 2\n", "b = 2"]}]}
+    assert key != cache.get_key(changed_nb, "nb.ipynb", {"n": 1}, "python3")
+
+    input_file.write_text("a,b,c")
+    new_cache = ExecutionCache(str(tmp_path / "cache"), input_files=[str(input_file)])
+    assert key != new_cache.get_key(NB_JSON, "nb.ipynb", {"n": 1}, "python3")
+
+
+def test_execution_cache_evict_least_recently_used(tmp_path):
+    cache = ExecutionCache(str(tmp_path), max_size=1)
+    cache.set("old", CheckResult(status=False, info="failed"))
+    old_time = time.time() - 100
+    os.utime(os.path.join(cache.dir, "old.json"), (old_time, old_time))
+    cache.set("new", CheckResult(status=True))
+    cache.max_size = os.path.getsize(os.path.join(cache.dir, "new.json"))
+    cache.close()
+
+    assert cache.get("old") is None
+    assert cache.get("new").status is True
+    assert (cache.n_hits, cache.n_misses) == (1, 1)
+
+
+def test_static_result_cache_is_invalidated_by_content_and_check_keys(tmp_path):
+    nb = tmp_path / "nb.ipynb"
+    nb.write_text("{}")
+    old_time = time.time() - 100
+    os.utime(nb, (old_time, old_time))
+    cache = StaticResultCache(str(tmp_path / "cache"))
+    cache.set(
+        str(nb), {"has_md:{}": CheckResult(status=False, info="no md")}, read_and_stamp(str(nb))[1]
+    )
+    cache.close()
+
+    cache = StaticResultCache(str(tmp_path / "cache"))
+    assert cache.get(str(nb), ["has_md:{}"])["has_md:{}"].info == "no md"
+    assert cache.get(str(nb), ["has_md:{}", "cell_count:{}"]) is None
+    # same size and mtime, but content is checked by hash when mtime is not trusted.
+    nb.write_text("[]")
+    os.utime(nb, (old_time, old_time))
+    cache._entries[str(nb)]["checked_at"] = old_time
+    assert cache.get(str(nb), ["has_md:{}"]) is None
+    assert cache.get_summary() == "static check cache: 1/3 files hit (33.3%)"
+
+
+def test_static_result_cache_is_written_only_if_changed_and_drops_files_gone(tmp_path):
+    nbs = [tmp_path / "a.ipynb", tmp_path / "b.ipynb", tmp_path / "c.ipynb"]
+    for nb in nbs:
+        nb.write_text("{}")
+    cache = StaticResultCache(str(tmp_path / "cache"))
+    for nb in nbs:
+        cache.set(str(nb), {"has_md:{}": CheckResult(status=True)}, read_and_stamp(str(nb))[1])
+    cache.close()
+    assert os.path.exists(cache.path)
+
+    # nothing changed, the file is not rewritten.
+    os.utime(cache.path, (0, 0))
+    cache = StaticResultCache(str(tmp_path / "cache"))
+    cache.get(str(nbs[0]), ["has_md:{}"])
+    cache.close()
+    assert os.path.getmtime(cache.path) == 0
+
+    # b.ipynb is not checked but still there, c.ipynb is gone.
+    os.remove(nbs[2])
+    cache = StaticResultCache(str(tmp_path / "cache"))
+    cache.get(str(nbs[0]), ["has_md:{}"])
+    cache.close()
+    assert sorted(StaticResultCache(str(tmp_path / "cache"))._entries) == [
+        str(nbs[0]), str(nbs[1])
+    ]
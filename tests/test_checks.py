@@ -0,0 +1,230 @@
+import json
+import os
+import re
+import subprocess
+import time
+from argparse import Namespace
+
+from colorama import Fore, Style
+
+import nbsexy
+import nbsexy.checks
+from nbsexy._checks_fun import OUT_OF_BUDGET, CheckResult
+from nbsexy.cache import StaticResultCache
+from nbsexy.checks import (
+    CheckRunner,
+    FailureLimit,
+    cell_count,
+    execute,
+    has_md,
+    is_ascending_,
+)
+
+root_path, _ = os.path.split(os.path.split(nbsexy.__file__)[0])
+notebook_base_path = os.path.join(root_path, "tests", "integration", "notebooks")
+
+
+def _get_args(**kwargs) -> Namespace:
+    defaults = dict(
+        max_cell_count=20,
+        max_line_in_cell=300,
+        max_total_line_in_nb=1000,
+        save_executed=None,
+        output_tail=10,
+        max_cell_seconds=None,
+        max_notebook_seconds=None,
+        budget=None,
+        kernel_max_memory=None,
+        kernel_max_cpu_seconds=None,
+    )
+    defaults.update(kwargs)
+    return Namespace(**defaults)
+
+
+def test_run_all_load_each_notebook_only_once(monkeypatch):
+    loaded = []
+    load_json = nbsexy.checks.load_json_without_outputs
+
+    def counting_load_json(file):
+        loaded.append(file)
+        return load_json(file)
+
+    monkeypatch.setattr(nbsexy.checks, "load_json_without_outputs", counting_load_json)
+    files = [
+        os.path.join(notebook_base_path, "successed", "valid_nb_1.ipynb"),
+        os.path.join(notebook_base_path, "failed", "nb_with_wrong_order.ipynb"),
+    ]
+    results = CheckRunner(_get_args()).run_all(files, [cell_count, has_md, is_ascending_])
+
+    assert loaded == files
+    assert list(results.keys()) == ["cell_count", "has_md", "is_ascending"]
+    assert all(list(r.keys()) == files for r in results.values())
+    assert results["is_ascending"][files[0]].status is True
+    assert results["is_ascending"][files[1]].status is False
+
+
+def test_run_all_mark_every_check_as_error_when_notebook_cannot_be_loaded():
+    path = os.path.join(notebook_base_path, "failed", "nb_that_is_not_a_nb.ipynb")
+    results = CheckRunner(_get_args()).run_all([path], [cell_count, has_md])
+    assert results["cell_count"][path].status == "Error"
+    assert results["has_md"][path].status == "Error"
+
+
+def test_run_all_with_jobs_get_same_results_in_same_order(monkeypatch):
+    monkeypatch.setattr(nbsexy.checks, "MIN_FILES_PER_JOB", 1)
+    files = sorted(
+        os.path.join(notebook_base_path, folder, name)
+        for folder in ("successed", "failed")
+        for name in os.listdir(os.path.join(notebook_base_path, folder))
+        if name.endswith(".ipynb")
+    )
+    checks = [cell_count, has_md, is_ascending_]
+    serial = CheckRunner(_get_args(jobs=1)).run_all(files, checks)
+    pooled = CheckRunner(_get_args(jobs=3)).run_all(files, checks)
+
+    for check in checks:
+        assert list(pooled[check.name].keys()) == files
+        assert [r.status for r in pooled[check.name].values()] == [
+            r.status for r in serial[check.name].values()
+        ]
+
+
+def test_run_all_does_not_open_notebooks_with_cached_results(monkeypatch, tmp_path):
+    nb = tmp_path / "nb.ipynb"
+    with open(os.path.join(notebook_base_path, "successed", "valid_nb_1.ipynb")) as f:
+        nb.write_text(f.read())
+    old_time = time.time() - 100
+    os.utime(nb, (old_time, old_time))
+    files = [str(nb)]
+    checks = [cell_count, has_md]
+    cache = StaticResultCache(str(tmp_path / "cache"))
+    first = CheckRunner(_get_args(), result_cache=cache).run_all(files, checks)
+
+    monkeypatch.setattr(nbsexy.checks, "read_and_stamp", None)
+    second = CheckRunner(_get_args(), result_cache=cache).run_all(files, checks)
+    assert {name: r[str(nb)].status for name, r in second.items()} == {
+        name: r[str(nb)].status for name, r in first.items()
+    }
+    assert (cache.n_hits, cache.n_misses) == (1, 1)
+
+    # a different threshold is a different check.
+    monkeypatch.undo()
+    third = CheckRunner(_get_args(max_cell_count=1), result_cache=cache).run_all(files, checks)
+    assert third["cell_count"][str(nb)].status is False
+    assert (cache.n_hits, cache.n_misses) == (1, 2)
+
+
+def test_run_all_caches_results_with_content_checked_not_content_at_the_end(tmp_path):
+    nb = tmp_path / "nb.ipynb"
+    nb_json = {"cells": [], "metadata": {}, "nbformat": 4, "nbformat_minor": 4}
+    nb.write_text(json.dumps(nb_json))
+    cache = StaticResultCache(str(tmp_path / "cache"))
+    set_results = cache.set
+
+    def set_after_notebook_saved(filename, results, stamp):
+        # the notebook is saved after it is checked, but before results are stored.
+        nb_json["cells"].append({"cell_type": "markdown", "metadata": {}, "source": "# md"})
+        nb.write_text(json.dumps(nb_json))
+        set_results(filename, results, stamp)
+
+    cache.set = set_after_notebook_saved
+    first = CheckRunner(_get_args(), result_cache=cache).run_all([str(nb)], [has_md])
+    assert first["has_md"][str(nb)].status is False
+
+    cache = StaticResultCache(str(tmp_path / "cache"))
+    second = CheckRunner(_get_args(), result_cache=cache).run_all([str(nb)], [has_md])
+    assert second["has_md"][str(nb)].status is True
+    assert (cache.n_hits, cache.n_misses) == (0, 1)
+
+
+def test_run_all_read_notebooks_from_git_rev(monkeypatch, tmp_path):
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    with open(os.path.join(notebook_base_path, "successed", "valid_nb_1.ipynb")) as f:
+        (tmp_path / "nb.ipynb").write_text(f.read())
+    git("init", "-q")
+    git("add", "nb.ipynb")
+    git("-c", "user.name=a", "-c", "user.email=a@a", "commit", "-q", "-m", "init")
+    (tmp_path / "nb.ipynb").write_text("not a notebook")
+    monkeypatch.chdir(tmp_path)
+
+    runner = CheckRunner(_get_args(git_rev="HEAD"))
+    try:
+        results = runner.run_all(["nb.ipynb", "missing.ipynb"], [has_md])
+    finally:
+        runner.close()
+    assert results["has_md"]["nb.ipynb"].status is True
+    assert results["has_md"]["missing.ipynb"].status == "Error"
+    assert "not found" in results["has_md"]["missing.ipynb"].info
+
+
+def test_run_all_stops_once_failure_limit_is_reached(monkeypatch):
+    failed = os.path.join(notebook_base_path, "failed", "nb_without_md.ipynb")
+    valid = os.path.join(notebook_base_path, "successed", "valid_nb_1.ipynb")
+    limit = FailureLimit(1)
+    results = CheckRunner(_get_args(), failure_limit=limit).run_all(
+        [valid, failed, valid + "_copy"], [has_md]
+    )
+    assert list(results["has_md"].keys()) == [valid, failed]
+    assert limit.is_reached and limit.n_failures == 1
+
+    # process pool stops taking results as well.
+    monkeypatch.setattr(nbsexy.checks, "MIN_FILES_PER_JOB", 1)
+    reported = []
+    limit = FailureLimit(2)
+    CheckRunner(
+        _get_args(jobs=2),
+        on_result=lambda filename, _: reported.append(filename),
+        failure_limit=limit,
+    ).run_all([failed] * 20, [has_md])
+    assert len(reported) == 2
+    assert limit.n_failures == 2
+
+
+def _write_notebook(path, sources):
+    cells = [
+        {"cell_type": "code", "execution_count": None, "metadata": {}, "outputs": [], "source": s}
+        for s in sources
+    ]
+    metadata = {"kernelspec": {"display_name": "Python 3", "language": "python", "name": "python3"}}
+    path.write_text(json.dumps({"cells": cells, "metadata": metadata, "nbformat": 4, "nbformat_minor": 4}))
+    return str(path)
+
+
+def test_failure_limit_interrupts_running_executions(tmp_path):
+    failing = _write_notebook(tmp_path / "a_failing.ipynb", ["raise ValueError()"])
+    slow = _write_notebook(tmp_path / "b_slow.ipynb", ["import time", "time.sleep(120)", "1"])
+    never = _write_notebook(tmp_path / "c_never.ipynb", ["1"])
+    limit = FailureLimit(1)
+    runner = CheckRunner(
+        _get_args(execute_jobs=2),
+        resources={"cancellation": limit.cancellation},
+        failure_limit=limit,
+    )
+
+    start = time.time()
+    results = runner.run_all([failing, slow, never], [execute])
+
+    assert time.time() - start < 60
+    assert list(results["execute"].keys()) == [failing]
+    assert results["execute"][failing].status is False
+
+
+def test_header_counts_out_of_budget_apart_from_failures(capsys):
+    runner = CheckRunner(_get_args())
+    out_of_budget = CheckResult(OUT_OF_BUDGET, "ran out of --budget 5.0s")
+
+    runner.print_check_results(
+        execute, {"a.ipynb": CheckResult(True), "b.ipynb": out_of_budget}, verbose=False
+    )
+    header = capsys.readouterr().out.split("\n")[0]
+    assert re.sub(r"\x1b\[[0-9;]*m", "", header).endswith(" [1/2, 1 out of budget]")
+    assert Fore.CYAN + Style.BRIGHT + "1" in header and Fore.RED not in header
+
+    runner.print_check_results(
+        execute, {"a.ipynb": CheckResult(False), "b.ipynb": out_of_budget}, verbose=False
+    )
+    header = capsys.readouterr().out.split("\n")[0]
+    assert re.sub(r"\x1b\[[0-9;]*m", "", header).endswith(" [0/2, 1 out of budget]")
+    assert Fore.RED + Style.BRIGHT + "0" in header
@@ -0,0 +1,55 @@
+from nbsexy._checks_fun import (
+    CheckResult,
+    NotebookSummary,
+    _apply_time_budget,
+    check_all_code_cell_not_exceed_max_count,
+    check_execution_count_is_ascending,
+)
+
+NB_JSON = {
+    "cells": [
+        {"cell_type": "markdown", "source": ["# title"]},
+        {"cell_type": "code", "execution_count": 2, "source": ["a = 1\n", "b = 2"]},
+        {"cell_type": "code", "execution_count": None, "source": "print('é')\nprint(a)"},
+        {"cell_type": "raw", "source": []},
+        {"cell_type": "code", "execution_count": 1, "source": []},
+    ]
+}
+
+
+def test_notebook_summary_collect_metrics_in_one_pass():
+    summary = NotebookSummary.from_nb_json(NB_JSON)
+    assert summary.n_code_cells == 3
+    assert summary.n_markdown_cells == 1
+    assert summary.code_line_counts == [2, 2, 0]
+    assert summary.code_byte_sizes == [11, 20, 0]
+    assert summary.execution_counts == [2, None, 1]
+    assert summary.total_code_lines == 4
+
+
+def test_checks_over_summary():
+    summary = NotebookSummary.from_nb_json(NB_JSON)
+    assert check_execution_count_is_ascending(summary).status is False
+    result = check_all_code_cell_not_exceed_max_count(summary, max_line_in_cell=1)
+    assert result.status is False
+    assert result.info == "following chunks exceed: 2,None"
+
+
+def test_time_budget_fails_passed_notebook_only():
+    result = CheckResult(True, cell_seconds=[(1, 0.5, "import a"), (3, 2.5, "train()")])
+
+    assert _apply_time_budget(result, None, None) is result
+    assert _apply_time_budget(result, 3, 3.5) is result
+    over_cell = _apply_time_budget(result, 2, None)
+    assert over_cell.status is False
+    assert over_cell.info == "cell 3 took 2.50s (> 2s): train()"
+    assert _apply_time_budget(result, None, 2.9).info == "all cells took 3.00s (> 2.9s)"
+
+    failed = CheckResult(False, "boom", cell_seconds=result.cell_seconds)
+    assert _apply_time_budget(failed, 0, 0) is failed
+
+
+def test_check_result_round_trip_with_cell_seconds():
+    result = CheckResult(True, cell_seconds=[(1, 0.5, "import a")])
+    assert CheckResult.from_dict(result.to_dict()).cell_seconds == result.cell_seconds
+    assert "cell_seconds" not in CheckResult(True).to_dict()
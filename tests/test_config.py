@@ -0,0 +1,89 @@
+import os
+from argparse import Namespace
+
+import pytest
+
+from nbsexy.config import Config
+
+PYPROJECT = """
+[project]
+name = "x"
+
+[tool.nbsexy]
+checks = ["has_md", "cell_count"]
+max_cell_count = 30
+
+[[tool.nbsexy.overrides]]
+paths = ["legacy"]
+max_cell_count = 60
+
+[[tool.nbsexy.overrides]]
+paths = ["legacy/old_*"]
+checks = ["has_md"]
+"""
+
+
+def test_config_is_found_from_parent_dir_and_normalized(tmp_path):
+    (tmp_path / "pyproject.toml").write_text(PYPROJECT)
+    (tmp_path / "sub").mkdir()
+    config = Config.find(str(tmp_path / "sub"))
+
+    assert config.root == str(tmp_path)
+    assert config.options["has_md"] is True
+    assert config.options["is_ascending"] is False
+    assert config.options["max_cell_count"] == 30
+    with pytest.raises(ValueError):
+        Config(config.path, {"no_such_option": 1}, []).get_defaults(["has_md"])
+
+
+def test_pyproject_without_nbsexy_is_skipped(tmp_path):
+    (tmp_path / ".nbsexy.toml").write_text("checks = ['is_ascending']\n")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "pyproject.toml").write_text("[project]\nname = 'x'\n")
+    assert Config.find(str(tmp_path / "sub")).options["is_ascending"] is True
+
+
+def test_group_files_resolve_overrides_by_dir(tmp_path, monkeypatch):
+    (tmp_path / "pyproject.toml").write_text(PYPROJECT)
+    config = Config.find(str(tmp_path))
+    files = [
+        os.path.join(tmp_path, *parts)
+        for parts in [
+            ("a.ipynb",),
+            ("legacy", "b.ipynb"),
+            ("legacy", "old_1", "c.ipynb"),
+            ("legacy", "old_1", "deep", "d.ipynb"),
+            ("legacy2", "e.ipynb"),
+        ]
+    ]
+    calls = []
+    match_overrides = config._match_overrides
+    monkeypatch.setattr(
+        config, "_match_overrides", lambda d: calls.append(d) or match_overrides(d)
+    )
+    args = Namespace(has_md=True, cell_count=True, max_cell_count=30)
+    groups = config.group_files(args, files + files)
+
+    assert len(calls) == 5
+    summary = [
+        (a.has_md, a.cell_count, a.max_cell_count, [os.path.basename(f) for f in fs])
+        for a, fs in groups
+    ]
+    assert summary == [
+        (True, True, 30, ["a.ipynb", "e.ipynb"] * 2),
+        (True, True, 60, ["b.ipynb"] * 2),
+        (True, False, 60, ["c.ipynb", "d.ipynb"] * 2),
+    ]
+    assert args.max_cell_count == 30
+
+
+def test_group_files_never_override_options_given_by_cli(tmp_path):
+    (tmp_path / "pyproject.toml").write_text(PYPROJECT)
+    config = Config.find(str(tmp_path))
+    files = [os.path.join(tmp_path, "legacy", "old_1", "c.ipynb")]
+    args = Namespace(
+        has_md=True, cell_count=True, max_cell_count=5, explicit_options={"max_cell_count"}
+    )
+    [(group_args, _)] = config.group_files(args, files)
+
+    assert (group_args.max_cell_count, group_args.cell_count) == (5, False)
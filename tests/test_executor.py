@@ -0,0 +1,206 @@
+import json
+import os
+import time
+
+import nbformat
+import pytest
+from papermill import PapermillExecutionError
+
+import nbsexy.executor
+from nbsexy.cache import ExecutionCache
+from nbsexy._checks_fun import (
+    OUT_OF_BUDGET,
+    check_nb_can_be_run_parameterizd_without_error_raised,
+    check_nb_can_be_run_without_error_raised,
+)
+from nbsexy.executor import execute_notebook, get_cell_seconds, get_saved_path
+from nbsexy.kernel_monitor import KernelMonitor
+
+
+KERNELSPEC = {"display_name": "Python 3", "language": "python", "name": "python3"}
+
+
+def _nb_json(sources):
+    cells = [
+        {"cell_type": "code", "execution_count": None, "metadata": {}, "outputs": [], "source": s}
+        for s in sources
+    ]
+    return {"cells": cells, "metadata": {"kernelspec": KERNELSPEC}, "nbformat": 4, "nbformat_minor": 4}
+
+
+def test_execute_notebook_runs_parsed_notebook_without_reading_file(tmp_path):
+    # the file does not exist, only its dir is used as working dir of kernel.
+    filename = str(tmp_path / "missing.ipynb")
+    nb_json = _nb_json([["import os\n", "assert os.getcwd() == ", repr(str(tmp_path))]])
+    original = json.dumps(nb_json)
+
+    execute_notebook(nb_json, filename, parameters=dict())
+
+    assert json.dumps(nb_json) == original
+    assert os.listdir(tmp_path) == []
+
+
+def test_parameterized_execution_converts_notebook_once(monkeypatch, tmp_path):
+    nb_json = _nb_json(["n = 1", "n = 2", "assert n == 2"])
+    nb_json["cells"][0]["metadata"]["tags"] = ["parameters"]
+    nb_json["cells"][1]["metadata"]["tags"] = ["nbsexy-parameters"]
+    original = json.dumps(nb_json)
+    converted = []
+    to_notebook_node = nbsexy.executor.to_notebook_node
+
+    def counting_to_notebook_node(nb):
+        converted.append(nb)
+        return to_notebook_node(nb)
+
+    monkeypatch.setattr(nbsexy.executor, "to_notebook_node", counting_to_notebook_node)
+    result = check_nb_can_be_run_parameterizd_without_error_raised(
+        nb_json, str(tmp_path / "nb.ipynb"), quiet=True
+    )
+
+    assert result.status is True
+    assert len(converted) == 1
+    assert json.dumps(nb_json) == original
+
+
+def test_execute_notebook_saves_executed_notebook_only_if_asked(tmp_path):
+    filename = str(tmp_path / "nb.ipynb")
+    save_path = str(tmp_path / "executed" / "nb.ipynb")
+
+    execute_notebook(_nb_json(["print('hello')"]), filename, parameters=dict(), save_path=save_path)
+    saved = nbformat.read(save_path, as_version=4)
+    assert saved.cells[0].outputs[0].text == "hello\n"
+
+    # failed notebooks are saved too, with the error.
+    with pytest.raises(PapermillExecutionError):
+        execute_notebook(
+            _nb_json(["raise ValueError('boom')"]), filename, parameters=dict(), save_path=save_path
+        )
+    saved = nbformat.read(save_path, as_version=4)
+    assert any(o.get("evalue") == "boom" for c in saved.cells for o in c.get("outputs", []))
+
+
+def test_get_saved_path(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    relative = os.path.join("nbs", "a.ipynb")
+    assert get_saved_path("out", relative) == os.path.join("out", relative)
+    assert get_saved_path("out", str(tmp_path / "a.ipynb")) == os.path.join("out", "a.ipynb")
+    outside = os.path.join(os.path.dirname(str(tmp_path)), "b.ipynb")
+    assert get_saved_path("out", outside) == os.path.join("out", outside.lstrip(os.sep))
+
+
+def test_outputs_are_dropped_while_executing_except_errors_and_tail(monkeypatch, tmp_path):
+    lengths = []
+    drop_old_outputs = nbsexy.executor._drop_old_outputs
+
+    def recording_drop_old_outputs(outputs, n_kept):
+        drop_old_outputs(outputs, n_kept)
+        lengths.append(len(outputs))
+
+    monkeypatch.setattr(nbsexy.executor, "_drop_old_outputs", recording_drop_old_outputs)
+    nb_json = _nb_json(["for i in range(200):\n    display(i)\nraise ValueError('boom')"])
+    result = check_nb_can_be_run_without_error_raised(
+        nb_json, str(tmp_path / "nb.ipynb"), output_tail=3
+    )
+
+    assert len(lengths) > 200
+    assert max(lengths) <= 4
+    assert result.status is False
+    assert "boom" in result.info
+    assert "last outputs of the cell:\n197\n198\n199\n" in result.info
+
+
+def test_execution_time_budget_is_applied_after_cache(tmp_path):
+    cache = ExecutionCache(str(tmp_path / "cache"))
+    filename = str(tmp_path / "nb.ipynb")
+    nb_json = _nb_json(["import time", "time.sleep(0.3)"])
+    nb_json["cells"].insert(0, {"cell_type": "markdown", "metadata": {}, "source": "# title"})
+
+    result = check_nb_can_be_run_without_error_raised(
+        nb_json, filename, execution_cache=cache, max_cell_seconds=0.2
+    )
+    assert result.status is False
+    assert result.info.startswith("cell 2 took ")
+    assert [index for index, _, _ in result.cell_seconds] == [1, 2]
+
+    # the cached result is the one without budget.
+    result = check_nb_can_be_run_without_error_raised(
+        nb_json, filename, execution_cache=cache, max_notebook_seconds=60
+    )
+    assert result.status is True
+    assert cache.n_hits == 1
+
+
+def test_budget_stops_executing_and_is_not_cached(tmp_path):
+    cache = ExecutionCache(str(tmp_path / "cache"))
+    filename = str(tmp_path / "nb.ipynb")
+    nb_json = _nb_json(["x = 1", "import time\ntime.sleep(60)", "x = 3"])
+
+    start = time.monotonic()
+    result = check_nb_can_be_run_without_error_raised(
+        nb_json, filename, execution_cache=cache, budget=1
+    )
+    assert time.monotonic() - start < 30
+    assert result.status == OUT_OF_BUDGET
+    assert "1 of 3 code cells passed" in result.info
+
+    # errors before the budget is spent still fail, and a full run is cached.
+    result = check_nb_can_be_run_without_error_raised(
+        _nb_json(["raise ValueError('boom')"]), filename, budget=30
+    )
+    assert result.status is False
+    result = check_nb_can_be_run_without_error_raised(
+        _nb_json(["x = 1"]), filename, execution_cache=cache, budget=30
+    )
+    assert result.status is True
+    assert cache.n_hits == 0 and len(os.listdir(cache.dir)) == 1
+
+
+@pytest.mark.skipif(not KernelMonitor.is_supported(), reason="needs /proc")
+def test_kernel_usage_is_measured_and_limited(tmp_path):
+    cache = ExecutionCache(str(tmp_path / "cache"))
+    filename = str(tmp_path / "nb.ipynb")
+    # CPU time is counted from the first cell, so the cell has to spend some.
+    result = check_nb_can_be_run_without_error_raised(
+        _nb_json(["x = sum(range(10 ** 6))"]), filename, execution_cache=cache
+    )
+    assert result.status is True
+    assert result.kernel_usage["peak_rss_mb"] > 10
+    assert result.kernel_usage["cpu_seconds"] > 0
+
+    # a cached result fails if its recorded usage is over the limit.
+    result = check_nb_can_be_run_without_error_raised(
+        _nb_json(["x = sum(range(10 ** 6))"]),
+        filename,
+        execution_cache=cache,
+        kernel_max_memory=1,
+    )
+    assert result.status is False
+    assert result.info.startswith("kernel used ")
+    assert cache.n_hits == 1
+
+    # a kernel allocating memory is killed, and its result is not cached.
+    nb_json = _nb_json(["import time", "x = bytearray(400 * 1024 * 1024)\ntime.sleep(60)"])
+    start = time.monotonic()
+    result = check_nb_can_be_run_without_error_raised(
+        nb_json, filename, execution_cache=cache, kernel_max_memory=300
+    )
+    assert time.monotonic() - start < 30
+    assert result.status is False
+    assert "(> --kernel_max_memory 300MB), the kernel is killed" in result.info
+    assert result.kernel_usage["peak_rss_mb"] > 300
+    assert len(os.listdir(cache.dir)) == 1
+
+
+def test_get_cell_seconds_does_not_count_injected_parameters():
+    def cell(source, seconds, tags=()):
+        metadata = {"tags": list(tags), "papermill": {"duration": seconds}}
+        return nbformat.v4.new_code_cell(source, metadata=metadata)
+
+    nb = nbformat.v4.new_notebook()
+    nb.cells = [
+        cell("x = 1", 0.1, tags=["parameters"]),
+        cell("x = 2", 0.1, tags=["injected-parameters"]),
+        nbformat.v4.new_markdown_cell("# title"),
+        cell("\nfit(x)\nplot()", 2.0),
+    ]
+    assert get_cell_seconds(nb) == [(0, 0.1, "x = 1"), (2, 2.0, "fit(x)")]
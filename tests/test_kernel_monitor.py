@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from nbsexy.kernel_monitor import KernelMonitor, _read_process_tree
+
+pytestmark = pytest.mark.skipif(not KernelMonitor.is_supported(), reason="needs /proc")
+
+# a parent which sleeps, and a child which spins a core.
+SPINNING_CHILD = (
+    "import subprocess, sys, time\n"
+    "subprocess.Popen([sys.executable, '-c', 'while True: pass'])\n"
+    "time.sleep(60)\n"
+)
+# spins a core for a while, like a kernel warming up, then sleeps.
+WARMING_UP = (
+    "import time\n"
+    "end = time.process_time() + 0.5\n"
+    "while time.process_time() < end: pass\n"
+    "time.sleep(60)\n"
+)
+
+
+def test_read_process_tree():
+    tree = _read_process_tree(os.getpid())
+    pid, ppid, rss, cpu_seconds = tree[0]
+    assert (pid, ppid) == (os.getpid(), os.getppid())
+    assert rss > 0 and cpu_seconds > 0
+    assert _read_process_tree(2 ** 22 + 1) == []
+
+
+def test_monitor_kills_process_tree_over_cpu_limit():
+    process = subprocess.Popen([sys.executable, "-c", SPINNING_CHILD])
+    monitor = KernelMonitor(max_cpu_seconds=0.5, interval=0.05)
+    try:
+        monitor.start(process.pid)
+        monitor.set_cpu_baseline()
+        deadline = time.monotonic() + 30
+        while len(_read_process_tree(process.pid)) < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        children = [pid for pid, _, _, _ in _read_process_tree(process.pid)[1:]]
+        process.wait(timeout=30)
+        monitor.stop()
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+    assert monitor.limit_exceeded.startswith("kernel used ")
+    assert monitor.limit_exceeded.endswith(", the kernel is killed")
+    assert monitor.usage["cpu_seconds"] > 0.5
+    assert monitor.usage["peak_rss_mb"] > 0
+    # the child is killed too, it is reaped by init since its parent is gone.
+    assert children and _read_process_tree(children[0]) == []
+
+
+def test_monitor_counts_cpu_seconds_from_baseline():
+    process = subprocess.Popen([sys.executable, "-c", WARMING_UP])
+    monitor = KernelMonitor(max_cpu_seconds=0.3, interval=0.05)
+    try:
+        monitor.start(process.pid)
+        deadline = time.monotonic() + 30
+        while _read_process_tree(process.pid)[0][3] < 0.5 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        monitor.set_cpu_baseline()
+        time.sleep(0.3)
+        monitor.stop()
+    finally:
+        process.kill()
+        process.wait()
+
+    assert monitor.limit_exceeded is None
+    assert monitor.usage["cpu_seconds"] < 0.3
@@ -0,0 +1,56 @@
+import glob
+import json
+import os
+
+import pytest
+
+import nbsexy
+from nbsexy._checks_fun import load_json
+from nbsexy.loader import load_json_without_outputs, loads_without_outputs
+
+root_path, _ = os.path.split(os.path.split(nbsexy.__file__)[0])
+notebook_base_path = os.path.join(root_path, "tests", "integration", "notebooks")
+
+
+def _drop_outputs(nb_json):
+    for cell in nb_json["cells"]:
+        if "outputs" in cell:
+            cell["outputs"] = []
+        if "attachments" in cell:
+            cell["attachments"] = {}
+    return nb_json
+
+
+@pytest.mark.parametrize(
+    "path", sorted(glob.glob(os.path.join(notebook_base_path, "successed", "*.ipynb")))
+)
+def test_load_json_without_outputs_equals_to_load_json_without_outputs(path):
+    assert load_json_without_outputs(path) == _drop_outputs(load_json(path))
+
+
+def test_outputs_inside_string_is_not_stripped():
+    nb_json = {
+        "cells": [
+            {
+                "cell_type": "code",
+                "source": ['x = {"outputs": [1, "]"]}\n', 'y = "\\\\"\n'],
+                "outputs": [{"text": ['"outputs": [', "\\\"]}"]}],
+                "metadata": {"outputs": "outputs"},
+            },
+            {
+                "cell_type": "markdown",
+                "source": ["![img](attachment:a.png)"],
+                "attachments": {"a.png": {"image/png": "iVBORw0KGgo="}},
+            },
+        ]
+    }
+    for indent in (None, 1):
+        raw = json.dumps(nb_json, indent=indent).encode()
+        loaded = loads_without_outputs(raw)
+        assert loaded == _drop_outputs(json.loads(raw))
+        assert loaded["cells"][0]["source"] == nb_json["cells"][0]["source"]
+
+
+def test_invalid_notebook_should_raise():
+    with pytest.raises(ValueError):
+        loads_without_outputs(b'{"cells": [{"outputs": [{"text": "]}')
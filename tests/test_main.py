@@ -0,0 +1,20 @@
+import os
+
+from nbsexy.__main__ import Launcher
+from nbsexy._checks_fun import CheckResult
+
+notebook_base_path = os.path.join(os.path.dirname(__file__), "integration", "notebooks")
+
+
+def test_print_delta_skips_checks_turned_off_for_a_path(capsys):
+    path = os.path.join(notebook_base_path, "successed")
+    launcher = Launcher([path, "--has_md", "--cell_count", "--no_cache"])
+    old = {"has_md": {"a.ipynb": CheckResult(True)}, "cell_count": dict()}
+    # cell_count is turned off for a.ipynb by config overrides.
+    new = {"has_md": {"a.ipynb": CheckResult(False, "no md")}, "cell_count": dict()}
+
+    launcher._print_delta(old, new, {"a.ipynb"})
+
+    out = capsys.readouterr().out
+    assert "[has_md] a.ipynb: True -> False" in out
+    assert "cell_count" not in out
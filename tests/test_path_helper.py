@@ -1,14 +1,20 @@
+import json
 import os
+import subprocess
 from pathlib import Path
 
 import pytest
 
 import nbsexy
+import nbsexy.path_helper
 from nbsexy.path_helper import (
     _filter_exclude_patterns,
     _iter_dir_and_get_all_files_with_given_suffix,
+    collect_files_at_git_rev,
+    collect_files_changed_since,
     collect_files_contain_given_suffix_from_paths,
     exclude_path_by_glob_patterns,
+    iter_paths_from_file,
 )
 
 root_path, _ = os.path.split(os.path.split(nbsexy.__file__)[0])
@@ -46,3 +52,155 @@ def test_collect_files_contain_given_suffix_from_paths_correct():
 def test_input_non_dir_to_iter_dir_and_get_all_files_with_given_suffix_should_raise():
     with pytest.raises(AssertionError):
         _ = _iter_dir_and_get_all_files_with_given_suffix(Path("some_weird_path.qq"), ".qq")
+
+
+def test_collect_files_prune_excluded_dirs_and_stop_at_symlink_loop(tmp_path):
+    for d in ("nbs/sub", "venv/lib", "nbs/build"):
+        (tmp_path / d).mkdir(parents=True)
+    for f in (
+        "nbs/a.ipynb",
+        "nbs/sub/b.ipynb",
+        "nbs/sub/skip_me.ipynb",
+        "venv/lib/c.ipynb",
+        "nbs/build/d.ipynb",
+    ):
+        (tmp_path / f).write_text("{}")
+    (tmp_path / "nbs" / "sub" / "loop").symlink_to(tmp_path / "nbs")
+
+    res = collect_files_contain_given_suffix_from_paths(
+        [str(tmp_path)], exclude_patterns=["*skip*"]
+    )
+    assert {os.path.relpath(p, tmp_path) for p in res} == {
+        os.path.join("nbs", "a.ipynb"),
+        os.path.join("nbs", "sub", "b.ipynb"),
+    }
+
+
+def test_collect_files_from_git_index_honour_gitignore(tmp_path):
+    def git(*args):
+        subprocess.run(["git", "-C", str(tmp_path), *args], check=True, capture_output=True)
+
+    (tmp_path / "sub").mkdir()
+    for f in ("a.ipynb", "sub/b.ipynb", "ignored.ipynb", "new.ipynb", "deleted.ipynb"):
+        (tmp_path / f).write_text("{}")
+    (tmp_path / ".gitignore").write_text("ignored.ipynb\n")
+    git("init", "-q")
+    git("add", "a.ipynb", "sub/b.ipynb", "deleted.ipynb", ".gitignore")
+    (tmp_path / "deleted.ipynb").unlink()
+
+    def collect(**kwargs):
+        res = collect_files_contain_given_suffix_from_paths(
+            [str(tmp_path)], use_git=True, **kwargs
+        )
+        return {os.path.relpath(p, tmp_path) for p in res}
+
+    assert collect() == {"a.ipynb", os.path.join("sub", "b.ipynb")}
+    assert collect(include_untracked=True) == {
+        "a.ipynb",
+        os.path.join("sub", "b.ipynb"),
+        "new.ipynb",
+    }
+    assert collect(exclude_patterns=["a.*"]) == {os.path.join("sub", "b.ipynb")}
+
+
+def test_collect_files_from_git_fall_back_to_walk_outside_work_tree(tmp_path):
+    (tmp_path / "a.ipynb").write_text("{}")
+    res = collect_files_contain_given_suffix_from_paths([str(tmp_path)], use_git=True)
+    assert {os.path.relpath(p, tmp_path) for p in res} == {"a.ipynb"}
+
+
+def test_collect_files_changed_since_ref(tmp_path):
+    def git(*args):
+        subprocess.run(["git", "-C", str(tmp_path), *args], check=True, capture_output=True)
+
+    (tmp_path / "sub").mkdir()
+    for f in ("same.ipynb", "modified.ipynb", "sub/old_name.ipynb", "deleted.ipynb"):
+        (tmp_path / f).write_text(json.dumps({"name": f, "cells": []}))
+    git("init", "-q")
+    git("add", ".")
+    git("-c", "user.name=a", "-c", "user.email=a@a", "commit", "-q", "-m", "init")
+    (tmp_path / "modified.ipynb").write_text("{}")
+    git("mv", "sub/old_name.ipynb", "sub/new_name.ipynb")
+    (tmp_path / "deleted.ipynb").unlink()
+    (tmp_path / "untracked.ipynb").write_text("{}")
+
+    res = collect_files_changed_since([str(tmp_path)], "HEAD")
+    assert {os.path.relpath(p, tmp_path) for p in res} == {
+        "modified.ipynb",
+        os.path.join("sub", "new_name.ipynb"),
+        "untracked.ipynb",
+    }
+    res = collect_files_changed_since([str(tmp_path / "sub")], "HEAD")
+    assert {os.path.relpath(p, tmp_path) for p in res} == {os.path.join("sub", "new_name.ipynb")}
+    res = collect_files_changed_since(
+        [str(tmp_path / "same.ipynb"), str(tmp_path / "modified.ipynb")],
+        "HEAD",
+        exclude_patterns=["untracked*"],
+    )
+    assert {os.path.relpath(p, tmp_path) for p in res} == {"modified.ipynb"}
+    with pytest.raises(ValueError):
+        collect_files_changed_since([str(tmp_path)], "no_such_ref")
+
+
+def test_collect_files_changed_since_ask_git_once_per_work_tree(tmp_path, monkeypatch):
+    tmp_path = Path(os.path.realpath(tmp_path))
+
+    def git(*args):
+        subprocess.run(["git", "-C", str(tmp_path), *args], check=True, capture_output=True)
+
+    git("init", "-q")
+    git("-c", "user.name=a", "-c", "user.email=a@a", "commit", "-q", "--allow-empty", "-m", "init")
+    for i in range(3):
+        (tmp_path / f"dir_{i}").mkdir()
+    files = [tmp_path / f"dir_{i % 3}" / f"nb_{i}.ipynb" for i in range(300)]
+    for f in files:
+        f.write_text("{}")
+    git_calls = []
+    run_git = nbsexy.path_helper._run_git
+
+    def counting_run_git(cwd, *args):
+        git_calls.append(args[0])
+        return run_git(cwd, *args)
+
+    monkeypatch.setattr(nbsexy.path_helper, "_run_git", counting_run_git)
+    # pre-commit passes files one by one.
+    paths = [str(f) for f in files[:200]] + [str(tmp_path / "dir_0")]
+    res = collect_files_changed_since(paths, "HEAD")
+    assert res == {str(f) for f in files[:200]} | {str(f) for f in files[::3]}
+    assert sorted(git_calls) == ["diff", "ls-files", "rev-parse"]
+
+
+def test_collect_files_at_git_rev_takes_any_number_of_paths(tmp_path, monkeypatch):
+    def git(*args):
+        subprocess.run(["git", "-C", str(tmp_path), *args], check=True, capture_output=True)
+
+    (tmp_path / "sub" / "deep").mkdir(parents=True)
+    for f in ("a.ipynb", "b.ipynb", "sub/c.ipynb", "sub/deep/d.ipynb", "sub/e.txt"):
+        (tmp_path / f).write_text("{}")
+    git("init", "-q")
+    git("add", ".")
+    git("-c", "user.name=a", "-c", "user.email=a@a", "commit", "-q", "-m", "init")
+    (tmp_path / "b.ipynb").unlink()
+
+    monkeypatch.chdir(tmp_path / "sub")
+    assert collect_files_at_git_rev(["."], "HEAD") == ["c.ipynb", "deep/d.ipynb"]
+    assert collect_files_at_git_rev([".."], "HEAD", exclude_patterns=["*/d.*"]) == [
+        "../a.ipynb",
+        "../b.ipynb",
+        "c.ipynb",
+    ]
+    # far more paths than a command line takes.
+    paths = [f"../missing_{i:06}/nb.ipynb" for i in range(200000)]
+    paths += ["../b.ipynb", str(tmp_path / "sub" / "deep")]
+    assert collect_files_at_git_rev(paths, "HEAD") == ["../b.ipynb", "deep/d.ipynb"]
+    with pytest.raises(ValueError):
+        collect_files_at_git_rev(["../.."], "HEAD")
+
+
+@pytest.mark.parametrize("sep", [b"\0", b"\n", b"\r\n"])
+def test_iter_paths_from_file_split_by_nul_or_newline(tmp_path, sep):
+    # long enough to be read in several chunks.
+    paths = [f"dir {i}/nb_{i}.ipynb" for i in range(10000)]
+    file = tmp_path / "files.txt"
+    file.write_bytes(sep.join(p.encode() for p in paths) + sep)
+    assert list(iter_paths_from_file(str(file))) == paths
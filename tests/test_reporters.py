@@ -0,0 +1,71 @@
+import io
+import json
+import xml.etree.ElementTree as ET
+
+from nbsexy._checks_fun import OUT_OF_BUDGET, CheckResult
+from nbsexy.reporters import create_reporter
+
+DESCRIPTIONS = {"has_md": "check notebook has at least one markdown cell"}
+RESULTS = [
+    ("a.ipynb", {"has_md": CheckResult(True, "")}),
+    ("b & c.ipynb", {"has_md": CheckResult(False, "no markdown <cell>")}),
+    ("d.ipynb", {"has_md": CheckResult("Error", "Traceback...")}),
+    ("e.ipynb", {"has_md": CheckResult(OUT_OF_BUDGET, "ran out of --budget 5.0s")}),
+]
+
+
+def _report(format: str) -> str:
+    stream = io.StringIO()
+    reporter = create_reporter(format, stream, DESCRIPTIONS)
+    for filename, results in RESULTS:
+        reporter.add(filename, results)
+    reporter.close()
+    return stream.getvalue()
+
+
+def test_jsonl_reporter_writes_results_right_away():
+    stream = io.StringIO()
+    reporter = create_reporter("jsonl", stream, DESCRIPTIONS)
+    reporter.add(*RESULTS[1])
+    # available before the reporter is closed.
+    assert json.loads(stream.getvalue()) == {
+        "file": "b & c.ipynb",
+        "check": "has_md",
+        "status": "fail",
+        "info": "no markdown <cell>",
+    }
+    reporter.close()
+
+    records = [json.loads(line) for line in _report("jsonl").splitlines()]
+    assert [r["status"] for r in records] == ["pass", "fail", "error", "out_of_budget"]
+
+
+def test_junit_reporter():
+    root = ET.fromstring(_report("junit"))
+    suite = root.find("testsuite")
+
+    counts = [suite.get(k) for k in ("tests", "failures", "errors", "skipped")]
+    assert counts == ["4", "1", "1", "1"]
+    testcases = suite.findall("testcase")
+    assert [t.get("name") for t in testcases] == ["a.ipynb", "b & c.ipynb", "d.ipynb", "e.ipynb"]
+    assert testcases[0].find("failure") is None
+    assert testcases[1].find("failure").text == "no markdown <cell>"
+    assert testcases[2].find("error").text == "Traceback..."
+    assert testcases[3].find("skipped").get("message") == "ran out of --budget 5.0s"
+
+
+def test_sarif_reporter():
+    report = json.loads(_report("sarif"))
+    run = report["runs"][0]
+
+    assert report["version"] == "2.1.0"
+    assert [rule["id"] for rule in run["tool"]["driver"]["rules"]] == ["has_md"]
+    assert [r["level"] for r in run["results"]] == ["error", "warning", "note"]
+    location = run["results"][0]["locations"][0]["physicalLocation"]
+    assert location["artifactLocation"]["uri"] == "b & c.ipynb"
+
+
+def test_sarif_reporter_without_results():
+    stream = io.StringIO()
+    create_reporter("sarif", stream, DESCRIPTIONS).close()
+    assert json.loads(stream.getvalue())["runs"][0]["results"] == []
@@ -0,0 +1,44 @@
+import pytest
+
+import nbsexy.watcher
+from nbsexy.watcher import Watcher
+
+
+@pytest.mark.parametrize("method", ["inotify", "polling"])
+def test_watcher_report_changed_notebooks_only(tmp_path, monkeypatch, method):
+    if method == "polling":
+        monkeypatch.setattr(nbsexy.watcher._Inotify, "create", classmethod(lambda cls: None))
+        monkeypatch.setattr(nbsexy.watcher, "POLL_INTERVAL_SECONDS", 0.1)
+    monkeypatch.setattr(nbsexy.watcher, "DEBOUNCE_SECONDS", 0.2)
+    for d in ("nbs", "nbs/.ipynb_checkpoints", "other"):
+        (tmp_path / d).mkdir()
+    (tmp_path / "nbs" / "a.ipynb").write_text("{}")
+    (tmp_path / "nbs" / "b.ipynb").write_text("{}")
+    (tmp_path / "other" / "c.ipynb").write_text("{}")
+
+    watcher = Watcher(
+        [str(tmp_path / "nbs"), str(tmp_path / "other" / "c.ipynb")],
+        exclude_patterns=["*skip*"],
+    )
+    if method == "inotify" and watcher.method != "inotify":
+        pytest.skip("inotify is not available")
+    try:
+        (tmp_path / "nbs" / "a.ipynb").write_text('{"cells": []}')
+        (tmp_path / "nbs" / "b.ipynb").unlink()
+        (tmp_path / "nbs" / "skip.ipynb").write_text("{}")
+        (tmp_path / "nbs" / ".~a.ipynb").write_text("{}")
+        (tmp_path / "nbs" / ".ipynb_checkpoints" / "a-checkpoint.ipynb").write_text("{}")
+        (tmp_path / "nbs" / "new").mkdir()
+        (tmp_path / "nbs" / "new" / "d.ipynb").write_text("{}")
+        (tmp_path / "other" / "c.ipynb").write_text("[]")
+        (tmp_path / "other" / "not_watched.ipynb").write_text("{}")
+
+        changed = watcher.wait_for_changes()
+    finally:
+        watcher.close()
+    assert {p[len(str(tmp_path)) + 1 :] for p in changed} == {
+        "nbs/a.ipynb",
+        "nbs/b.ipynb",
+        "nbs/new/d.ipynb",
+        "other/c.ipynb",
+    }